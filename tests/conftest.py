@@ -0,0 +1,5 @@
+import os
+
+# NOTE: Settings without defaults must be defined before the backend is imported
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("RABBITMQ_URL", "amqp://localhost")
@@ -0,0 +1,86 @@
+import os
+import signal
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+from unicon_backend.evaluator.tasks.programming.artifact import File
+from unicon_backend.evaluator.tasks.programming.base import ProgrammingTask
+from unicon_backend.runner import JobResult, ProgramResult, RunnerJob, Status
+
+
+def make_programming_task(
+    required_inputs: list[dict[str, Any]], testcases: list[dict[str, Any]], **environment: Any
+) -> ProgrammingTask:
+    return ProgrammingTask.model_validate(
+        {
+            "id": 0,
+            "type": "PROGRAMMING_TASK",
+            "question": "",
+            "environment": {
+                "language": "PYTHON",
+                "options": {"version": "3.12"},
+                "time_limit_secs": 5,
+                "memory_limit_mb": 500,
+                **environment,
+            },
+            "required_inputs": required_inputs,
+            "testcases": testcases,
+        }
+    )
+
+
+def echo_testcase(testcase_id: int, socket_id: str) -> dict[str, Any]:
+    """A testcase that outputs the user input with the given socket id as is"""
+    return {
+        "id": testcase_id,
+        "nodes": [
+            {
+                "id": 1,
+                "type": "OUTPUT_STEP",
+                "outputs": [],
+                "inputs": [{"id": "DATA.IN", "comparison": {"operator": "=", "value": "hello"}}],
+            }
+        ],
+        "edges": [
+            {
+                "id": 1,
+                "from_node_id": 0,
+                "from_socket_id": socket_id,
+                "to_node_id": 1,
+                "to_socket_id": "DATA.IN",
+            }
+        ],
+    }
+
+
+def run_job(job: RunnerJob, tmp_path: Path) -> JobResult:
+    """Run the programs of a job like the runner does, without its sandbox"""
+    results: list[ProgramResult] = []
+    for program in job.programs:
+        program_dir = tmp_path / str(program.id)
+        program_dir.mkdir()
+        for file in program.files:
+            content = file.content if isinstance(file, File) else job.file_table[file.hash]
+            (program_dir / file.name).write_text(content)
+        # NOTE: The program runs in its own session, so that its workers are killed with it on a timeout
+        process = subprocess.Popen(
+            [sys.executable, program.entrypoint],
+            cwd=program_dir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=True,
+        )
+        try:
+            stdout, stderr = process.communicate(timeout=job.context.time_limit_secs)
+            status = Status.OK if process.returncode == 0 else Status.RTE
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            stdout, stderr = process.communicate()
+            status = Status.TLE
+        results.append(ProgramResult(id=program.id, status=status, stdout=stdout, stderr=stderr))
+        if job.context.stop_on_first_failure and results[-1].status != Status.OK:
+            break
+    return JobResult(success=True, error=None, results=results, id=job.id)
@@ -0,0 +1,135 @@
+import json
+from pathlib import Path
+from typing import Any
+
+from tests.helpers import make_programming_task, run_job
+from unicon_backend.evaluator.tasks.programming.artifact import File
+from unicon_backend.evaluator.tasks.programming.base import ProgrammingTask, RequiredInput
+from unicon_backend.evaluator.tasks.programming.codegen import DEFAULT_CODEGEN_BACKEND
+from unicon_backend.runner import RunnerJob, Status
+
+USER_FILE = """
+def double(x):
+    return x * 2
+
+def fail(x):
+    raise ValueError("failed")
+"""
+
+
+def call_step(node_id: int, function: str, allow_error: bool = False) -> dict[str, Any]:
+    return {
+        "id": node_id,
+        "type": "PY_RUN_FUNCTION_STEP",
+        "function_identifier": function,
+        "allow_error": allow_error,
+        "inputs": [{"id": "DATA.IN.FILE"}, {"id": "DATA.IN.ARG.0.x"}],
+        "outputs": [
+            {"id": "DATA.OUT"},
+            *([{"id": "DATA.OUT.ERROR"}] if allow_error else []),
+        ],
+    }
+
+
+def link(
+    edge_id: int, from_node_id: int, from_socket_id: str, to_node_id: int, to_socket_id: str
+) -> dict[str, Any]:
+    return {
+        "id": edge_id,
+        "from_node_id": from_node_id,
+        "from_socket_id": from_socket_id,
+        "to_node_id": to_node_id,
+        "to_socket_id": to_socket_id,
+    }
+
+
+def make_task(second_function: str = "double", allow_error: bool = False) -> ProgrammingTask:
+    """
+    A testcase that calls `double` on 1 (step 2) and `second_function` on 2 (step 3), which are independent of
+    each other, and then `double` on the output of step 2 (step 4)
+    """
+    return make_programming_task(
+        [{"id": "DATA.FILE", "data": {"name": "user.py", "content": ""}}],
+        [
+            {
+                "id": 1,
+                "nodes": [
+                    {
+                        "id": 1,
+                        "type": "INPUT_STEP",
+                        "inputs": [],
+                        "outputs": [
+                            {"id": "DATA.OUT.A", "data": 1},
+                            {"id": "DATA.OUT.B", "data": 2},
+                        ],
+                    },
+                    call_step(2, "double"),
+                    call_step(3, second_function, allow_error),
+                    call_step(4, "double"),
+                    {
+                        "id": 5,
+                        "type": "OUTPUT_STEP",
+                        "inputs": [{"id": "DATA.IN.1"}, {"id": "DATA.IN.2"}, {"id": "DATA.IN.3"}],
+                        "outputs": [],
+                    },
+                ],
+                "edges": [
+                    link(1, 0, "DATA.FILE", 2, "DATA.IN.FILE"),
+                    link(2, 0, "DATA.FILE", 3, "DATA.IN.FILE"),
+                    link(3, 0, "DATA.FILE", 4, "DATA.IN.FILE"),
+                    link(4, 1, "DATA.OUT.A", 2, "DATA.IN.ARG.0.x"),
+                    link(5, 1, "DATA.OUT.B", 3, "DATA.IN.ARG.0.x"),
+                    link(6, 2, "DATA.OUT", 4, "DATA.IN.ARG.0.x"),
+                    link(7, 2, "DATA.OUT", 5, "DATA.IN.1"),
+                    link(8, 3, "DATA.OUT", 5, "DATA.IN.2"),
+                    link(9, 4, "DATA.OUT", 5, "DATA.IN.3"),
+                ],
+            }
+        ],
+    )
+
+
+def assemble(task: ProgrammingTask, optimise: bool = True) -> str:
+    user_input_step = task.create_input_step(
+        [RequiredInput(id="DATA.FILE", data=File(name="user.py", content=""))]
+    )
+    return DEFAULT_CODEGEN_BACKEND.code(task.testcases[0].run(user_input_step, optimise=optimise))
+
+
+def run(task: ProgrammingTask, tmp_path: Path) -> tuple[Status, str]:
+    user_file = File(name="user.py", content=USER_FILE)
+    result = task.run([RequiredInput(id="DATA.FILE", data=user_file)])
+    assert result.job_message is not None
+    job = RunnerJob.model_validate_json(result.job_message)
+    (program_result,) = run_job(job, tmp_path).results
+    return program_result.status, program_result.stdout
+
+
+def test_independent_calls_are_batched(tmp_path: Path):
+    code = assemble(make_task())
+    # Steps 2 and 3 are sent as one batch, and step 4 depends on step 2
+    assert code.count("call_functions_safe(") == 1
+    assert code.count("call_function_safe(") == 1
+
+    status, stdout = run(make_task(), tmp_path)
+    assert status == Status.OK
+    assert json.loads(stdout) == {"DATA.IN.1": 2, "DATA.IN.2": 4, "DATA.IN.3": 4}
+
+
+def test_calls_are_not_batched_without_optimisations():
+    code = assemble(make_task(), optimise=False)
+    assert "call_functions_safe(" not in code
+    assert code.count("call_function_safe(") == 3
+
+
+def test_errors_in_a_batch_stop_the_program(tmp_path: Path):
+    status, stdout = run(make_task("fail"), tmp_path)
+    assert status == Status.RTE
+    assert json.loads(stdout) == {"file_name": "user", "function_name": "fail", "error": "failed"}
+
+
+def test_allowed_errors_in_a_batch_are_outputs(tmp_path: Path):
+    task = make_task("fail", allow_error=True)
+    status, stdout = run(task, tmp_path)
+    assert status == Status.OK
+    assert json.loads(stdout) == {"DATA.IN.1": 2, "DATA.IN.2": None, "DATA.IN.3": 4}
@@ -0,0 +1,47 @@
+import pytest
+
+from unicon_backend.evaluator.tasks.programming.codegen import CODEGEN_BACKENDS, CodegenBackend
+
+INVALID_NAMES = [
+    "var_x = 1\nprint('INJECTED')\nvar_x",
+    "var_x; import os",
+    "x.y",
+    "1x",
+    "class",
+    "",
+]
+
+
+@pytest.fixture(params=list(CODEGEN_BACKENDS))
+def backend(request) -> CodegenBackend:
+    return CODEGEN_BACKENDS[request.param]
+
+
+@pytest.mark.parametrize("name", INVALID_NAMES)
+def test_invalid_names_are_rejected(backend, name):
+    with pytest.raises(ValueError):
+        backend.identifier(name)
+    with pytest.raises(ValueError):
+        backend.attribute(backend.identifier("x"), name)
+    with pytest.raises(ValueError):
+        backend.call(backend.identifier("f"), [], [(name, backend.literal(1))])
+    with pytest.raises(ValueError):
+        backend.function_def(name, [])
+
+
+def test_variable_reference_literals(backend):
+    assert backend.code(
+        backend.module([backend.assign([backend.identifier("y")], backend.literal("var_x"))])
+    ) == ("y = var_x\n")
+    with pytest.raises(ValueError):
+        backend.literal("var_x = 1\nprint('INJECTED')\nvar_x")
+
+
+@pytest.mark.parametrize("value", ["var", 'a "quoted"\nstring', 1, -2.5, True])
+def test_literals_round_trip(backend, value):
+    code = backend.code(
+        backend.module([backend.assign([backend.identifier("x")], backend.literal(value))])
+    )
+    namespace: dict = {}
+    exec(code, namespace)
+    assert namespace["x"] == value
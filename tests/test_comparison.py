@@ -0,0 +1,105 @@
+import math
+from typing import Any
+
+import pytest
+from pydantic import ValidationError
+
+from unicon_backend.evaluator.tasks.programming import comparison
+from unicon_backend.evaluator.tasks.programming.steps import Comparison
+
+INF = math.inf
+
+
+@pytest.fixture(params=["python", "numpy"])
+def array_backend(request, monkeypatch):
+    """Compare arrays in pure Python, or with NumPy regardless of their size"""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(comparison, "NUMPY_MIN_SIZE", 0)
+    else:
+        monkeypatch.setattr(comparison, "_numpy", lambda: None)
+
+
+@pytest.mark.parametrize(
+    ("actual", "expected", "tolerances", "equal"),
+    [
+        (1.0, 1.0 + 1e-12, (), True),
+        (1.0, 1.001, (), False),
+        (1.0, 1.001, (1e-2, 0.0), True),
+        (0.0, 1e-12, (), False),
+        (0.0, 1e-12, (0.0, 1e-9), True),
+        (1, 1.0, (), True),
+        (True, 1, (), True),
+        ([1.0, [2.0]], [1.0, [2.0]], (), False),
+        ([[1.0, 2.0], [3.0, 4.0]], [[1.0, 2.0], [3.0, 4.0 + 1e-12]], (), True),
+        ([[1.0, 2.0], [3.0, 4.0]], [[1.0, 2.0], [3.0, 4.1]], (), False),
+        ([1.0, 2.0], [[1.0, 2.0]], (), False),
+        ([1.0, 2.0], [1.0, 2.0, 3.0], (), False),
+        ((1.0, 2.0), [1.0, 2.0], (), True),
+        ([], [], (), True),
+        ([INF, -INF], [INF, -INF], (), True),
+        (INF, 1e308, (1.0, INF), False),
+        (math.nan, math.nan, (), False),
+        ("1.0", 1.0, (), False),
+        (None, 1.0, (), False),
+        ([1.0, "2"], [1.0, 2.0], (), False),
+    ],
+)
+def test_approximately_equal(
+    array_backend, actual: Any, expected: Any, tolerances: tuple[float, ...], equal: bool
+):
+    assert comparison.compare("~=", actual, expected, *tolerances) is equal
+
+
+@pytest.mark.parametrize(
+    ("actual", "expected", "equal"),
+    [
+        ([[1, 2], [3, 4]], [[1, 2], [3, 4]], True),
+        ([[1, 2], [3, 5]], [[1, 2], [3, 4]], False),
+        ((1, (2, 3)), [1, [2, 3]], False),
+        (((1, 2), (3, 4)), [[1, 2], [3, 4]], True),
+        ([1.0, 2.0], [1, 2], True),
+        ([1, 2], [[1, 2]], False),
+        ([1, 2, 3], [1, 2], False),
+        (["1", "2"], [1, 2], False),
+        (2**70, 2**70, True),
+        ([2**70, 1], [2**70 + 1, 1], False),
+    ],
+)
+def test_array_equal(array_backend, actual: Any, expected: Any, equal: bool):
+    assert comparison.compare("[=]", actual, expected) is equal
+
+
+def test_large_arrays_are_compared_like_small_ones(array_backend):
+    expected = [[float(i), float(-i)] for i in range(1, 301)]
+    close = [[a + 1e-12, b] for a, b in expected]
+    far = [[a, b] for a, b in expected]
+    far[-1][1] += 1.0
+    assert comparison.compare("~=", close, expected)
+    assert not comparison.compare("~=", far, expected)
+    assert comparison.compare("[=]", [list(row) for row in expected], expected)
+    assert not comparison.compare("[=]", close, expected)
+
+
+@pytest.mark.parametrize(
+    "definition",
+    [
+        {"operator": "~=", "value": "1"},
+        {"operator": "~=", "value": [[1], [1, 2]]},
+        {"operator": "[=]", "value": [1, None]},
+        {"operator": "=", "value": 1, "rel_tol": 0.1},
+        {"operator": "~=", "value": 1, "abs_tol": -1},
+        {"operator": "~=", "value": 1, "rel_tol": math.nan},
+        {"operator": "<", "value": [1]},
+    ],
+)
+def test_invalid_comparisons_are_rejected(definition: dict[str, Any]):
+    with pytest.raises(ValidationError):
+        Comparison.model_validate(definition)
+
+
+def test_tolerances_default_to_those_of_isclose():
+    assert Comparison(operator="~=", value=1).tolerances == [1e-9, 0.0]
+    assert Comparison(operator="~=", value=1, abs_tol=0.5).tolerances == [1e-9, 0.5]
+    assert Comparison(operator="[=]", value=[1]).tolerances == []
+    assert Comparison(operator="~=", value=[1.0, 2.0], abs_tol=0.5).compare([1.4, 2.4])
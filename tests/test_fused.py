@@ -0,0 +1,152 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from tests.helpers import echo_testcase, make_programming_task, run_job
+from unicon_backend.evaluator.tasks.programming.artifact import File
+from unicon_backend.evaluator.tasks.programming.base import FUSED_PROGRAM_ID, RequiredInput
+from unicon_backend.evaluator.tasks.programming.security import FUSED_TESTCASE_ID_KEY
+from unicon_backend.runner import ProgramResult, RunnerJob, Status
+from unicon_backend.workers.consumer import grade_job_result
+
+
+@pytest.fixture
+def task():
+    return make_programming_task(
+        [{"id": "DATA.IN", "data": "hello"}],
+        [echo_testcase(1, "DATA.IN"), echo_testcase(2, "DATA.IN"), echo_testcase(3, "DATA.IN")],
+        fuse_testcases=True,
+    )
+
+
+def reported_line(testcase_id: int, status: Status, stdout: str = "") -> str:
+    return json.dumps(
+        {FUSED_TESTCASE_ID_KEY: testcase_id, "status": status, "stdout": stdout, "stderr": ""}
+    )
+
+
+def test_fused_results_are_split_by_testcase(task):
+    stdout = "\n".join(
+        [
+            "printed outside of a testcase",
+            reported_line(2, Status.RTE),
+            reported_line(1, Status.OK, '{"DATA.IN": "hello"}'),
+            reported_line(3, Status.SKIPPED),
+        ]
+    )
+    results = task.split_fused_results(
+        [ProgramResult(id=FUSED_PROGRAM_ID, status=Status.OK, stdout=stdout, stderr="")]
+    )
+    assert [(result.id, result.status, result.stdout) for result in results] == [
+        (1, Status.OK, '{"DATA.IN": "hello"}'),
+        (2, Status.RTE, ""),
+        (3, Status.SKIPPED, ""),
+    ]
+
+
+@pytest.mark.parametrize(
+    ("program_status", "missing_status"), [(Status.TLE, Status.TLE), (Status.OK, Status.RTE)]
+)
+def test_unreported_testcases_take_the_status_of_the_program(
+    task, program_status: Status, missing_status: Status
+):
+    results = task.split_fused_results(
+        [
+            ProgramResult(
+                id=FUSED_PROGRAM_ID,
+                status=program_status,
+                stdout=reported_line(1, Status.OK),
+                stderr="killed",
+            )
+        ]
+    )
+    assert [(result.id, result.status) for result in results] == [
+        (1, Status.OK),
+        (2, missing_status),
+        (3, missing_status),
+    ]
+    assert results[1].stderr == "killed"
+
+
+def test_results_of_other_programs_are_kept(task):
+    result = ProgramResult(id=1, status=Status.OK, stdout="{}", stderr="")
+    assert task.split_fused_results([result]) == [result]
+
+
+def test_fused_program_runs_every_testcase(task, tmp_path: Path):
+    task_result = task.run([RequiredInput(id="DATA.IN", data="hello")])
+    assert task_result.job_message is not None
+    job = RunnerJob.model_validate_json(task_result.job_message)
+    assert [program.id for program in job.programs] == [FUSED_PROGRAM_ID]
+
+    results = task.split_fused_results(run_job(job, tmp_path).results)
+    assert [(result.id, result.status) for result in results] == [
+        (1, Status.OK),
+        (2, Status.OK),
+        (3, Status.OK),
+    ]
+    assert all(json.loads(result.stdout) == {"DATA.IN": "hello"} for result in results)
+
+
+def call_testcase(testcase_id: int, function: str) -> dict:
+    """A testcase that outputs the result of calling the given function of the user file"""
+    return {
+        "id": testcase_id,
+        "nodes": [
+            {
+                "id": 1,
+                "type": "PY_RUN_FUNCTION_STEP",
+                "function_identifier": function,
+                "inputs": [{"id": "DATA.IN.FILE"}],
+                "outputs": [{"id": "DATA.OUT"}],
+            },
+            {
+                "id": 2,
+                "type": "OUTPUT_STEP",
+                "outputs": [],
+                "inputs": [{"id": "DATA.IN", "comparison": {"operator": "=", "value": 1}}],
+            },
+        ],
+        "edges": [
+            {
+                "id": 1,
+                "from_node_id": 0,
+                "from_socket_id": "DATA.FILE",
+                "to_node_id": 1,
+                "to_socket_id": "DATA.IN.FILE",
+            },
+            {
+                "id": 2,
+                "from_node_id": 1,
+                "from_socket_id": "DATA.OUT",
+                "to_node_id": 2,
+                "to_socket_id": "DATA.IN",
+            },
+        ],
+    }
+
+
+def test_fused_program_that_exceeds_its_time_limit_is_graded(tmp_path: Path):
+    task = make_programming_task(
+        [{"id": "DATA.FILE", "data": {"name": "user.py", "content": ""}}],
+        [call_testcase(1, "one"), call_testcase(2, "loop"), call_testcase(3, "one")],
+        fuse_testcases=True,
+        time_limit_secs=1,
+    )
+    user_file = File(
+        name="user.py", content="def one():\n    return 1\n\ndef loop():\n    while True: pass\n"
+    )
+    task_result = task.run([RequiredInput(id="DATA.FILE", data=user_file)])
+    assert task_result.job_message is not None
+    job_result = run_job(RunnerJob.model_validate_json(task_result.job_message), tmp_path)
+    assert [result.status for result in job_result.results] == [Status.TLE]
+
+    testcase_results = grade_job_result(task, job_result)
+    assert [(result.id, result.status) for result in testcase_results] == [
+        (1, Status.OK),
+        (2, Status.TLE),
+        (3, Status.TLE),
+    ]
+    assert [result.value for result in testcase_results[0].results or []] == [1]
+    assert testcase_results[1].results is None and testcase_results[2].results is None
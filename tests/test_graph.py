@@ -0,0 +1,137 @@
+import pickle
+
+import pytest
+
+from tests.helpers import echo_testcase, make_programming_task
+from unicon_backend.evaluator.tasks.programming.base import RequiredInput
+from unicon_backend.evaluator.tasks.programming.codegen import DEFAULT_CODEGEN_BACKEND
+from unicon_backend.evaluator.tasks.programming.steps import USER_INPUT_STEP_ID
+from unicon_backend.lib.graph import Graph, GraphEdge, GraphNode, NodeSocket
+
+
+def make_graph(node_ids: list[int], links: list[tuple[int, str, int, str]]) -> Graph[GraphNode]:
+    sockets: dict[int, tuple[set[str], set[str]]] = {
+        node_id: (set(), set()) for node_id in node_ids
+    }
+    for from_node_id, from_socket_id, to_node_id, to_socket_id in links:
+        sockets[from_node_id][1].add(from_socket_id)
+        sockets[to_node_id][0].add(to_socket_id)
+    return Graph[GraphNode].model_validate(
+        {
+            "nodes": [
+                {
+                    "id": node_id,
+                    "inputs": [{"id": socket_id} for socket_id in sorted(inputs)],
+                    "outputs": [{"id": socket_id} for socket_id in sorted(outputs)],
+                }
+                for node_id, (inputs, outputs) in sockets.items()
+            ],
+            "edges": [
+                {
+                    "id": edge_id,
+                    "from_node_id": from_node_id,
+                    "from_socket_id": from_socket_id,
+                    "to_node_id": to_node_id,
+                    "to_socket_id": to_socket_id,
+                }
+                for edge_id, (from_node_id, from_socket_id, to_node_id, to_socket_id) in enumerate(
+                    links
+                )
+            ],
+        }
+    )
+
+
+def test_nodes_are_indexed_by_ascending_id():
+    graph = make_graph([7, 3, 5], [(3, "OUT", 7, "IN")])
+    ir = graph.ir
+    assert ir.node_ids == (3, 5, 7)
+    assert ir.node_indices == {3: 0, 5: 1, 7: 2}
+    assert [node.id for node in ir.nodes] == [3, 5, 7]
+
+
+def test_edges_are_stored_by_node():
+    graph = make_graph(
+        [1, 2, 3], [(1, "OUT", 3, "IN.1"), (2, "OUT", 3, "IN.2"), (1, "OUT", 2, "IN")]
+    )
+    ir = graph.ir
+    assert list(ir.out_edges_of(0)) == [0, 2]
+    assert list(ir.in_edges_of(2)) == [0, 1]
+    assert list(ir.in_edges_of(0)) == []
+    assert [ir.socket_ids[socket] for socket in ir.edge_to_socket] == ["IN.1", "IN.2", "IN"]
+
+
+def test_parallel_edges_count_once_towards_in_degree():
+    # Node 3 takes two arguments from node 2, which must not release it before node 1 is emitted
+    graph = make_graph(
+        [1, 2, 3], [(2, "OUT", 3, "IN.1"), (2, "OUT", 3, "IN.2"), (1, "OUT", 3, "IN.3")]
+    )
+    assert list(graph.ir.predecessors) == [1, 0]
+    assert [node.id for node in graph.topological_sort()] == [1, 2, 3]
+
+
+def test_topological_sort_is_breadth_first_by_id():
+    graph = make_graph([4, 1, 3, 2], [(4, "OUT", 1, "IN"), (3, "OUT", 2, "IN")])
+    assert [node.id for node in graph.topological_sort()] == [3, 4, 2, 1]
+
+
+def test_topological_sort_ignores_nodes():
+    graph = make_graph([1, 2, 3], [(1, "OUT", 2, "IN"), (2, "OUT", 3, "IN")])
+    assert [node.id for node in graph.topological_sort({2})] == [1, 3]
+
+
+def test_topological_sort_rejects_cycles():
+    graph = make_graph([1, 2], [(1, "OUT", 2, "IN"), (2, "OUT", 1, "IN")])
+    with pytest.raises(ValueError, match="cycle"):
+        graph.topological_sort()
+
+
+def test_edges_to_unknown_nodes_are_rejected():
+    graph = Graph[GraphNode](
+        nodes=[GraphNode(id=1, inputs=[], outputs=[NodeSocket(id="OUT")])],
+        edges=[
+            GraphEdge(id=1, from_node_id=1, from_socket_id="OUT", to_node_id=2, to_socket_id="IN")
+        ],
+    )
+    with pytest.raises(ValueError, match="unknown node 2"):
+        _ = graph.ir
+
+
+def test_ir_is_immutable_and_picklable():
+    ir = make_graph([1, 2], [(1, "OUT", 2, "IN")]).ir
+    with pytest.raises(AttributeError):
+        ir.node_ids = ()
+    restored = pickle.loads(pickle.dumps(ir))
+    assert restored.node_indices == ir.node_indices
+    assert list(restored.successors) == list(ir.successors)
+
+
+def test_compute_graph_ir_resolves_step_inputs():
+    task = make_programming_task(
+        [{"id": "DATA.IN", "data": "hello"}], [echo_testcase(1, "DATA.IN")]
+    )
+    testcase = task.testcases[0]
+    ir = testcase.ir
+
+    # NOTE: The user input step is a placeholder with only the sockets that are linked to other steps
+    user_input = ir.nodes[ir.node_indices[USER_INPUT_STEP_ID]]
+    assert [socket.id for socket in user_input.outputs] == ["DATA.IN"]
+
+    (step_input,) = ir.step_inputs[ir.node_indices[1]]
+    assert step_input.socket_id == "DATA.IN"
+    assert step_input.user_input_socket_id == "DATA.IN"
+    assert step_input.file is None
+
+
+def test_compute_graph_ir_is_reused_across_runs():
+    task = make_programming_task(
+        [{"id": "DATA.IN", "data": "hello"}], [echo_testcase(1, "DATA.IN")]
+    )
+    testcase = task.testcases[0]
+    ir = testcase.ir
+    for data in ["hello", "bye"]:
+        user_input_step = task.create_input_step([RequiredInput(id="DATA.IN", data=data)])
+        code = DEFAULT_CODEGEN_BACKEND.code(testcase.run(user_input_step))
+        assert f'"{data}"' in code
+    assert testcase.ir is ir
+    assert [node.id for node in testcase.nodes] == [1]
@@ -0,0 +1,142 @@
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, create_engine
+
+from tests.helpers import echo_testcase, make_programming_task, run_job
+from unicon_backend.evaluator.tasks.base import TaskEvalResult, TaskEvalStatus, TaskType
+from unicon_backend.evaluator.tasks.programming.base import ProgrammingTask, RequiredInput
+from unicon_backend.lib.common import CustomSQLModel
+from unicon_backend.models.problem import TaskAttemptORM, TaskORM, TaskResultORM
+from unicon_backend.runner import JobResult, RunnerJob, Status
+from unicon_backend.workers import consumer
+
+
+def make_task() -> ProgrammingTask:
+    return make_programming_task(
+        [{"id": "DATA.IN", "data": "hello"}], [echo_testcase(1, "DATA.IN")]
+    )
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    CustomSQLModel.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, class_=Session)
+    monkeypatch.setattr(consumer, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def job_result(tmp_path: Path) -> JobResult:
+    task = make_task()
+    task_result = task.run([RequiredInput(id="DATA.IN", data="hello")])
+    assert task_result.job_message is not None
+    return run_job(RunnerJob.model_validate_json(task_result.job_message), tmp_path)
+
+
+def add_task_result(
+    session_factory: sessionmaker, job_id: str, status: TaskEvalStatus, result: list
+) -> int:
+    task = make_task()
+    with session_factory() as db_session:
+        if db_session.get(TaskORM, (task.id, 1)) is None:
+            task_db = TaskORM.from_task(task)
+            task_db.problem_id = 1
+            db_session.add(task_db)
+            db_session.add(
+                TaskAttemptORM(
+                    id=1,
+                    user_id=1,
+                    task_id=task.id,
+                    problem_id=1,
+                    task_type=TaskType.PROGRAMMING,
+                    other_fields={},
+                    submitted_at=datetime.now(UTC),
+                )
+            )
+        task_result_db = TaskResultORM.from_task_eval_result(
+            TaskEvalResult(task_id=task.id, status=TaskEvalStatus.PENDING, result=job_id),
+            attempt_id=1,
+            task_type=TaskType.PROGRAMMING,
+        )
+        # NOTE: A result that was ingested already is no longer pending
+        task_result_db.status, task_result_db.result = status, result
+        db_session.add(task_result_db)
+        db_session.commit()
+        return task_result_db.id
+
+
+def get_task_result(session_factory: sessionmaker, task_result_id: int) -> TaskResultORM:
+    with session_factory() as db_session:
+        task_result_db = db_session.get(TaskResultORM, task_result_id)
+        assert task_result_db is not None
+        return task_result_db
+
+
+def ingest(job_result: JobResult, *job_ids: str, **update: Any):
+    """Ingest the result of a job as the result of each of the given jobs at once"""
+    consumer.task_results_consumer.ingest_results(
+        [
+            job_result.model_copy(update={"id": UUID(job_id), **update}).model_dump_json().encode()
+            for job_id in job_ids
+        ]
+    )
+
+
+def test_pending_results_are_ingested(session_factory, job_result: JobResult):
+    job_id = str(uuid4())
+    task_result_id = add_task_result(session_factory, job_id, TaskEvalStatus.PENDING, [])
+    ingest(job_result, job_id)
+
+    task_result_db = get_task_result(session_factory, task_result_id)
+    assert task_result_db.status == TaskEvalStatus.SUCCESS
+    assert task_result_db.completed_at is not None
+    assert [(result["id"], result["status"]) for result in task_result_db.result] == [
+        (1, Status.OK)
+    ]
+
+
+def test_results_that_are_not_pending_are_skipped(session_factory, job_result: JobResult):
+    ingested_job_id, pending_job_id = str(uuid4()), str(uuid4())
+    ingested_id = add_task_result(
+        session_factory, ingested_job_id, TaskEvalStatus.SUCCESS, ["kept"]
+    )
+    pending_id = add_task_result(session_factory, pending_job_id, TaskEvalStatus.PENDING, [])
+    ingest(job_result, ingested_job_id, pending_job_id)
+
+    ingested_db = get_task_result(session_factory, ingested_id)
+    assert (ingested_db.status, ingested_db.result, ingested_db.completed_at) == (
+        TaskEvalStatus.SUCCESS,
+        ["kept"],
+        None,
+    )
+    assert get_task_result(session_factory, pending_id).status == TaskEvalStatus.SUCCESS
+
+
+def test_results_delivered_again_are_not_ingested_again(session_factory, job_result: JobResult):
+    job_id = str(uuid4())
+    task_result_id = add_task_result(session_factory, job_id, TaskEvalStatus.PENDING, [])
+    ingest(job_result, job_id)
+    first_db = get_task_result(session_factory, task_result_id)
+
+    # e.g. the result is delivered again after the consumer failed to acknowledge it
+    rte_results = [
+        result.model_copy(update={"status": Status.RTE}) for result in job_result.results
+    ]
+    ingest(job_result, job_id, results=rte_results)
+    second_db = get_task_result(session_factory, task_result_id)
+    assert (second_db.result, second_db.completed_at) == (first_db.result, first_db.completed_at)
+
+
+def test_results_of_unknown_jobs_are_ignored(session_factory, job_result: JobResult):
+    task_result_id = add_task_result(session_factory, str(uuid4()), TaskEvalStatus.PENDING, [])
+    ingest(job_result, str(uuid4()))
+    assert get_task_result(session_factory, task_result_id).status == TaskEvalStatus.PENDING
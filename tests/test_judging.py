@@ -0,0 +1,175 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from tests.helpers import make_programming_task, run_job
+from unicon_backend.evaluator.tasks.programming.base import ProgrammingTask, RequiredInput
+from unicon_backend.evaluator.tasks.programming.codegen import DEFAULT_CODEGEN_BACKEND
+from unicon_backend.evaluator.tasks.programming.comparison import judge_outputs
+from unicon_backend.runner import RunnerJob, Status
+from unicon_backend.workers.consumer import grade_job_result
+
+PREVIEW_SIZE = 16
+
+
+def comparisons(**expected: list[Any]) -> str:
+    return json.dumps(expected)
+
+
+def test_outputs_are_judged_against_their_comparisons():
+    judged = judge_outputs(
+        {"A": "hello", "B": [1.0, 2.0], "C": 3},
+        comparisons(A=["=", "hello"], B=["~=", [1.0, 2.0 + 1e-12], 1e-9, 0.0], C=["<", 3]),
+        PREVIEW_SIZE,
+    )
+    assert judged == {
+        "A": {"correct": True, "value": "hello"},
+        "B": {"correct": True, "value": [1.0, 2.0]},
+        "C": {"correct": False, "value": 3},
+    }
+
+
+def test_outputs_without_comparisons_are_correct():
+    assert judge_outputs({"A": None}, comparisons(), PREVIEW_SIZE) == {
+        "A": {"correct": True, "value": None}
+    }
+
+
+def test_outputs_are_judged_as_they_would_be_decoded():
+    # Tuples are reported (and compared) as lists, like the JSON output of the program
+    assert judge_outputs({"A": (1, 2)}, comparisons(A=["=", [1, 2]]), PREVIEW_SIZE) == {
+        "A": {"correct": True, "value": [1, 2]}
+    }
+
+
+def test_large_outputs_are_previewed():
+    value = list(range(100))
+    text = json.dumps(value)
+    judged = judge_outputs({"A": value}, comparisons(A=["=", value]), PREVIEW_SIZE)
+    assert judged == {"A": {"correct": True, "preview": text[:PREVIEW_SIZE]}}
+
+    exact = "x" * (PREVIEW_SIZE - 2)
+    assert judge_outputs({"A": exact}, comparisons(), PREVIEW_SIZE) == {
+        "A": {"correct": True, "value": exact}
+    }
+
+
+def test_extra_values_are_reported_as_is():
+    judged = judge_outputs({"A": 1}, comparisons(), PREVIEW_SIZE, {"timings": [0.5]})
+    assert judged == {"A": {"correct": True, "value": 1}, "timings": [0.5]}
+
+
+def make_task(**environment: Any) -> ProgrammingTask:
+    """A testcase that outputs the user input twice (one of which is compared) and a constant number"""
+    return make_programming_task(
+        [{"id": "DATA.IN", "data": "hello"}],
+        [
+            {
+                "id": 1,
+                "nodes": [
+                    {
+                        "id": 1,
+                        "type": "INPUT_STEP",
+                        "inputs": [],
+                        "outputs": [{"id": "DATA.OUT", "data": 2.0}],
+                    },
+                    {
+                        "id": 2,
+                        "type": "OUTPUT_STEP",
+                        "outputs": [],
+                        "inputs": [
+                            {"id": "DATA.IN.A", "comparison": {"operator": "=", "value": "hello"}},
+                            {
+                                "id": "DATA.IN.B",
+                                "comparison": {"operator": "~=", "value": 2.0 + 1e-12},
+                            },
+                            {"id": "DATA.IN.C"},
+                        ],
+                    },
+                ],
+                "edges": [
+                    {
+                        "id": 1,
+                        "from_node_id": 0,
+                        "from_socket_id": "DATA.IN",
+                        "to_node_id": 2,
+                        "to_socket_id": "DATA.IN.A",
+                    },
+                    {
+                        "id": 2,
+                        "from_node_id": 1,
+                        "from_socket_id": "DATA.OUT",
+                        "to_node_id": 2,
+                        "to_socket_id": "DATA.IN.B",
+                    },
+                    {
+                        "id": 3,
+                        "from_node_id": 0,
+                        "from_socket_id": "DATA.IN",
+                        "to_node_id": 2,
+                        "to_socket_id": "DATA.IN.C",
+                    },
+                ],
+            }
+        ],
+        **environment,
+    )
+
+
+def grade(task: ProgrammingTask, user_input: str, tmp_path: Path):
+    result = task.run([RequiredInput(id="DATA.IN", data=user_input)])
+    assert result.job_message is not None
+    job = RunnerJob.model_validate_json(result.job_message)
+    (testcase_result,) = grade_job_result(task, run_job(job, tmp_path))
+    return testcase_result
+
+
+@pytest.mark.parametrize("fuse_testcases", [False, True])
+@pytest.mark.parametrize("user_input", ["hello", "world", "hello" * 10])
+def test_judging_in_the_program_matches_the_backend(
+    fuse_testcases: bool, user_input: str, tmp_path: Path
+):
+    (tmp_path / "backend").mkdir()
+    (tmp_path / "program").mkdir()
+    by_backend = grade(make_task(fuse_testcases=fuse_testcases), user_input, tmp_path / "backend")
+    in_program = grade(
+        make_task(
+            fuse_testcases=fuse_testcases,
+            compare_outputs_in_program=True,
+            output_preview_size=PREVIEW_SIZE,
+        ),
+        user_input,
+        tmp_path / "program",
+    )
+    assert in_program.status == by_backend.status
+    assert [(result.id, result.correct) for result in in_program.results] == [
+        (result.id, result.correct) for result in by_backend.results
+    ]
+
+
+def test_only_previews_of_large_outputs_are_reported(tmp_path: Path):
+    user_input = "hello" * 10
+    task = make_task(compare_outputs_in_program=True, output_preview_size=PREVIEW_SIZE)
+    testcase_result = grade(task, user_input, tmp_path)
+    assert testcase_result.status == Status.WA
+    assert [
+        (result.id, result.value, result.correct, result.truncated)
+        for result in testcase_result.results
+    ] == [
+        ("DATA.IN.A", json.dumps(user_input)[:PREVIEW_SIZE], False, True),
+        ("DATA.IN.B", 2.0, True, False),
+        ("DATA.IN.C", json.dumps(user_input)[:PREVIEW_SIZE], True, True),
+    ]
+
+
+def test_comparison_settings_do_not_outlive_their_run():
+    task = make_task()
+    user_input_step = task.create_input_step([RequiredInput(id="DATA.IN", data="hello")])
+    (testcase,) = task.testcases
+    expected = DEFAULT_CODEGEN_BACKEND.code(testcase.run(user_input_step, debug=True))
+
+    testcase.run(user_input_step, debug=True, trace_memory=True, output_preview_size=PREVIEW_SIZE)
+    assert testcase.output_preview_size is None
+    assert DEFAULT_CODEGEN_BACKEND.code(testcase.run(user_input_step, debug=True)) == expected
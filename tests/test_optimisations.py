@@ -0,0 +1,120 @@
+import subprocess
+import sys
+from typing import Any
+
+import pytest
+
+from tests.helpers import make_programming_task
+from unicon_backend.evaluator.tasks.programming import base
+from unicon_backend.evaluator.tasks.programming.codegen import DEFAULT_CODEGEN_BACKEND
+
+
+def edge(edge_id: int, from_node: tuple[int, str], to_node: tuple[int, str]) -> dict[str, Any]:
+    return {
+        "id": edge_id,
+        "from_node_id": from_node[0],
+        "from_socket_id": from_node[1],
+        "to_node_id": to_node[0],
+        "to_socket_id": to_node[1],
+    }
+
+
+def string_match(node_id: int) -> dict[str, Any]:
+    return {
+        "id": node_id,
+        "type": "STRING_MATCH_STEP",
+        "inputs": [{"id": "DATA.IN.1"}, {"id": "DATA.IN.2"}],
+        "outputs": [{"id": "DATA.OUT"}],
+    }
+
+
+def make_testcase(**input_data: Any) -> base.Testcase:
+    """
+    A testcase that outputs whether two constants match (step 2), and whether the user input matches the first
+    constant (step 3). The string match of step 4 is not used by any output.
+    """
+    task = make_programming_task(
+        [{"id": "DATA.IN", "data": "abc"}],
+        [
+            {
+                "id": 1,
+                "nodes": [
+                    {
+                        "id": 1,
+                        "type": "INPUT_STEP",
+                        "inputs": [],
+                        "outputs": [
+                            {"id": "DATA.OUT.A", "data": "abc"},
+                            {"id": "DATA.OUT.B", "data": "abc"},
+                            {"id": "DATA.OUT.C", "data": 5},
+                            *({"id": id, "data": data} for id, data in input_data.items()),
+                        ],
+                    },
+                    string_match(2),
+                    string_match(3),
+                    string_match(4),
+                    {
+                        "id": 5,
+                        "type": "OUTPUT_STEP",
+                        "inputs": [{"id": "DATA.IN.1"}, {"id": "DATA.IN.2"}, {"id": "DATA.IN.3"}],
+                        "outputs": [],
+                    },
+                ],
+                "edges": [
+                    edge(1, (1, "DATA.OUT.A"), (2, "DATA.IN.1")),
+                    edge(2, (1, "DATA.OUT.B"), (2, "DATA.IN.2")),
+                    edge(3, (0, "DATA.IN"), (3, "DATA.IN.1")),
+                    edge(4, (1, "DATA.OUT.A"), (3, "DATA.IN.2")),
+                    edge(5, (0, "DATA.IN"), (4, "DATA.IN.1")),
+                    edge(6, (1, "DATA.OUT.B"), (4, "DATA.IN.2")),
+                    edge(7, (2, "DATA.OUT"), (5, "DATA.IN.1")),
+                    edge(8, (3, "DATA.OUT"), (5, "DATA.IN.2")),
+                    edge(9, (1, "DATA.OUT.C"), (5, "DATA.IN.3")),
+                ],
+            }
+        ],
+    )
+    return task.testcases[0]
+
+
+def run_program(testcase: base.Testcase, user_input: str, optimise: bool) -> tuple[str, str]:
+    user_input_step = make_programming_task([], []).create_input_step(
+        [base.RequiredInput(id="DATA.IN", data=user_input)]
+    )
+    code = DEFAULT_CODEGEN_BACKEND.code(testcase.run(user_input_step, optimise=optimise))
+    process = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return code, process.stdout
+
+
+def test_string_matches_of_constants_are_folded():
+    optimisations = make_testcase().optimisations
+    assert optimisations.constants == {
+        "var_1_DATA_OUT_A": "abc",
+        "var_1_DATA_OUT_B": "abc",
+        "var_1_DATA_OUT_C": 5,
+        "var_2_DATA_OUT": True,
+    }
+
+
+def test_unused_and_folded_steps_are_dead():
+    optimisations = make_testcase().optimisations
+    # Step 1 only has constants, step 2 is folded, and the output of step 4 is not used
+    assert optimisations.dead_step_ids == {1, 2, 4}
+    assert "var_4_DATA_OUT" in optimisations.unused_variables
+
+
+def test_variable_references_are_not_folded():
+    optimisations = make_testcase(**{"DATA.OUT.REF": "var_1_DATA_OUT_A"}).optimisations
+    assert "var_1_DATA_OUT_A" not in optimisations.constants
+    assert 1 not in optimisations.dead_step_ids
+
+
+@pytest.mark.parametrize("user_input", ["abc", "xyz"])
+def test_optimised_program_has_the_same_output(user_input: str):
+    testcase = make_testcase()
+    code, stdout = run_program(testcase, user_input, optimise=True)
+    assert run_program(testcase, user_input, optimise=False)[1] == stdout
+    assert "var_2_DATA_OUT" not in code
+    assert "var_4_DATA_OUT" not in code
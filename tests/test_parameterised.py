@@ -0,0 +1,167 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+from pydantic import ValidationError
+
+from tests.helpers import echo_testcase, make_programming_task, run_job
+from unicon_backend.evaluator.tasks.programming.base import ProgrammingTask, RequiredInput
+from unicon_backend.runner import RunnerJob, Status
+from unicon_backend.workers.consumer import grade_job_result
+
+
+def parameterised_testcase(testcase_id: int, rows: list[dict[str, Any]] | None) -> dict[str, Any]:
+    """A testcase that outputs its expected value X, and whether the user input matches it"""
+    return {
+        "id": testcase_id,
+        "rows": rows,
+        "nodes": [
+            {
+                "id": 1,
+                "type": "INPUT_STEP",
+                "inputs": [],
+                "outputs": [{"id": "DATA.OUT.X", "data": "a"}, {"id": "DATA.OUT.Y", "data": 0}],
+            },
+            {
+                "id": 2,
+                "type": "STRING_MATCH_STEP",
+                "inputs": [{"id": "DATA.IN.1"}, {"id": "DATA.IN.2"}],
+                "outputs": [{"id": "DATA.OUT"}],
+            },
+            {
+                "id": 3,
+                "type": "OUTPUT_STEP",
+                "inputs": [
+                    {"id": "DATA.IN.X"},
+                    {"id": "DATA.IN.MATCH", "comparison": {"operator": "=", "value": True}},
+                ],
+                "outputs": [],
+            },
+        ],
+        "edges": [
+            {
+                "id": 1,
+                "from_node_id": 0,
+                "from_socket_id": "DATA.IN",
+                "to_node_id": 2,
+                "to_socket_id": "DATA.IN.1",
+            },
+            {
+                "id": 2,
+                "from_node_id": 1,
+                "from_socket_id": "DATA.OUT.X",
+                "to_node_id": 2,
+                "to_socket_id": "DATA.IN.2",
+            },
+            {
+                "id": 3,
+                "from_node_id": 1,
+                "from_socket_id": "DATA.OUT.X",
+                "to_node_id": 3,
+                "to_socket_id": "DATA.IN.X",
+            },
+            {
+                "id": 4,
+                "from_node_id": 2,
+                "from_socket_id": "DATA.OUT",
+                "to_node_id": 3,
+                "to_socket_id": "DATA.IN.MATCH",
+            },
+        ],
+    }
+
+
+ROWS = [
+    {"id": 10, "inputs": {1: {"DATA.OUT.X": "b"}}},
+    {"id": 11, "inputs": {}},
+    {"id": 12, "inputs": {1: {"DATA.OUT.X": "c"}}},
+]
+
+
+def make_task(rows: list[dict[str, Any]] | None = ROWS, **environment: Any) -> ProgrammingTask:
+    return make_programming_task(
+        [{"id": "DATA.IN", "data": "a"}],
+        [echo_testcase(1, "DATA.IN"), parameterised_testcase(2, rows)],
+        **environment,
+    )
+
+
+def grade(task: ProgrammingTask, user_input: str, tmp_path: Path) -> list[tuple[int, Status, Any]]:
+    result = task.run([RequiredInput(id="DATA.IN", data=user_input)])
+    assert result.job_message is not None
+    job = RunnerJob.model_validate_json(result.job_message)
+    return [
+        (
+            testcase_result.id,
+            testcase_result.status,
+            testcase_result.results[-1].value if testcase_result.results else None,
+        )
+        for testcase_result in grade_job_result(task, run_job(job, tmp_path))
+    ]
+
+
+def test_rows_are_reported_as_testcases():
+    testcase = make_task().testcases[1]
+    assert testcase.reported_ids == [10, 11, 12]
+    assert testcase.parameter_sockets == [(1, "DATA.OUT.X")]
+    assert testcase.parameters == ["var_1_DATA_OUT_X"]
+
+
+@pytest.mark.parametrize(
+    "rows",
+    [
+        [],
+        [{"id": 10, "inputs": {1: {"DATA.OUT.Z": "b"}}}],
+        [{"id": 10, "inputs": {4: {"DATA.OUT.X": "b"}}}],
+        [{"id": 1, "inputs": {}}],
+        [{"id": 10, "inputs": {}}, {"id": 10, "inputs": {}}],
+        [{"id": 10, "inputs": {1: {"DATA.OUT.X": "var_1_DATA_OUT_Y"}}}],
+    ],
+)
+def test_invalid_rows_are_rejected(rows: list[dict[str, Any]]):
+    with pytest.raises(ValidationError):
+        make_task(rows)
+
+
+def test_rows_cannot_set_inputs_that_reference_variables():
+    testcase = parameterised_testcase(2, [{"id": 10, "inputs": {1: {"DATA.OUT.X": "b"}}}])
+    testcase["nodes"][0]["outputs"][0]["data"] = "var_1_DATA_OUT_Y"
+    with pytest.raises(ValidationError):
+        make_programming_task([{"id": "DATA.IN", "data": "a"}], [testcase])
+
+
+def test_parameters_are_not_folded():
+    constants = make_task().testcases[1].optimisations.constants
+    assert "var_1_DATA_OUT_X" not in constants
+    # Inputs that are not set by any row are still folded
+    assert "var_1_DATA_OUT_Y" in constants
+
+
+def test_time_limit_covers_every_row():
+    task = make_task()
+    result = task.run([RequiredInput(id="DATA.IN", data="a")])
+    assert result.job_message is not None
+    job = RunnerJob.model_validate_json(result.job_message)
+    assert job.context.time_limit_secs == task.environment.time_limit_secs * 3
+
+
+@pytest.mark.parametrize("fuse_testcases", [False, True])
+def test_every_row_is_run_with_its_inputs(fuse_testcases: bool, tmp_path: Path):
+    task = make_task(fuse_testcases=fuse_testcases)
+    assert grade(task, "b", tmp_path) == [
+        (1, Status.WA, "b"),
+        (10, Status.OK, True),
+        (11, Status.WA, False),
+        (12, Status.WA, False),
+    ]
+
+
+def test_rows_stop_on_first_failure(tmp_path: Path):
+    task = make_task(stop_on_first_failure=True, compare_outputs_in_program=True)
+    results = grade(task, "b", tmp_path)
+    assert [(testcase_id, status) for testcase_id, status, _ in results] == [
+        (1, Status.WA),
+        (10, Status.OK),
+        (11, Status.WA),
+        (12, Status.SKIPPED),
+    ]
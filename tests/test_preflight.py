@@ -0,0 +1,120 @@
+import ast
+
+import pytest
+
+from unicon_backend.evaluator.tasks.programming.artifact import File
+from unicon_backend.evaluator.tasks.programming.preflight import (
+    FunctionSignature,
+    UserFunctionCall,
+    check_user_files,
+    summarise_module,
+)
+
+
+def signature(source: str) -> FunctionSignature:
+    function = ast.parse(source).body[0]
+    assert isinstance(function, ast.FunctionDef)
+    return FunctionSignature.from_ast(function)
+
+
+def check(content: str, num_args: int = 1, kwarg_names: tuple[str, ...] = ()) -> list[str]:
+    return check_user_files(
+        {"FILE": File(name="user.py", content=content)},
+        [UserFunctionCall("FILE", "f", num_args, kwarg_names)],
+    )
+
+
+@pytest.mark.parametrize(
+    ("source", "num_args", "kwarg_names"),
+    [
+        ("def f(a, b=1): ...", 1, ()),
+        ("def f(a, b=1): ...", 2, ()),
+        ("def f(a, b=1): ...", 0, ("a", "b")),
+        ("def f(a, /, b): ...", 1, ("b",)),
+        ("def f(a, *, b): ...", 1, ("b",)),
+        ("def f(a, *, b=1): ...", 1, ()),
+        ("def f(*args): ...", 3, ()),
+        ("def f(a, **kwargs): ...", 1, ("a_", "b")),
+        ("def f(a, /, **kwargs): ...", 1, ("a",)),
+        ("def f(*args, **kwargs): ...", 2, ("x",)),
+    ],
+)
+def test_calls_that_can_be_bound(source: str, num_args: int, kwarg_names: tuple[str, ...]):
+    assert signature(source).check_call(num_args, kwarg_names) is None
+
+
+@pytest.mark.parametrize(
+    ("source", "num_args", "kwarg_names", "error"),
+    [
+        ("def f(a): ...", 2, (), "takes 1 positional argument(s) but 2 were given"),
+        ("def f(a, b=1): ...", 0, (), "is missing required argument(s): a"),
+        ("def f(a): ...", 1, ("a",), "got multiple values for argument 'a'"),
+        ("def f(a): ...", 1, ("b",), "got an unexpected keyword argument 'b'"),
+        ("def f(a, /): ...", 0, ("a",), "got an unexpected keyword argument 'a'"),
+        ("def f(a, *, b): ...", 2, (), "takes 1 positional argument(s) but 2 were given"),
+        ("def f(a, *, b, c=1): ...", 1, (), "is missing required argument(s): b"),
+        ("def f(*args, b): ...", 3, (), "is missing required argument(s): b"),
+        ("def f(a, **kwargs): ...", 0, ("b",), "is missing required argument(s): a"),
+    ],
+)
+def test_calls_that_cannot_be_bound(
+    source: str, num_args: int, kwarg_names: tuple[str, ...], error: str
+):
+    assert signature(source).check_call(num_args, kwarg_names) == error
+
+
+def test_errors_are_reported():
+    assert check("def f(:") == ["user.py, line 1: invalid syntax"]
+    assert check("def g(a): ...") == ["user.py does not define a function named f"]
+    assert check("def f(): ...") == [
+        "f() in user.py takes 0 positional argument(s) but 1 were given"
+    ]
+
+
+def test_last_definition_is_checked():
+    assert check("def f(): ...\ndef f(a): ...") == []
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        # The name is bound by something other than a plain function definition
+        "f = print\ndef f(): ...",
+        "def f(): ...\nf = print",
+        "def f(): ...\nfor f in [print]: pass",
+        "def f(): ...\ndef rebind():\n    global f\n    f = print\nrebind()",
+        "from builtins import print as f\ndef f(): ...",
+        "def f(): ...\nif True:\n    def f(a): ...",
+        "@staticmethod\ndef f(): ...",
+    ],
+)
+def test_rebound_names_are_not_checked(content: str):
+    assert summarise_module(content).names["f"] is None
+    assert check(content) == []
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "import sys\ndef f(): ...\nsetattr(sys.modules[__name__], 'f', print)",
+        "import sys\ndef f(): ...\nsys.modules[__name__].__dict__['f'] = print",
+        "def f(): ...\nglobals()['f'] = print",
+        "def f(): ...\nexec('f = print')",
+        "import importlib\ndef f(): ...",
+        "from importlib import import_module\ndef f(): ...",
+        "from sys import modules\ndef f(): ...",
+        "import user\ndef f(): ...\nuser.f = print",
+        "from os.path import *\ndef f(): ...",
+        "def f(): ...\ndef __getattr__(name): ...",
+    ],
+)
+def test_dynamic_modules_are_not_checked(content: str):
+    summary = summarise_module(content)
+    assert summary.dynamic
+    assert summary.names["f"] is None
+    assert check(content) == []
+
+
+def test_dynamic_modules_may_define_functions():
+    assert check("import importlib") == []
+    assert check("import os") == ["user.py does not define a function named f"]
@@ -0,0 +1,176 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from tests.helpers import make_programming_task, run_job
+from unicon_backend.evaluator.tasks.programming.artifact import File
+from unicon_backend.evaluator.tasks.programming.base import ProgrammingTask
+from unicon_backend.evaluator.tasks.programming.reference import (
+    MAX_REFERENCE_OUTPUT_SIZE,
+    REFERENCE_OUTPUTS_PREFIX,
+    parse_reference_outputs,
+)
+from unicon_backend.runner import JobResult, Status
+
+REFERENCE_FILE = "def double(x):\n    print('doubling')\n    return [x, x]\n"
+
+
+def reference_testcase(testcase_id: int) -> dict[str, Any]:
+    """A testcase that compares the user input against the output of a reference function"""
+    return {
+        "id": testcase_id,
+        "nodes": [
+            {
+                "id": 1,
+                "type": "INPUT_STEP",
+                "inputs": [],
+                "outputs": [
+                    {"id": "DATA.OUT.FILE", "data": {"name": "ref.py", "content": REFERENCE_FILE}},
+                    {"id": "DATA.OUT.X", "data": testcase_id},
+                ],
+            },
+            {
+                "id": 2,
+                "type": "PY_RUN_FUNCTION_STEP",
+                "function_identifier": "double",
+                "inputs": [{"id": "DATA.IN.FILE"}, {"id": "DATA.IN.ARG.0.x"}],
+                "outputs": [{"id": "DATA.OUT"}],
+            },
+            {
+                "id": 3,
+                "type": "STRING_MATCH_STEP",
+                "inputs": [{"id": "DATA.IN.1"}, {"id": "DATA.IN.2"}],
+                "outputs": [{"id": "DATA.OUT"}],
+            },
+            {"id": 4, "type": "OUTPUT_STEP", "inputs": [{"id": "DATA.IN"}], "outputs": []},
+        ],
+        "edges": [
+            {
+                "id": 1,
+                "from_node_id": 1,
+                "from_socket_id": "DATA.OUT.FILE",
+                "to_node_id": 2,
+                "to_socket_id": "DATA.IN.FILE",
+            },
+            {
+                "id": 2,
+                "from_node_id": 1,
+                "from_socket_id": "DATA.OUT.X",
+                "to_node_id": 2,
+                "to_socket_id": "DATA.IN.ARG.0.x",
+            },
+            {
+                "id": 3,
+                "from_node_id": 0,
+                "from_socket_id": "DATA.IN",
+                "to_node_id": 3,
+                "to_socket_id": "DATA.IN.1",
+            },
+            {
+                "id": 4,
+                "from_node_id": 2,
+                "from_socket_id": "DATA.OUT",
+                "to_node_id": 3,
+                "to_socket_id": "DATA.IN.2",
+            },
+            {
+                "id": 5,
+                "from_node_id": 3,
+                "from_socket_id": "DATA.OUT",
+                "to_node_id": 4,
+                "to_socket_id": "DATA.IN",
+            },
+        ],
+    }
+
+
+def make_reference_task(**environment: Any) -> ProgrammingTask:
+    return make_programming_task(
+        [{"id": "DATA.IN", "data": "[1, 1]"}],
+        [reference_testcase(1), reference_testcase(2)],
+        **{"precompute_reference_outputs": True, **environment},
+    )
+
+
+def test_parse_reference_outputs_takes_the_last_reported_line():
+    stdout = "\n".join(
+        [
+            f'{REFERENCE_OUTPUTS_PREFIX}{{"var_a": "1"}}',
+            "printed by a step",
+            f'{REFERENCE_OUTPUTS_PREFIX}{{"var_a": "2"}}',
+        ]
+    )
+    assert parse_reference_outputs(stdout) == {"var_a": "2"}
+
+
+@pytest.mark.parametrize(
+    "stdout",
+    [
+        "",
+        "no outputs",
+        f"{REFERENCE_OUTPUTS_PREFIX}not json",
+        f"{REFERENCE_OUTPUTS_PREFIX}[1, 2]",
+    ],
+)
+def test_parse_reference_outputs_without_outputs(stdout: str):
+    assert parse_reference_outputs(stdout) == {}
+
+
+def test_parse_reference_outputs_drops_non_literals_and_large_values():
+    sources = {
+        "var_a": "[1, 2]",
+        "var_b": "__import__('os')",
+        "var_c": repr("x" * MAX_REFERENCE_OUTPUT_SIZE),
+        "var_d": 3,
+    }
+    stdout = REFERENCE_OUTPUTS_PREFIX + json.dumps(sources)
+    assert parse_reference_outputs(stdout) == {"var_a": "[1, 2]"}
+
+
+def test_reference_job_is_not_created_without_precomputation():
+    task = make_reference_task(precompute_reference_outputs=False)
+    assert task.create_reference_job() is None
+
+
+def test_reference_job_runs_every_testcase():
+    task = make_reference_task(stop_on_first_failure=True)
+    job = task.create_reference_job()
+    assert job is not None
+    assert [program.id for program in job.programs] == [1, 2]
+    assert not job.context.stop_on_first_failure
+
+
+@pytest.mark.parametrize("fuse_testcases", [False, True])
+def test_reference_results_are_assembled_as_constants(fuse_testcases: bool, tmp_path: Path):
+    task = make_reference_task(fuse_testcases=fuse_testcases)
+    job = task.create_reference_job()
+    assert job is not None
+
+    reference_outputs = task.load_reference_results(run_job(job, tmp_path))
+    assert {testcase_id: outputs.outputs for testcase_id, outputs in reference_outputs.items()} == {
+        1: {"var_2_DATA_OUT": "[1, 1]"},
+        2: {"var_2_DATA_OUT": "[2, 2]"},
+    }
+
+    programs = task.assemble_programs(task.required_inputs)
+    for program in programs:
+        entrypoint = next(file for file in program.files if file.name == "__entrypoint.py")
+        assert isinstance(entrypoint, File)
+        assert "double" not in entrypoint.content
+
+
+def test_failed_reference_programs_are_not_loaded(tmp_path: Path):
+    task = make_reference_task()
+    job = task.create_reference_job()
+    assert job is not None
+
+    job_result = run_job(job, tmp_path)
+    job_result.results[0] = job_result.results[0].model_copy(
+        update={"status": Status.TLE, "stdout": ""}
+    )
+    assert set(task.load_reference_results(job_result)) == {2}
+    assert not task.load_reference_results(
+        JobResult(success=False, error="runner error", results=[], id=job.id)
+    )
@@ -0,0 +1,56 @@
+import hashlib
+
+from unicon_backend.evaluator.tasks.programming.artifact import File
+from unicon_backend.runner import (
+    FILE_TABLE_PROTOCOL_VERSION,
+    ComputeContext,
+    FileRef,
+    RunnerJob,
+    RunnerProgram,
+)
+
+
+def make_program(program_id: int, files: list[File]) -> RunnerProgram:
+    return RunnerProgram(id=program_id, entrypoint=files[0].name, files=list(files))
+
+
+def test_files_are_deduplicated_by_content():
+    shared = File(name="user.py", content="def f(): ...")
+    contents = [f"print({index})" for index in range(100)]
+    programs = [
+        make_program(
+            index,
+            [
+                File(name="__entrypoint.py", content=content),
+                shared,
+                # An equal content that is a different string object
+                File(name="copy.py", content="".join(["def f(): ", "..."])),
+            ],
+        )
+        for index, content in enumerate(contents)
+    ]
+    environment = ComputeContext.model_validate(
+        {
+            "language": "PYTHON",
+            "options": {"version": "3.12"},
+            "time_limit_secs": 1,
+            "memory_limit_mb": 100,
+        }
+    )
+    job = RunnerJob.create(programs, environment, FILE_TABLE_PROTOCOL_VERSION)
+
+    assert len(job.file_table) == len(contents) + 1
+    for program, content in zip(job.programs, contents, strict=True):
+        assert all(isinstance(file, FileRef) for file in program.files)
+        assert [
+            job.file_table[file.hash] for file in program.files if isinstance(file, FileRef)
+        ] == [
+            content,
+            shared.content,
+            shared.content,
+        ]
+        assert all(
+            file.hash == hashlib.sha256(job.file_table[file.hash].encode()).hexdigest()
+            for file in program.files
+            if isinstance(file, FileRef)
+        )
@@ -0,0 +1,78 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from tests.helpers import echo_testcase, make_programming_task, run_job
+from unicon_backend.evaluator.tasks.programming import base
+from unicon_backend.evaluator.tasks.programming.base import ProgrammingTask, RequiredInput
+from unicon_backend.runner import RunnerJob, Status
+from unicon_backend.workers.consumer import grade_job_result
+
+
+def make_echo_task(**environment: Any) -> ProgrammingTask:
+    return make_programming_task(
+        [{"id": "DATA.IN", "data": "hello"}],
+        [echo_testcase(1, "DATA.IN"), echo_testcase(2, "DATA.IN")],
+        stop_on_first_failure=True,
+        **environment,
+    )
+
+
+def grade(task: ProgrammingTask, user_input: str, tmp_path: Path) -> list[Status]:
+    result = task.run([RequiredInput(id="DATA.IN", data=user_input)])
+    assert result.job_message is not None
+    job = RunnerJob.model_validate_json(result.job_message)
+    return [
+        testcase_result.status for testcase_result in grade_job_result(task, run_job(job, tmp_path))
+    ]
+
+
+@pytest.mark.parametrize("fuse_testcases", [False, True])
+def test_correct_outputs_do_not_stop(fuse_testcases: bool, tmp_path: Path):
+    task = make_echo_task(fuse_testcases=fuse_testcases, compare_outputs_in_program=True)
+    assert grade(task, "hello", tmp_path) == [Status.OK, Status.OK]
+
+
+def test_fused_wrong_answer_stops_if_judged_in_program(tmp_path: Path):
+    task = make_echo_task(fuse_testcases=True, compare_outputs_in_program=True)
+    assert grade(task, "bye", tmp_path) == [Status.WA, Status.SKIPPED]
+    assert Status.WA in task.stopping_statuses
+
+
+@pytest.mark.parametrize(
+    "environment",
+    [
+        {"fuse_testcases": True},
+        {"fuse_testcases": False, "compare_outputs_in_program": True},
+    ],
+)
+def test_wrong_answer_does_not_stop_otherwise(environment: dict[str, Any], tmp_path: Path):
+    task = make_echo_task(**environment)
+    assert grade(task, "bye", tmp_path) == [Status.WA, Status.WA]
+    assert Status.WA not in task.stopping_statuses
+
+
+def test_prioritised_testcases_are_run_first_from_the_fused_template(monkeypatch, tmp_path: Path):
+    bye_testcase = echo_testcase(2, "DATA.IN")
+    bye_testcase["nodes"][0]["inputs"][0]["comparison"]["value"] = "bye"
+    task = make_programming_task(
+        [{"id": "DATA.IN", "data": "hello"}],
+        [echo_testcase(1, "DATA.IN"), bye_testcase],
+        stop_on_first_failure=True,
+        fuse_testcases=True,
+        compare_outputs_in_program=True,
+    )
+    task.compile_templates()
+    (tmp_path / "definition_order").mkdir()
+    (tmp_path / "prioritised").mkdir()
+    assert grade(task, "hello", tmp_path / "definition_order") == [Status.OK, Status.WA]
+
+    # The order that the testcases are run in is filled into the template, instead of assembling them again
+    def assemble_fused_testcases(*_args, **_kwargs):
+        raise AssertionError("The fused testcases were assembled again")
+
+    monkeypatch.setattr(base, "assemble_fused_testcases", assemble_fused_testcases)
+    task.prioritise_testcases({2: 1.0})
+    assert task.testcase_run_order == [1, 0]
+    assert grade(task, "hello", tmp_path / "prioritised") == [Status.SKIPPED, Status.WA]
@@ -0,0 +1,74 @@
+import pytest
+
+from tests.helpers import echo_testcase, make_programming_task
+from unicon_backend.evaluator.tasks import TaskEvalStatus
+from unicon_backend.evaluator.tasks.programming.base import RequiredInput
+from unicon_backend.evaluator.tasks.programming.codegen import literal_source
+
+INJECTION = "var_x = 1\nprint('INJECTED')\nvar_x"
+
+
+@pytest.fixture(params=[False, True], ids=["testcases", "fused"])
+def task(request):
+    task = make_programming_task(
+        [{"id": "DATA.OUT.S", "data": "hello"}],
+        [echo_testcase(0, "DATA.OUT.S"), echo_testcase(1, "DATA.OUT.S")],
+        fuse_testcases=request.param,
+    )
+    task.compile_templates()
+    return task
+
+
+def _entrypoints(task, value) -> list[str]:
+    programs = task.assemble_programs([RequiredInput(id="DATA.OUT.S", data=value)])
+    return [
+        file.content
+        for program in programs
+        for file in program.files
+        if file.name == "__entrypoint.py"
+    ]
+
+
+def test_literal_source_rejects_invalid_variable_references():
+    assert literal_source("var_x") == "var_x"
+    for value in [INJECTION, "var_x; import os", "var_x.y", "var_x)"]:
+        with pytest.raises(ValueError):
+            literal_source(value)
+
+
+def test_template_is_filled_with_string_literal(task):
+    for code in _entrypoints(task, 'he"llo\n'):
+        assert "'he\"llo\\n'" in code
+        assert "__unicon_hole" not in code
+
+
+def test_template_rejects_injected_statements(task):
+    with pytest.raises(ValueError):
+        _entrypoints(task, INJECTION)
+
+    result = task.run([RequiredInput(id="DATA.OUT.S", data=INJECTION)])
+    assert result.status == TaskEvalStatus.FAILED
+    assert result.job_message is None
+
+
+def test_templates_match_full_compilation(task):
+    filled = _entrypoints(task, "hello")
+    task._templates = None
+    assert filled == _entrypoints(task, "hello")
+
+
+def test_templates_are_loaded(task):
+    templates = [template.model_dump() for template in task.compile_templates()]
+    task._templates = None
+    task.load_templates(templates)
+    assert [template.model_dump() for template in task._templates] == templates
+
+
+def test_stale_templates_are_ignored(task):
+    templates = [template.model_dump() for template in task.compile_templates()]
+    stale_versions = [{**template, "version": template["version"] - 1} for template in templates]
+    stale_ids = [{**template, "id": template["id"] + 100} for template in templates]
+    for stale in [stale_versions, stale_ids, templates[:0]]:
+        task._templates = None
+        task.load_templates(stale)
+        assert task._templates is None
@@ -6,10 +6,11 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.routing import APIRoute
 
-from unicon_backend.constants import FRONTEND_URL
+from unicon_backend.constants import FRONTEND_URL, RESULTS_CONSUMER_IN_API
 from unicon_backend.logger import setup_rich_logger
 from unicon_backend.routers import auth, organisation, problem, project, role
 from unicon_backend.workers.consumer import task_results_consumer
+from unicon_backend.workers.outbox import outbox_relay
 from unicon_backend.workers.publisher import task_publisher
 
 setup_rich_logger()
@@ -19,13 +20,17 @@ logging.getLogger("pika").setLevel(logging.WARNING)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     _event_loop = asyncio.get_event_loop()
-    task_results_consumer.run(event_loop=_event_loop)
+    if RESULTS_CONSUMER_IN_API:
+        task_results_consumer.run(event_loop=_event_loop)
     task_publisher.run(event_loop=_event_loop)
+    outbox_relay.run(event_loop=_event_loop)
 
     yield
 
+    outbox_relay.stop()
     task_publisher.stop()
-    task_results_consumer.stop()
+    if RESULTS_CONSUMER_IN_API:
+        task_results_consumer.stop()
 
 
 app = FastAPI(title="Unicon 🦄 Backend", lifespan=lifespan, separate_input_output_schemas=False)
@@ -0,0 +1,724 @@
+import json
+import time
+from collections.abc import Callable
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, Annotated
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+if TYPE_CHECKING:
+    from unicon_backend.evaluator.tasks.programming.steps import ComputeGraph, ControlFlowRegion
+
+rich_console = Console()
+app = typer.Typer(name="bench", help="Benchmarks for performance sensitive parts of the backend.")
+
+EXAMPLES_DIR = Path(__file__).parent.parent / "examples"
+DEFAULT_DEFINITIONS = [
+    EXAMPLES_DIR / "breakthrough" / "definition.json",
+    EXAMPLES_DIR / "problem_set" / "definition.json",
+]
+
+
+def _timeit(func: Callable[[], object], iterations: int) -> float:
+    """Return the mean wall time of `func` in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+@app.command(name="codegen")
+def codegen(
+    defn_paths: Annotated[list[Path] | None, typer.Option("--defn")] = None,
+    iterations: Annotated[int, typer.Option("--iterations", "-n")] = 20,
+):
+    """Compare the codegen backends on assembling all testcases of the given definitions."""
+    import ast
+
+    from unicon_backend.evaluator.problem import Problem, ProgrammingTask
+    from unicon_backend.evaluator.tasks.programming.codegen import CODEGEN_BACKENDS
+    from unicon_backend.evaluator.tasks.programming.security import mpi_sandbox
+
+    table = Table(title=f"Codegen backends (mean of {iterations} runs)")
+    table.add_column("Definition", style="magenta")
+    for backend_name in CODEGEN_BACKENDS:
+        table.add_column(f"{backend_name} (ms)", justify="right")
+    table.add_column("Equivalent", justify="center")
+
+    for defn_path in defn_paths or DEFAULT_DEFINITIONS:
+        defn_json = defn_path.read_text()
+        validation_ms = _timeit(partial(Problem.model_validate_json, defn_json), iterations)
+
+        timings: list[float] = []
+        outputs: list[list[str]] = []
+        for backend in CODEGEN_BACKENDS.values():
+
+            def _assemble_all(backend=backend, defn_json=defn_json) -> list[str]:
+                # NOTE: Testcases cache their IR once assembled, so every run starts from a fresh definition
+                defn = Problem.model_validate_json(defn_json)
+                return [
+                    backend.code(
+                        mpi_sandbox(
+                            testcase.run(
+                                task.create_input_step(task.required_inputs), backend=backend
+                            ),
+                            backend,
+                        )
+                    )
+                    for task in defn.tasks
+                    if isinstance(task, ProgrammingTask)
+                    for testcase in task.testcases
+                ]
+
+            outputs.append(_assemble_all())
+            timings.append(_timeit(_assemble_all, iterations) - validation_ms)
+
+        dumps = [[ast.dump(ast.parse(code)) for code in codes] for codes in outputs]
+        table.add_row(
+            defn_path.parent.name,
+            *(f"{timing:.2f}" for timing in timings),
+            "✅" if all(dump == dumps[0] for dump in dumps) else "❌",
+        )
+
+    rich_console.print(table)
+
+
+def _nested_loops_testcase(depth: int, width: int) -> dict:
+    """
+    Return the definition of a synthetic testcase with `depth` nested loops, where the body of every loop is a
+    chain of `width` steps followed by the next loop.
+    """
+    nodes: list[dict] = [
+        {
+            "id": 1,
+            "type": "INPUT_STEP",
+            "inputs": [],
+            "outputs": [{"id": "CONTROL.OUT"}, {"id": "DATA.OUT.VALUE", "data": 1}],
+        }
+    ]
+    edges: list[dict] = []
+
+    def add_node(node: dict) -> int:
+        node["id"] = len(nodes) + 1
+        nodes.append(node)
+        return node["id"]
+
+    def add_edge(from_node_id: int, from_socket_id: str, to_node_id: int, to_socket_id: str):
+        edges.append(
+            {
+                "id": len(edges) + 1,
+                "from_node_id": from_node_id,
+                "from_socket_id": from_socket_id,
+                "to_node_id": to_node_id,
+                "to_socket_id": to_socket_id,
+            }
+        )
+
+    prev_node_id, prev_socket_id = 1, "CONTROL.OUT"
+    outer_loop_id: int | None = None
+    for _ in range(depth):
+        loop_id = add_node(
+            {
+                "type": "LOOP_STEP",
+                "inputs": [{"id": "CONTROL.IN"}, {"id": "CONTROL.IN.PREDICATE"}],
+                "outputs": [{"id": "CONTROL.OUT"}, {"id": "CONTROL.OUT.BODY"}],
+            }
+        )
+        outer_loop_id = outer_loop_id or loop_id
+        add_edge(prev_node_id, prev_socket_id, loop_id, "CONTROL.IN")
+
+        predicate_id = add_node(
+            {
+                "type": "INPUT_STEP",
+                "inputs": [],
+                "outputs": [{"id": "DATA.OUT.PREDICATE", "data": True}],
+            }
+        )
+        add_edge(predicate_id, "DATA.OUT.PREDICATE", loop_id, "CONTROL.IN.PREDICATE")
+
+        prev_node_id, prev_socket_id = loop_id, "CONTROL.OUT.BODY"
+        for _ in range(width):
+            step_id = add_node(
+                {
+                    "type": "STRING_MATCH_STEP",
+                    "inputs": [{"id": "CONTROL.IN"}, {"id": "DATA.IN.A"}, {"id": "DATA.IN.B"}],
+                    "outputs": [{"id": "DATA.OUT"}, {"id": "CONTROL.OUT"}],
+                }
+            )
+            add_edge(prev_node_id, prev_socket_id, step_id, "CONTROL.IN")
+            add_edge(1, "DATA.OUT.VALUE", step_id, "DATA.IN.A")
+            add_edge(1, "DATA.OUT.VALUE", step_id, "DATA.IN.B")
+            prev_node_id, prev_socket_id = step_id, "CONTROL.OUT"
+
+    output_id = add_node(
+        {
+            "type": "OUTPUT_STEP",
+            "inputs": [{"id": "CONTROL.IN"}, {"id": "DATA.IN.VALUE"}],
+            "outputs": [],
+        }
+    )
+    assert outer_loop_id is not None
+    add_edge(outer_loop_id, "CONTROL.OUT", output_id, "CONTROL.IN")
+    add_edge(1, "DATA.OUT.VALUE", output_id, "DATA.IN.VALUE")
+
+    return {"id": 0, "nodes": nodes, "edges": edges}
+
+
+def _recomputed_control_flow(
+    graph: "ComputeGraph", node_ids: set[int] | None = None
+) -> "ControlFlowRegion":
+    """
+    Return the region tree of a graph the way it was computed before `ComputeGraph.control_flow` was cached, where
+    every level of nesting rediscovers (by BFS) the subgraphs of all of its steps and sorts its nodes again.
+    """
+    from unicon_backend.evaluator.tasks.programming.steps import ControlFlowRegion
+
+    # NOTE: The IR also has the placeholder of the user input step, which is part of the main flow
+    ir = graph.ir
+    excluded_node_ids = ir.node_indices.keys() - node_ids if node_ids is not None else set()
+    subgraph_node_ids: set[int] = set()
+    for node in ir.nodes:
+        if node.id not in excluded_node_ids:
+            subgraph_node_ids |= node.get_all_subgraph_node_ids(graph)
+
+    nodes = graph.topological_sort(subgraph_node_ids | excluded_node_ids)
+    return ControlFlowRegion(
+        nodes,
+        {
+            node.id: {
+                socket_id: _recomputed_control_flow(
+                    graph, node.get_subgraph_node_ids(socket_id, graph)
+                )
+                for socket_id in node.subgraph_socket_ids
+            }
+            for node in nodes
+            if node.subgraph_socket_ids
+        },
+    )
+
+
+def _region_node_ids(region: "ControlFlowRegion") -> tuple:
+    """Return the node ids of a region tree in flow order, to compare region trees"""
+    return (
+        [node.id for node in region.nodes],
+        {
+            node_id: {
+                socket_id: _region_node_ids(subregion)
+                for socket_id, subregion in sorted(subregions.items())
+            }
+            for node_id, subregions in region.subregions.items()
+        },
+    )
+
+
+@app.command(name="control-flow")
+def control_flow(
+    depths: Annotated[list[int] | None, typer.Option("--depth")] = None,
+    width: Annotated[int, typer.Option("--width")] = 4,
+    iterations: Annotated[int, typer.Option("--iterations", "-n")] = 20,
+):
+    """
+    Compare the cached region tree of synthetic testcases with deeply nested loops (`ComputeGraph.control_flow`)
+    against recomputing it at every level of nesting, and assemble them.
+    """
+    from unicon_backend.evaluator.tasks.programming.base import Testcase
+    from unicon_backend.evaluator.tasks.programming.codegen import CODEGEN_BACKENDS
+
+    table = Table(title=f"Nested loops, {width} steps per loop body (mean of {iterations} runs)")
+    table.add_column("Depth", justify="right", style="magenta")
+    table.add_column("Steps", justify="right")
+    table.add_column("Recomputed (ms)", justify="right")
+    table.add_column("Cached (ms)", justify="right")
+    table.add_column("Equivalent", justify="center")
+    for backend_name in CODEGEN_BACKENDS:
+        table.add_column(f"{backend_name} (ms)", justify="right")
+
+    for depth in depths or list(range(5, 11)):
+        testcase_json = json.dumps(_nested_loops_testcase(depth, width))
+
+        testcase = Testcase.model_validate_json(testcase_json)
+
+        def _cached_control_flow(testcase=testcase) -> "ControlFlowRegion":
+            testcase.__dict__.pop("control_flow", None)
+            return testcase.control_flow
+
+        # NOTE: Both build on the IR of the graph, which is built once here
+        equivalent = _region_node_ids(_recomputed_control_flow(testcase)) == _region_node_ids(
+            _cached_control_flow()
+        )
+        recomputed_ms = _timeit(partial(_recomputed_control_flow, testcase), iterations)
+        cached_ms = _timeit(_cached_control_flow, iterations)
+
+        timings: list[float] = []
+        for backend in CODEGEN_BACKENDS.values():
+            elapsed = 0.0
+            for _ in range(iterations):
+                # NOTE: Testcases cache their IR once assembled, so every run starts from a fresh testcase
+                testcase = Testcase.model_validate_json(testcase_json)
+                start = time.perf_counter()
+                backend.code(testcase.run(backend=backend))
+                elapsed += time.perf_counter() - start
+            timings.append(elapsed * 1000 / iterations)
+
+        table.add_row(
+            str(depth),
+            str(len(json.loads(testcase_json)["nodes"])),
+            f"{recomputed_ms:.2f}",
+            f"{cached_ms:.2f}",
+            "✅" if equivalent else "❌",
+            *(f"{timing:.2f}" for timing in timings),
+        )
+
+    rich_console.print(table)
+
+
+@app.command(name="compile")
+def compile_testcases(
+    defn_paths: Annotated[list[Path] | None, typer.Option("--defn")] = None,
+    workers: Annotated[list[int] | None, typer.Option("--workers", "-w")] = None,
+    copies: Annotated[int, typer.Option("--copies", help="Copies of every testcase")] = 16,
+    iterations: Annotated[int, typer.Option("--iterations", "-n")] = 5,
+):
+    """Compare compiling the testcases of a task serially and in a process pool, and the cost of pickling them."""
+    import pickle
+
+    from unicon_backend.evaluator.problem import Problem, ProgrammingTask
+    from unicon_backend.evaluator.tasks.programming.base import Testcase, assemble_testcases
+
+    workers = workers or [2, 4]
+    table = Table(title=f"Compiling {copies} copies of every testcase (mean of {iterations} runs)")
+    table.add_column("Definition", style="magenta")
+    table.add_column("Testcases", justify="right")
+    table.add_column("Pickled (KB)", justify="right")
+    table.add_column("Pickle (ms)", justify="right")
+    table.add_column("Unpickle (ms)", justify="right")
+    table.add_column("Serial (ms)", justify="right")
+    for max_workers in workers:
+        table.add_column(f"{max_workers} workers (ms)", justify="right")
+
+    for defn_path in defn_paths or DEFAULT_DEFINITIONS:
+        defn_json = defn_path.read_text()
+        task = next(
+            task
+            for task in Problem.model_validate_json(defn_json).tasks
+            if isinstance(task, ProgrammingTask)
+        )
+        testcases_json = [
+            testcase.model_copy(update={"id": index}).model_dump_json(serialize_as_any=True)
+            for index, testcase in enumerate(task.testcases * copies)
+        ]
+        user_input_step = task.create_input_step(task.required_inputs)
+
+        def _compile(max_workers: int, testcases_json=testcases_json, step=user_input_step):
+            # NOTE: Testcases cache their IR once assembled, so every run starts from fresh testcases
+            testcases = [Testcase.model_validate_json(testcase) for testcase in testcases_json]
+            start = time.perf_counter()
+            assemble_testcases(testcases, step, max_workers=max_workers)
+            return time.perf_counter() - start
+
+        def _mean_ms(max_workers: int) -> float:
+            return sum(_compile(max_workers) for _ in range(iterations)) * 1000 / iterations
+
+        payload = (
+            [Testcase.model_validate_json(testcase) for testcase in testcases_json],
+            user_input_step,
+        )
+        pickled = pickle.dumps(payload)
+        for max_workers in workers:
+            # Warm up the pool, so that spawning the workers is not measured
+            _compile(max_workers)
+
+        table.add_row(
+            defn_path.parent.name,
+            str(len(testcases_json)),
+            f"{len(pickled) / 1024:.1f}",
+            f"{_timeit(partial(pickle.dumps, payload), iterations):.2f}",
+            f"{_timeit(partial(pickle.loads, pickled), iterations):.2f}",
+            f"{_mean_ms(0):.2f}",
+            *(f"{_mean_ms(max_workers):.2f}" for max_workers in workers),
+        )
+
+    rich_console.print(table)
+
+
+@app.command(name="sandbox")
+def sandbox_startup(
+    preload: Annotated[list[str] | None, typer.Option("--preload")] = None,
+    testcases: Annotated[list[int] | None, typer.Option("--testcases", "-t")] = None,
+    iterations: Annotated[int, typer.Option("--iterations", "-n")] = 10,
+):
+    """
+    Compare the start-up time of sandboxed programs for every sandbox start method.
+    Every testcase calls a user function once, in a new worker (fused with `PROCESS` isolation).
+    """
+    import subprocess
+    import sys
+    import tempfile
+
+    from unicon_backend.evaluator.tasks.programming.codegen import DEFAULT_CODEGEN_BACKEND
+    from unicon_backend.evaluator.tasks.programming.security import (
+        SandboxOptions,
+        fused_mpi_sandbox,
+    )
+    from unicon_backend.runner import TestcaseIsolation
+
+    backend = DEFAULT_CODEGEN_BACKEND
+    preload = preload or ["numpy"]
+    testcases = testcases or [1, 8]
+    modes = {
+        "spawn": SandboxOptions(),
+        "forkserver": SandboxOptions("forkserver"),
+        f"forkserver + {', '.join(preload)}": SandboxOptions("forkserver", tuple(preload)),
+    }
+    # The user module imports the preloaded modules, so that every mode does the same work
+    user_code = "".join(f"import {module}\n" for module in preload) + "def f():\n    return 1\n"
+    program = backend.parse_module("print(json.dumps(call_function_safe('user', 'f', False)[0]))")
+
+    table = Table(title=f"Sandbox start-up (mean of {iterations} runs)")
+    table.add_column("Mode", style="magenta")
+    for num_testcases in testcases:
+        table.add_column(f"{num_testcases} testcases (ms)", justify="right")
+
+    with tempfile.TemporaryDirectory() as program_dir:
+        (Path(program_dir) / "user.py").write_text(user_code)
+
+        def _run_ms(options: SandboxOptions, num_testcases: int) -> float:
+            entrypoint = Path(program_dir) / "__entrypoint.py"
+            entrypoint.write_text(
+                backend.code(
+                    fused_mpi_sandbox(
+                        [(index, program) for index in range(num_testcases)],
+                        TestcaseIsolation.PROCESS,
+                        backend,
+                        options,
+                    )
+                )
+            )
+            run = partial(
+                subprocess.run,
+                [sys.executable, entrypoint.name],
+                cwd=program_dir,
+                check=True,
+                capture_output=True,
+            )
+            run()
+            return _timeit(run, iterations)
+
+        for mode, options in modes.items():
+            table.add_row(mode, *(f"{_run_ms(options, n):.1f}" for n in testcases))
+
+    rich_console.print(table)
+
+
+@app.command(name="transport")
+def sandbox_transport(
+    sizes: Annotated[list[int] | None, typer.Option("--size", "-s")] = None,
+    calls: Annotated[int, typer.Option("--calls", "-c")] = 10,
+):
+    """
+    Compare moving values returned from user functions through the worker queues and through shared memory.
+    Every program calls a user function returning a `bytearray` of the given size (in KiB) `calls` times.
+    """
+    import subprocess
+    import sys
+    import tempfile
+
+    from unicon_backend.evaluator.tasks.programming.codegen import DEFAULT_CODEGEN_BACKEND
+    from unicon_backend.evaluator.tasks.programming.security import SandboxOptions, mpi_sandbox
+
+    backend = DEFAULT_CODEGEN_BACKEND
+    sizes = sizes or [64, 1024, 16 * 1024, 64 * 1024]
+    modes = {"queue": SandboxOptions(shared_memory_threshold=0), "shared memory": SandboxOptions()}
+
+    table = Table(title=f"Sandbox transport (mean of {calls} calls)")
+    table.add_column("Mode", style="magenta")
+    for size in sizes:
+        table.add_column(f"{size} KiB (ms)", justify="right")
+
+    with tempfile.TemporaryDirectory() as program_dir:
+        (Path(program_dir) / "user.py").write_text("def f(size):\n    return bytearray(size)\n")
+
+        def _call_ms(options: SandboxOptions, size: int) -> float:
+            # NOTE: Timed inside the program, so that the start-up of the worker is not included
+            program = backend.parse_module(
+                "import time\n"
+                "call_function_safe('user', 'f', False, 0)\n"
+                "start = time.perf_counter()\n"
+                f"for _ in range({calls}):\n"
+                f"    call_function_safe('user', 'f', False, {size * 1024})\n"
+                f"print((time.perf_counter() - start) * 1000 / {calls})\n"
+            )
+            entrypoint = Path(program_dir) / "__entrypoint.py"
+            entrypoint.write_text(backend.code(mpi_sandbox(program, backend, options)))
+            output = subprocess.run(
+                [sys.executable, entrypoint.name],
+                cwd=program_dir,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            return float(output)
+
+        for mode, options in modes.items():
+            table.add_row(mode, *(f"{_call_ms(options, size):.2f}" for size in sizes))
+
+    rich_console.print(table)
+
+
+@app.command(name="comparison")
+def output_comparison(
+    sizes: Annotated[list[int] | None, typer.Option("--size", "-s")] = None,
+    iterations: Annotated[int, typer.Option("--iterations", "-n")] = 5,
+):
+    """
+    Compare the comparison operators on outputs that are square matrices of floats with the given number of
+    elements, as `TaskResultsConsumer` judges them. Decoding the output, which the consumer does first, is timed
+    separately.
+    """
+    import math
+    import random
+    from unittest import mock
+
+    from unicon_backend.evaluator.tasks.programming import comparison
+    from unicon_backend.evaluator.tasks.programming.steps import Comparison, Operator
+
+    sizes = sizes or [256, 4096, 64 * 1024, 1024 * 1024]
+    modes = {"pure Python": math.inf}
+    if comparison._numpy() is not None:
+        modes["NumPy"] = 0
+    operators = {
+        Operator.EQUAL: {},
+        Operator.ARRAY_EQUAL: {},
+        Operator.APPROXIMATELY_EQUAL: {"rel_tol": 1e-6},
+    }
+
+    table = Table(title=f"Output comparison (mean of {iterations} runs)")
+    table.add_column("Operator", style="magenta")
+    table.add_column("Mode")
+    for size in sizes:
+        table.add_column(f"{size} elements (ms)", justify="right")
+
+    random.seed(0)
+    outputs: list[tuple[list, str]] = []
+    for size in sizes:
+        side = math.isqrt(size)
+        expected = [[random.random() for _ in range(side)] for _ in range(side)]
+        # NOTE: The output differs from the expected value in the last element, so that all of it is compared
+        actual = [row.copy() for row in expected]
+        actual[-1][-1] += 1e-12
+        outputs.append((expected, json.dumps(actual)))
+
+    table.add_row(
+        "(decode)",
+        "",
+        *(f"{_timeit(partial(json.loads, stdout), iterations):.2f}" for _, stdout in outputs),
+    )
+    for operator, tolerances in operators.items():
+        for mode, numpy_min_size in modes.items():
+            # NOTE: `=` is never evaluated with NumPy
+            if operator == Operator.EQUAL and mode != "pure Python":
+                continue
+            timings: list[float] = []
+            with mock.patch.object(comparison, "NUMPY_MIN_SIZE", numpy_min_size):
+                for expected, stdout in outputs:
+                    output = json.loads(stdout)
+                    compare = Comparison(operator=operator, value=expected, **tolerances).compare
+                    timings.append(_timeit(partial(compare, output), iterations))
+            table.add_row(operator.value, mode, *(f"{timing:.2f}" for timing in timings))
+
+    rich_console.print(table)
+
+
+@app.command(name="publish")
+def publish_load(
+    submits: Annotated[int, typer.Option("--submits", "-n")] = 500,
+    threads: Annotated[int, typer.Option("--threads", "-t")] = 200,
+    size: Annotated[int, typer.Option("--size", "-s")] = 16,
+):
+    """
+    Load test publishing jobs (of the given size in KiB) from many threads at once, as concurrent submissions do,
+    against the broker at `RABBITMQ_URL`. Jobs are published to a separate queue, which is deleted afterwards.
+    """
+    import asyncio
+    import statistics
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    from unicon_backend.constants import TASK_QUEUE_NAME
+    from unicon_backend.lib.amqp import PublishError
+    from unicon_backend.workers.publisher import TaskPublisher
+
+    queue_name = f"{TASK_QUEUE_NAME}.bench"
+    payload = json.dumps({"payload": "x" * size * 1024})
+    publisher = TaskPublisher(queue_name)
+    # NOTE: As in the app, the publisher runs on an event loop while submissions publish from other threads
+    event_loop = asyncio.new_event_loop()
+    loop_thread = threading.Thread(target=event_loop.run_forever, daemon=True)
+    loop_thread.start()
+
+    async def _run_publisher():
+        publisher.run(event_loop)
+
+    asyncio.run_coroutine_threadsafe(_run_publisher(), event_loop).result()
+
+    def _submit(_index: int) -> float | None:
+        start = time.perf_counter()
+        try:
+            publisher.publish(payload).result(timeout=publisher.timeout_secs)
+        except (PublishError, TimeoutError):
+            return None
+        return (time.perf_counter() - start) * 1000
+
+    try:
+        # The first job waits for the connection to be set up
+        if _submit(0) is None:
+            rich_console.print(f"Failed to publish to {queue_name}")
+            raise typer.Exit(1)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(threads) as executor:
+            latencies = list(executor.map(_submit, range(submits)))
+        elapsed = time.perf_counter() - start
+    finally:
+
+        async def _stop_publisher():
+            # NOTE: The queue is deleted before the channel is closed, as frames are sent in order
+            if publisher._channel is not None:
+                publisher._channel.queue_delete(queue_name)
+            publisher.stop()
+
+        asyncio.run_coroutine_threadsafe(_stop_publisher(), event_loop).result()
+        deadline = time.monotonic() + publisher.timeout_secs
+        while publisher._connection is not None and not publisher._connection.is_closed:
+            if time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        event_loop.call_soon_threadsafe(event_loop.stop)
+        loop_thread.join()
+
+    confirmed = sorted(latency for latency in latencies if latency is not None)
+    table = Table(title=f"Publishing {submits} jobs of {size} KiB from {threads} threads")
+    for column in ["Confirmed", "Failed", "Jobs/s", "p50 (ms)", "p99 (ms)", "Max (ms)"]:
+        table.add_column(column, justify="right")
+    quantiles = statistics.quantiles(confirmed, n=100) if len(confirmed) > 1 else confirmed * 99
+    table.add_row(
+        str(len(confirmed)),
+        str(submits - len(confirmed)),
+        f"{submits / elapsed:.0f}",
+        f"{quantiles[49]:.1f}" if quantiles else "-",
+        f"{quantiles[98]:.1f}" if quantiles else "-",
+        f"{confirmed[-1]:.1f}" if confirmed else "-",
+    )
+    rich_console.print(table)
+
+
+@app.command(name="ingest")
+def result_ingest(
+    results: Annotated[int, typer.Option("--results", "-n")] = 1000,
+    latency: Annotated[float, typer.Option("--latency", "-l")] = 5.0,
+    prefetch: Annotated[int, typer.Option("--prefetch", "-p")] = 64,
+    batch_size: Annotated[int, typer.Option("--batch-size", "-b")] = 32,
+):
+    """
+    Compare ingesting job results on the event loop against thread pools of increasing size, one by one and in
+    batches, when every round trip to the database blocks for `latency` milliseconds. Results are delivered as the
+    broker does, with at most `prefetch` of them unacknowledged, and the lag of the event loop is measured as the
+    app would see it.
+    """
+    import asyncio
+    from types import SimpleNamespace
+
+    from unicon_backend.lib.amqp import AsyncConsumer, ExchangeType
+
+    class _BenchConsumer(AsyncConsumer):
+        def message_callback(self, _basic_deliver, _properties, _body):
+            time.sleep(latency / 1000)
+
+        def batch_callback(self, _messages):
+            # NOTE: A batch is ingested with one query, update and commit
+            time.sleep(latency / 1000)
+
+    class _Channel:
+        """Stands in for the channel of the broker, delivering the next results once they are acknowledged"""
+
+        is_open = True
+
+        def __init__(self, consumer: AsyncConsumer, done: asyncio.Event):
+            self.consumer = consumer
+            self.done = done
+            self.delivered = self.settled = 0
+
+        def deliver(self, count: int):
+            # NOTE: Deliveries are scheduled as the connection would, so that the loop can run in between
+            for _ in range(min(count, results - self.delivered)):
+                self.delivered += 1
+                basic_deliver = SimpleNamespace(delivery_tag=self.delivered, redelivered=False)
+                properties = SimpleNamespace(content_encoding=None)
+                asyncio.get_running_loop().call_soon(
+                    self.consumer.on_message,
+                    self,
+                    basic_deliver,
+                    properties,
+                    b"{}",
+                )
+
+        def basic_ack(self, delivery_tag: int, multiple: bool = False):
+            settled = delivery_tag - self.settled if multiple else 1
+            self.settled += settled
+            if self.settled == results:
+                self.done.set()
+            self.deliver(settled)
+
+        def basic_nack(self, delivery_tag: int, requeue: bool = True):
+            self.basic_ack(delivery_tag)
+
+    async def _ingest(workers: int, batch_size: int) -> tuple[float, float]:
+        consumer = _BenchConsumer(
+            "",
+            "",
+            ExchangeType.topic,
+            "bench",
+            prefetch_count=prefetch,
+            max_workers=workers,
+            batch_size=batch_size,
+            batch_timeout_ms=latency,
+        )
+        consumer._event_loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+        channel = _Channel(consumer, done)
+        max_lag = 0.0
+
+        async def _measure_lag():
+            nonlocal max_lag
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                max_lag = max(max_lag, time.perf_counter() - start - 0.001)
+
+        lag_task = asyncio.create_task(_measure_lag())
+        start = time.perf_counter()
+        channel.deliver(prefetch)
+        await done.wait()
+        elapsed = time.perf_counter() - start
+        await lag_task
+        if consumer._executor is not None:
+            consumer._executor.shutdown()
+        return results / elapsed, max_lag * 1000
+
+    table = Table(
+        title=f"Ingesting {results} results with {latency} ms per round trip and a prefetch of {prefetch}"
+    )
+    for column in ["Workers", "Batch size", "Results/s", "Max loop lag (ms)"]:
+        table.add_column(column, justify="right")
+    for workers in [0, 1, 4, 8]:
+        for size in sorted({1, batch_size}):
+            throughput, max_lag = asyncio.run(_ingest(workers, size))
+            table.add_row(
+                str(workers) if workers else "event loop",
+                str(size),
+                f"{throughput:.0f}",
+                f"{max_lag:.1f}",
+            )
+    rich_console.print(table)
@@ -5,8 +5,14 @@ from rich.console import Console
 from rich.syntax import Syntax
 from rich.table import Table
 
+from unicon_backend import bench
+
 rich_console = Console()
 app = typer.Typer(name="Unicon 🦄 CLI")
+app.add_typer(bench.app)
+
+worker_app = typer.Typer(name="worker", help="Workers that run separately from the API.")
+app.add_typer(worker_app)
 
 
 @app.command(name="seed")
@@ -38,11 +44,16 @@ def seed(username: str, password: str):
 
 
 @app.command(name="assemble")
-def assemble(defn_file: Annotated[typer.FileText, typer.Option("--defn", mode="r")]):
+def assemble(
+    defn_file: Annotated[typer.FileText, typer.Option("--defn", mode="r")],
+    backend_name: Annotated[str, typer.Option("--backend")] = "libcst",
+):
     """Assemble the programs for all programming tasks in the given definition file."""
     from unicon_backend.evaluator.problem import Problem, ProgrammingTask
+    from unicon_backend.evaluator.tasks.programming.codegen import get_codegen_backend
     from unicon_backend.models.problem import TaskType
 
+    backend = get_codegen_backend(backend_name)
     defn = Problem.model_validate_json(defn_file.read())
     for task in defn.tasks:
         if task.type != TaskType.PROGRAMMING:
@@ -59,15 +70,86 @@ def assemble(defn_file: Annotated[typer.FileText, typer.Option("--defn", mode="r
         # the task directly from the given definition for a quick test
         user_input_step = task.create_input_step(task.required_inputs)
         for testcase in task.testcases:
-            assembled_prog = testcase.run(user_input_step)
+            assembled_prog = testcase.run(user_input_step, backend=backend)
 
             syntax_highlighted_code = Syntax(
-                assembled_prog.code, "python", theme="material", line_numbers=True, word_wrap=True
+                backend.code(assembled_prog),
+                "python",
+                theme="material",
+                line_numbers=True,
+                word_wrap=True,
             )
             table.add_row(str(testcase.id), syntax_highlighted_code)
 
         rich_console.print(table)
 
 
+def _consume_results() -> int:
+    """Consume job results until the process is stopped. Returns the exit code of the process."""
+    import asyncio
+    import logging
+    import signal
+
+    from unicon_backend.logger import setup_rich_logger
+    from unicon_backend.workers.consumer import task_results_consumer
+
+    setup_rich_logger()
+    logging.getLogger("pika").setLevel(logging.WARNING)
+
+    async def _consume() -> int:
+        event_loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            event_loop.add_signal_handler(signum, task_results_consumer.stop)
+        task_results_consumer.run(event_loop)
+        await task_results_consumer.closed.wait()
+        # NOTE: The worker fails if the connection is lost, so that it is restarted by its supervisor
+        return 0 if task_results_consumer.closing else 1
+
+    return asyncio.run(_consume())
+
+
+def _consume_results_process():
+    raise SystemExit(_consume_results())
+
+
+@worker_app.command(name="results")
+def consume_results(processes: Annotated[int, typer.Option("--processes", "-p")] = 1):
+    """
+    Consume the results of jobs separately from the API, in the given number of processes (each with its own
+    connection). The API should be started with `RESULTS_CONSUMER_IN_API=false`.
+    """
+    if processes <= 1:
+        raise typer.Exit(_consume_results())
+
+    import multiprocessing
+    import signal
+    from multiprocessing.connection import wait
+
+    # NOTE: Processes are spawned, so that they do not inherit the connections of the database pool
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_consume_results_process, name=f"results-{index}")
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def _stop_workers(*_args):
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    # NOTE: The workers stop gracefully on SIGTERM, and receive SIGINT from the terminal themselves
+    signal.signal(signal.SIGTERM, _stop_workers)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Once a worker exits, the others are stopped as well and the command exits as the worker did
+    exited = wait([worker.sentinel for worker in workers])
+    exit_code = next(worker.exitcode for worker in workers if worker.sentinel in exited)
+    _stop_workers()
+    for worker in workers:
+        worker.join()
+    raise typer.Exit(abs(exit_code or 0))
+
+
 if __name__ == "__main__":
     app()
@@ -17,6 +17,43 @@ RABBITMQ_URL: str = _get_env_var("RABBITMQ_URL")
 SECRET_KEY: str = _get_env_var("SECRET_KEY", "", required=False)
 FRONTEND_URL: str = _get_env_var("FRONTEND_URL", required=False)
 
+# Backend used to assemble testcase programs, one of "libcst" or "ast"
+CODEGEN_BACKEND: str = _get_env_var("CODEGEN_BACKEND", "libcst")
+# Number of processes used to compile the testcases of a task concurrently, 0 compiles them in the calling thread
+TESTCASE_COMPILE_WORKERS: int = int(_get_env_var("TESTCASE_COMPILE_WORKERS", "0"))
+# Version of the runner job protocol that is published, only raise this once all runners support it
+RUNNER_PROTOCOL_VERSION: int = int(_get_env_var("RUNNER_PROTOCOL_VERSION", "1"))
+# Number of most recent results of a task that the failure rates of its testcases are computed from
+TESTCASE_FAILURE_HISTORY: int = int(_get_env_var("TESTCASE_FAILURE_HISTORY", "500"))
+# Seconds that every API process caches the failure rates of the testcases of a task for
+TESTCASE_FAILURE_RATES_TTL_SECS: float = float(
+    _get_env_var("TESTCASE_FAILURE_RATES_TTL_SECS", "60")
+)
+
+# Compression of published messages, one of "gzip" or "zstd" (requires `zstandard`), disabled if not set
+# Only messages of at least the threshold (in bytes) are compressed. Consumers always accept compressed messages.
+MESSAGE_COMPRESSION: str | None = _get_env_var("MESSAGE_COMPRESSION", required=False)
+MESSAGE_COMPRESSION_THRESHOLD: int = int(_get_env_var("MESSAGE_COMPRESSION_THRESHOLD", "65536"))
+
+# Number of published jobs that can wait for the broker to confirm them, before submissions wait for room
+PUBLISH_MAX_IN_FLIGHT: int = int(_get_env_var("PUBLISH_MAX_IN_FLIGHT", "256"))
+# Seconds that a submission waits for room to publish its job, and for the broker to confirm it
+PUBLISH_TIMEOUT_SECS: float = float(_get_env_var("PUBLISH_TIMEOUT_SECS", "10"))
+# Number of outbox messages that are relayed at once, and seconds between checks of the outbox for messages written
+# by other replicas (messages of submissions to this replica are relayed right away)
+OUTBOX_BATCH_SIZE: int = int(_get_env_var("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_INTERVAL_SECS: float = float(_get_env_var("OUTBOX_POLL_INTERVAL_SECS", "1"))
+# Number of job results that are delivered to the results consumer at once, and threads that ingest them
+# (0 ingests them on the event loop of the app)
+RESULT_PREFETCH_COUNT: int = int(_get_env_var("RESULT_PREFETCH_COUNT", "16"))
+RESULT_WORKERS: int = int(_get_env_var("RESULT_WORKERS", "4"))
+# Number of job results that are ingested at once (with one update), and how long to wait for a batch to fill.
+# NOTE: The prefetch count should be at least the batch size for batches to fill.
+RESULT_BATCH_SIZE: int = int(_get_env_var("RESULT_BATCH_SIZE", "1"))
+RESULT_BATCH_TIMEOUT_MS: float = float(_get_env_var("RESULT_BATCH_TIMEOUT_MS", "50"))
+# Whether the API consumes job results itself. Turn off if results are consumed by `worker results` instead.
+RESULTS_CONSUMER_IN_API: bool = _get_env_var("RESULTS_CONSUMER_IN_API", "true").lower() != "false"
+
 EXCHANGE_NAME = _get_env_var("EXCHANGE_NAME", "unicon")
 TASK_QUEUE_NAME = _get_env_var("WORK_QUEUE_NAME", "unicon.tasks")
 RESULT_QUEUE_NAME = _get_env_var("RESULT_QUEUE_NAME", "unicon.results")
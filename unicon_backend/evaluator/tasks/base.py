@@ -2,7 +2,7 @@ import abc
 from enum import Enum
 from typing import Any, Generic, TypeVar
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 TaskUserInput = TypeVar("TaskUserInput")
 TaskResult = TypeVar("TaskResult")
@@ -27,6 +27,9 @@ class TaskEvalResult(BaseModel, Generic[TaskResult]):
     status: TaskEvalStatus
     result: TaskResult | None
     error: str | None = None
+    # NOTE: The message of the job that evaluates a pending task, which must only be published once the result is
+    # stored (see `OutboxMessageORM`)
+    job_message: str | None = Field(default=None, exclude=True)
 
 
 class Task(BaseModel, abc.ABC, Generic[TaskUserInput, TaskResult]):
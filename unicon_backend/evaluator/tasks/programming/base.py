@@ -1,30 +1,94 @@
-from functools import cached_property
+import hashlib
+import json
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache, cached_property
+from itertools import repeat
 from logging import getLogger
-from typing import Any, Literal, Self, cast
+from typing import Any, Final, Literal, Self, cast
 
-from pydantic import BaseModel, RootModel, model_validator
+from pydantic import BaseModel, PrivateAttr, RootModel, model_validator
 
+from unicon_backend.constants import (
+    CODEGEN_BACKEND,
+    RUNNER_PROTOCOL_VERSION,
+    TESTCASE_COMPILE_WORKERS,
+)
 from unicon_backend.evaluator.tasks import Task, TaskEvalResult, TaskEvalStatus, TaskType
 from unicon_backend.evaluator.tasks.programming.artifact import File, PrimitiveData
-from unicon_backend.evaluator.tasks.programming.security import mpi_sandbox
+from unicon_backend.evaluator.tasks.programming.codegen import (
+    CodegenBackend,
+    Program,
+    check_identifier,
+    get_codegen_backend,
+    literal_source,
+)
+from unicon_backend.evaluator.tasks.programming.preflight import (
+    UserFunctionCall,
+    check_user_files,
+)
+from unicon_backend.evaluator.tasks.programming.reference import (
+    assemble_reference_code,
+    parse_reference_outputs,
+)
+from unicon_backend.evaluator.tasks.programming.security import (
+    DEFAULT_SANDBOX_OPTIONS,
+    FUSED_TESTCASE_ID_KEY,
+    ParameterisedProgram,
+    SandboxOptions,
+    fused_mpi_sandbox,
+    mpi_sandbox,
+)
 from unicon_backend.evaluator.tasks.programming.steps import (
+    USER_INPUT_STEP_ID,
     ComputeGraph,
     InputStep,
     OutputStep,
+    PyRunFunctionStep,
+    SocketId,
     StepSocket,
     StepType,
 )
 from unicon_backend.lib.common import CustomSQLModel
-from unicon_backend.runner import ComputeContext, JobId, ProgramResult, RunnerJob, RunnerProgram
-from unicon_backend.workers.publisher import task_publisher
+from unicon_backend.runner import (
+    ComputeContext,
+    JobId,
+    JobResult,
+    ProgramResult,
+    RunnerJob,
+    RunnerProgram,
+    Status,
+    StepProfiling,
+    TestcaseIsolation,
+)
 
 logger = getLogger(__name__)
 
-USER_INPUT_STEP_ID: int = 0
+# NOTE: Bump this whenever the assembled program of a testcase changes so that stale templates are recompiled
+TESTCASE_TEMPLATE_VERSION: Final[int] = 8
+
+# NOTE: The program (and template) that runs all testcases of a task when they are fused uses this id
+FUSED_PROGRAM_ID: Final[int] = -1
+
+_TEMPLATE_HOLE_PATTERN = re.compile(r"""(["'])(__unicon_hole_(?:\d+|order)__)\1""")
+# NOTE: The fused template is filled with the order that its testcases are run in (see `fused_mpi_sandbox`)
+_TESTCASE_ORDER_HOLE: Final[str] = "__unicon_hole_order__"
+
+
+class TestcaseRow(BaseModel):
+    """The inputs of one of the testcases that a parameterised testcase is run as"""
+
+    # The id of the testcase that the row is reported as
+    id: int
+    # Values of the outputs of input steps that differ from those of the graph, by input step id and socket id
+    inputs: dict[int, dict[SocketId, PrimitiveData]]
 
 
 class Testcase(ComputeGraph):
     id: int
+    # NOTE: A parameterised testcase is run once for every row (in a single program), instead of once as itself
+    rows: list[TestcaseRow] | None = None
 
     @model_validator(mode="after")
     def check_exactly_one_output_step(self) -> Self:
@@ -33,10 +97,286 @@ class Testcase(ComputeGraph):
             raise ValueError(f"Expected exactly 1 output step, found {num_output_steps}")
         return self
 
+    @model_validator(mode="after")
+    def check_row_inputs(self) -> Self:
+        if self.rows is None:
+            return self
+        if not self.rows:
+            raise ValueError(f"Parameterised testcase {self.id} has no rows")
+
+        input_sockets = {
+            (node.id, socket.id): socket
+            for node in self.nodes
+            if node.type == StepType.INPUT and node.id != USER_INPUT_STEP_ID
+            for socket in node.data_out
+        }
+        # NOTE: The arguments of rows (and the defaults of the inputs they set) are assembled into a table outside
+        # of the testcase program, where references to program variables (see `literal_source`) are not bound
+        for row in self.rows:
+            for step_id, inputs in row.inputs.items():
+                for socket_id, value in inputs.items():
+                    socket = input_sockets.get((step_id, socket_id))
+                    if socket is None or isinstance(socket.data, File):
+                        raise ValueError(
+                            f"Row {row.id} sets {socket_id} of step {step_id}, which is not a primitive input"
+                        )
+                    for data in (value, socket.data):
+                        if isinstance(data, str) and data.startswith("var_"):
+                            raise ValueError(
+                                f"Row {row.id} sets {socket_id} of step {step_id}, which cannot reference "
+                                f"the program variable {data}"
+                            )
+        return self
+
     @cached_property
     def output_step(self) -> OutputStep:
         return cast(OutputStep, next(node for node in self.nodes if node.type == StepType.OUTPUT))
 
+    @cached_property
+    def graph_files(self) -> list[File]:
+        """Files provided by the input steps of the testcase, excluding the user input"""
+        return [
+            output.data
+            for node in self.nodes
+            if node.type == StepType.INPUT and node.id != USER_INPUT_STEP_ID
+            for output in node.outputs
+            if isinstance(output.data, File)
+        ]
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Hash of the definition of the testcase, which its precomputed reference outputs are only valid for"""
+        return hashlib.sha256(self.model_dump_json().encode()).hexdigest()
+
+    @property
+    def reported_ids(self) -> list[int]:
+        """Ids of the testcases that the program of the testcase reports results as"""
+        return [row.id for row in self.rows] if self.rows else [self.id]
+
+    @cached_property
+    def parameter_sockets(self) -> list[tuple[int, SocketId]]:
+        """The input sockets (by step id and socket id) that are set by any of the rows"""
+        return list(
+            dict.fromkeys(
+                (step_id, socket_id)
+                for row in self.rows or []
+                for step_id, inputs in row.inputs.items()
+                for socket_id in inputs
+            )
+        )
+
+    @cached_property
+    def parameters(self) -> list[str]:
+        return [
+            self.node_index[step_id].get_output_variable(socket_id)
+            for step_id, socket_id in self.parameter_sockets
+        ]
+
+    def run_profiled(
+        self,
+        user_input_step: InputStep,
+        backend: CodegenBackend,
+        profiling: StepProfiling,
+        output_preview_size: int | None = None,
+    ) -> Program:
+        """Run the compute graph, with debug statements for the given kind of step profiling"""
+        return self.run(
+            user_input_step,
+            debug=profiling != StepProfiling.NONE,
+            backend=backend,
+            trace_memory=profiling == StepProfiling.MEMORY,
+            output_preview_size=output_preview_size,
+        )
+
+    def assemble_program(
+        self,
+        user_input_step: InputStep,
+        backend: CodegenBackend,
+        profiling: StepProfiling,
+        output_preview_size: int | None = None,
+    ) -> Program | ParameterisedProgram:
+        """Run the compute graph, as a program that is run for every row if the testcase is parameterised"""
+        program = self.run_profiled(user_input_step, backend, profiling, output_preview_size)
+        if not self.rows:
+            return program
+
+        defaults: dict[tuple[int, SocketId], PrimitiveData] = {
+            (node.id, socket.id): socket.data
+            for node in self.nodes
+            if node.type == StepType.INPUT
+            for socket in node.data_out
+            if isinstance(socket.data, PrimitiveData)
+        }
+        return ParameterisedProgram(
+            program,
+            self.parameters,
+            [
+                (
+                    row.id,
+                    [
+                        literal_source(
+                            row.inputs.get(step_id, {}).get(socket_id, defaults[step_id, socket_id])
+                        )
+                        for step_id, socket_id in self.parameter_sockets
+                    ],
+                )
+                for row in self.rows
+            ],
+        )
+
+    def assemble(
+        self,
+        user_input_step: InputStep,
+        sandbox_options: SandboxOptions = DEFAULT_SANDBOX_OPTIONS,
+        profiling: StepProfiling = StepProfiling.NONE,
+        isolation: TestcaseIsolation = TestcaseIsolation.RELOAD,
+        stop_on_failure: bool = False,
+        output_preview_size: int | None = None,
+    ) -> str:
+        """
+        Assemble the sandboxed program of the testcase with the configured codegen backend. The rows of a
+        parameterised testcase are run like fused testcases (see `fused_mpi_sandbox`).
+        """
+        backend = get_codegen_backend(CODEGEN_BACKEND)
+        program = self.assemble_program(user_input_step, backend, profiling, output_preview_size)
+        return backend.code(
+            fused_mpi_sandbox(
+                [(self.id, program)],
+                isolation,
+                backend,
+                sandbox_options,
+                stop_on_failure,
+                output_preview_size is not None,
+            )
+            if isinstance(program, ParameterisedProgram)
+            else mpi_sandbox(program, backend, sandbox_options)
+        )
+
+
+@cache
+def _get_compile_pool(max_workers: int) -> ProcessPoolExecutor:
+    # NOTE: Workers are spawned instead of forked as the parent process runs the AMQP event loop
+    return ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _assemble_testcase(
+    testcase: Testcase,
+    user_input_step: InputStep,
+    sandbox_options: SandboxOptions,
+    profiling: StepProfiling,
+    isolation: TestcaseIsolation,
+    stop_on_failure: bool,
+    output_preview_size: int | None,
+) -> str:
+    return testcase.assemble(
+        user_input_step, sandbox_options, profiling, isolation, stop_on_failure, output_preview_size
+    )
+
+
+def assemble_testcases(
+    testcases: list[Testcase],
+    user_input_step: InputStep,
+    sandbox_options: SandboxOptions = DEFAULT_SANDBOX_OPTIONS,
+    profiling: StepProfiling = StepProfiling.NONE,
+    isolation: TestcaseIsolation = TestcaseIsolation.RELOAD,
+    stop_on_failure: bool = False,
+    output_preview_size: int | None = None,
+    max_workers: int = TESTCASE_COMPILE_WORKERS,
+) -> list[str]:
+    """
+    Assemble the sandboxed programs of the testcases, in the same order as the testcases.
+
+    If `max_workers` is positive, the testcases are compiled concurrently in a process pool of that size.
+    Assembling is CPU bound, so threads would not help. The testcases are pickled to the workers for every call.
+    """
+    if max_workers <= 0 or len(testcases) < 2:
+        return [
+            testcase.assemble(
+                user_input_step,
+                sandbox_options,
+                profiling,
+                isolation,
+                stop_on_failure,
+                output_preview_size,
+            )
+            for testcase in testcases
+        ]
+
+    pool = _get_compile_pool(max_workers)
+    return list(
+        pool.map(
+            _assemble_testcase,
+            testcases,
+            repeat(user_input_step),
+            repeat(sandbox_options),
+            repeat(profiling),
+            repeat(isolation),
+            repeat(stop_on_failure),
+            repeat(output_preview_size),
+        )
+    )
+
+
+def assemble_fused_testcases(
+    testcases: list[Testcase],
+    user_input_step: InputStep,
+    isolation: TestcaseIsolation,
+    sandbox_options: SandboxOptions = DEFAULT_SANDBOX_OPTIONS,
+    profiling: StepProfiling = StepProfiling.NONE,
+    stop_on_failure: bool = False,
+    output_preview_size: int | None = None,
+    order: str | None = None,
+) -> str:
+    """
+    Assemble a single sandboxed program that runs all testcases in sequence, in the order of the indices that the
+    source code `order` evaluates to (see `fused_mpi_sandbox`)
+    """
+    backend = get_codegen_backend(CODEGEN_BACKEND)
+    return backend.code(
+        fused_mpi_sandbox(
+            [
+                (
+                    testcase.id,
+                    testcase.assemble_program(
+                        user_input_step, backend, profiling, output_preview_size
+                    ),
+                )
+                for testcase in testcases
+            ],
+            isolation,
+            backend,
+            sandbox_options,
+            stop_on_failure,
+            output_preview_size is not None,
+            order,
+        )
+    )
+
+
+class TestcaseTemplate(BaseModel):
+    """
+    The assembled program of a testcase, compiled ahead of time with holes for the user input.
+
+    Every user input socket is assembled as a string literal containing a unique hole name: either as
+    the value of a primitive input or as the module name of a `File` input. The holes are replaced by
+    the actual user input when a task attempt is submitted.
+    """
+
+    id: int
+    version: int = TESTCASE_TEMPLATE_VERSION
+    code: str
+
+    def fill(self, holes: dict[str, str]) -> str:
+        return _TEMPLATE_HOLE_PATTERN.sub(lambda match: holes[match.group(2)], self.code)
+
+
+class ReferenceOutputs(BaseModel):
+    """The precomputed outputs of the reference steps of a testcase (see `ComputeGraph.reference_step_ids`)"""
+
+    fingerprint: str
+    # Python literals by output variable
+    outputs: dict[str, str]
+
 
 class SocketResult(CustomSQLModel):
     """
@@ -47,10 +387,24 @@ class SocketResult(CustomSQLModel):
     id: str
     value: Any
     correct: bool
+    # Whether `value` is only the start of the JSON of the value, as the program compared its own outputs
+    truncated: bool = False
+
+
+class StepTiming(BaseModel):
+    """Where the time of a testcase was spent, for a step that ran `calls` times"""
+
+    calls: int
+    total_secs: float
+    max_secs: float
+    # NOTE: Memory allocated by user functions in the sandbox worker is not traced
+    peak_memory_bytes: int | None = None
 
 
 class TestcaseResult(ProgramResult):
     results: list[SocketResult] | None = None
+    # Only reported when the task is profiled, by step id
+    step_timings: dict[int, StepTiming] | None = None
 
 
 class RequiredInput(BaseModel):
@@ -65,6 +419,54 @@ class ProgrammingTask(Task[list[RequiredInput], JobId]):
     required_inputs: list[RequiredInput]
     testcases: list[Testcase]
 
+    # NOTE: Precompiled testcase programs, these are persisted separately from the task definition
+    _templates: list[TestcaseTemplate] | None = PrivateAttr(default=None)
+    # The order that the testcases are run in, if it differs from the order of their definition
+    _testcase_order: list[Testcase] | None = PrivateAttr(default=None)
+
+    @cached_property
+    def sandbox_options(self) -> SandboxOptions:
+        return SandboxOptions.from_extra_options(self.environment.extra_options)
+
+    @property
+    def output_preview_size(self) -> int | None:
+        """The preview size of outputs, if the programs of the task compare their own outputs"""
+        return (
+            self.environment.output_preview_size
+            if self.environment.compare_outputs_in_program
+            else None
+        )
+
+    @model_validator(mode="after")
+    def check_sandbox_options(self) -> Self:
+        SandboxOptions.from_extra_options(self.environment.extra_options)
+        return self
+
+    @model_validator(mode="after")
+    def check_unique_testcase_ids(self) -> Self:
+        """The rows of parameterised testcases are reported as testcases, so their ids must not clash either"""
+        testcase_ids: set[int] = set()
+        for testcase in self.testcases:
+            for testcase_id in [testcase.id, *(testcase.reported_ids if testcase.rows else [])]:
+                if testcase_id in testcase_ids or testcase_id == FUSED_PROGRAM_ID:
+                    raise ValueError(f"Duplicate or reserved testcase id {testcase_id}")
+                testcase_ids.add(testcase_id)
+        return self
+
+    @model_validator(mode="after")
+    def check_fused_testcase_files(self) -> Self:
+        """Fused testcases share a program directory, so their files must not clash"""
+        if not self.environment.fuse_testcases:
+            return self
+        file_contents: dict[str, str] = {}
+        for testcase in self.testcases:
+            for file in testcase.graph_files:
+                if file_contents.setdefault(file.name, file.content) != file.content:
+                    raise ValueError(
+                        f"Cannot fuse testcases with different files named {file.name}"
+                    )
+        return self
+
     def create_input_step(self, user_inputs: list[RequiredInput]) -> InputStep:
         """
         Transform user input into InputStep
@@ -81,23 +483,299 @@ class ProgrammingTask(Task[list[RequiredInput], JobId]):
             type=StepType.INPUT,
         )
 
-    def run(self, user_inputs: list[RequiredInput]) -> TaskEvalResult[JobId]:
-        # Check if all required inputs are provided
-        for required_input in self.required_inputs:
-            if not any(required_input.id == user_input.id for user_input in user_inputs):
-                raise ValueError(f"Required input {required_input.id} not provided")
+    @staticmethod
+    def _template_hole(index: int) -> str:
+        return f"__unicon_hole_{index}__"
 
-        runner_programs: list[RunnerProgram] = []
+    def _create_template_input_step(self) -> InputStep:
+        """Create an InputStep with every required input replaced by a template hole"""
+        return self.create_input_step(
+            [
+                RequiredInput(
+                    id=required_input.id,
+                    data=(
+                        File(name=f"{self._template_hole(index)}.py", content="")
+                        if isinstance(required_input.data, File)
+                        else self._template_hole(index)
+                    ),
+                )
+                for index, required_input in enumerate(self.required_inputs)
+            ]
+        )
+
+    def compile_templates(self) -> list[TestcaseTemplate]:
+        """
+        Compile all testcases into templates that can be filled with the user input at submission time.
+        This is done once when the task is created so that submissions do not have to assemble programs.
+        """
+        template_input_step = self._create_template_input_step()
+        templates = (
+            [
+                TestcaseTemplate(
+                    id=FUSED_PROGRAM_ID,
+                    code=assemble_fused_testcases(
+                        self.testcases,
+                        template_input_step,
+                        self.environment.testcase_isolation,
+                        self.sandbox_options,
+                        self.environment.step_profiling,
+                        self.environment.stop_on_first_failure,
+                        self.output_preview_size,
+                        repr(_TESTCASE_ORDER_HOLE),
+                    ),
+                )
+            ]
+            if self.environment.fuse_testcases
+            else [
+                TestcaseTemplate(id=testcase.id, code=code)
+                for testcase, code in zip(
+                    self.testcases,
+                    assemble_testcases(
+                        self.testcases,
+                        template_input_step,
+                        self.sandbox_options,
+                        self.environment.step_profiling,
+                        self.environment.testcase_isolation,
+                        self.environment.stop_on_first_failure,
+                        self.output_preview_size,
+                    ),
+                    strict=True,
+                )
+            ]
+        )
+        self._templates = templates
+        return templates
+
+    def load_templates(self, templates: list[Any] | None) -> None:
+        if not templates:
+            return
+
+        loaded = [TestcaseTemplate.model_validate(template) for template in templates]
+        expected_ids = (
+            {FUSED_PROGRAM_ID}
+            if self.environment.fuse_testcases
+            else {testcase.id for testcase in self.testcases}
+        )
+        if (
+            any(template.version != TESTCASE_TEMPLATE_VERSION for template in loaded)
+            or {template.id for template in loaded} != expected_ids
+        ):
+            logger.warning(f"Ignoring stale testcase templates for task {self.id}")
+            return
+
+        self._templates = loaded
+
+    def create_reference_job(self) -> RunnerJob | None:
+        """
+        Create a job that evaluates the reference steps of every testcase once, so that their outputs are assembled
+        as constants from then on (see `load_reference_results`). The job is run when the task is created, so that
+        submissions do not have to run them. Returns `None` if there are no reference steps to evaluate.
+        """
+        if not self.environment.precompute_reference_outputs:
+            return None
+
+        backend = get_codegen_backend(CODEGEN_BACKEND)
+        programs: list[RunnerProgram] = []
         for testcase in self.testcases:
-            assembled_program = mpi_sandbox(testcase.run(self.create_input_step(user_inputs)))
+            program = testcase.assemble_reference_program(backend)
+            if program is None:
+                continue
+            programs.append(
+                RunnerProgram(
+                    id=testcase.id,
+                    entrypoint="__entrypoint.py",
+                    files=[
+                        *testcase.graph_files,
+                        File(
+                            name="__entrypoint.py",
+                            content=assemble_reference_code(program, backend),
+                        ),
+                    ],
+                )
+            )
+        if not programs:
+            return None
+
+        # NOTE: The reference steps of every testcase are evaluated, even if those of another testcase fail
+        environment = self.environment.model_copy(update={"stop_on_first_failure": False})
+        return RunnerJob.create(programs, environment, RUNNER_PROTOCOL_VERSION)
+
+    def load_reference_results(self, job_result: JobResult) -> dict[int, ReferenceOutputs]:
+        """
+        Load the outputs of the reference steps from the result of the job of `create_reference_job`, and return
+        them by testcase id. Testcases whose reference program failed still run their reference steps.
+        """
+        if not job_result.success:
+            logger.warning(
+                f"Failed to precompute reference outputs of task {self.id}: {job_result.error}"
+            )
+            return {}
+
+        testcase_index = {testcase.id: testcase for testcase in self.testcases}
+        reference_outputs: dict[int, ReferenceOutputs] = {}
+        for result in job_result.results:
+            testcase = testcase_index.get(result.id)
+            if testcase is None:
+                continue
+            if result.status != Status.OK:
+                logger.warning(
+                    f"Failed to precompute reference outputs of testcase {result.id} of task {self.id}: "
+                    f"{result.status}\n{result.stderr}"
+                )
+                continue
+            if outputs := parse_reference_outputs(result.stdout):
+                testcase.load_reference_outputs(outputs)
+                reference_outputs[testcase.id] = ReferenceOutputs(
+                    fingerprint=testcase.fingerprint, outputs=outputs
+                )
+        return reference_outputs
 
-            logger.debug(f"Assembled Program:\n{assembled_program}")
+    def load_reference_outputs(self, reference_outputs: dict[Any, Any] | None) -> None:
+        if not reference_outputs:
+            return
 
-            graph_files: list[File] = []
-            for node in filter(lambda node: node.type == StepType.INPUT, testcase.nodes):
-                graph_files.extend(
-                    output.data for output in node.outputs if isinstance(output.data, File)
+        testcase_index = {testcase.id: testcase for testcase in self.testcases}
+        for testcase_id, outputs in reference_outputs.items():
+            loaded = ReferenceOutputs.model_validate(outputs)
+            testcase = testcase_index.get(int(testcase_id))
+            if testcase is None or testcase.fingerprint != loaded.fingerprint:
+                logger.warning(
+                    f"Ignoring stale reference outputs of testcase {testcase_id} of task {self.id}"
                 )
+                continue
+            testcase.load_reference_outputs(loaded.outputs)
+
+    @cached_property
+    def user_function_calls(self) -> set[UserFunctionCall]:
+        """Calls that the testcases make to functions of user files"""
+        return {
+            call
+            for testcase in self.testcases
+            for node in testcase.nodes
+            if isinstance(node, PyRunFunctionStep)
+            and (call := node.get_user_function_call(testcase)) is not None
+        }
+
+    @property
+    def stopping_statuses(self) -> set[Status]:
+        """
+        The statuses of testcases that stop the remaining testcases from running (see `stop_on_first_failure`).
+
+        NOTE: The runner only stops on programs that do not finish with `OK`, as outputs are graded once the job is
+        done. Only a fused program that judges its own outputs also stops on a wrong answer.
+        """
+        statuses = {Status.MLE, Status.TLE, Status.RTE}
+        if self.environment.fuse_testcases and self.environment.compare_outputs_in_program:
+            statuses.add(Status.WA)
+        return statuses
+
+    def prioritise_testcases(self, failure_rates: dict[int, float]) -> None:
+        """
+        Run the testcases that failed most often in earlier results (by testcase id) first, so that failing
+        submissions are rejected early when the task stops on the first failure
+        """
+        testcase_order = sorted(
+            self.testcases,
+            key=lambda testcase: (
+                -max(failure_rates.get(testcase_id, 0.0) for testcase_id in testcase.reported_ids)
+            ),
+        )
+        self._testcase_order = (
+            testcase_order
+            if any(a is not b for a, b in zip(testcase_order, self.testcases, strict=True))
+            else None
+        )
+
+    @property
+    def ordered_testcases(self) -> list[Testcase]:
+        return self._testcase_order or self.testcases
+
+    @property
+    def testcase_run_order(self) -> list[int]:
+        """The indices of the testcases (in the order of their definition) in the order that they are run in"""
+        testcase_indices = {id(testcase): index for index, testcase in enumerate(self.testcases)}
+        return [testcase_indices[id(testcase)] for testcase in self.ordered_testcases]
+
+    def _fill_template_holes(self, user_inputs: list[RequiredInput]) -> dict[str, str] | None:
+        """
+        Map every template hole to the source code of its user input.
+        Returns `None` if the user input cannot be substituted into the templates.
+        """
+        user_input_index = {user_input.id: user_input for user_input in user_inputs}
+
+        holes: dict[str, str] = {}
+        for index, required_input in enumerate(self.required_inputs):
+            data = user_input_index[required_input.id].data
+            if isinstance(data, File) != isinstance(required_input.data, File):
+                return None
+            holes[self._template_hole(index)] = (
+                # NOTE: Assume that the program file is always a Python file
+                repr(data.name.split(".py")[0]) if isinstance(data, File) else literal_source(data)
+            )
+        holes[_TESTCASE_ORDER_HOLE] = repr(self.testcase_run_order)
+        return holes
+
+    def assemble_programs(self, user_inputs: list[RequiredInput]) -> list[RunnerProgram]:
+        """Assemble the runner programs of all testcases, filling in the precompiled templates if possible"""
+        template_holes = self._fill_template_holes(user_inputs) if self._templates else None
+        template_index = {template.id: template for template in self._templates or []}
+
+        user_files: list[File] = [
+            user_input.data for user_input in user_inputs if isinstance(user_input.data, File)
+        ]
+        testcases = self.ordered_testcases
+
+        if self.environment.fuse_testcases:
+            # NOTE: The fused program assembles the testcases in the order of their definition, and is given the
+            # order that they are run in as data, so that the template can be used whatever the order is
+            fused_code = (
+                template_index[FUSED_PROGRAM_ID].fill(template_holes)
+                if template_holes is not None
+                else assemble_fused_testcases(
+                    self.testcases,
+                    self.create_input_step(user_inputs),
+                    self.environment.testcase_isolation,
+                    self.sandbox_options,
+                    self.environment.step_profiling,
+                    self.environment.stop_on_first_failure,
+                    self.output_preview_size,
+                    repr(self.testcase_run_order),
+                )
+            )
+            logger.debug(f"Assembled Program:\n{fused_code}")
+            # NOTE: Testcases are checked to not have different files with the same name
+            fused_graph_files = {
+                file.name: file for testcase in self.testcases for file in testcase.graph_files
+            }
+            return [
+                RunnerProgram(
+                    id=FUSED_PROGRAM_ID,
+                    entrypoint="__entrypoint.py",
+                    files=[
+                        *fused_graph_files.values(),
+                        *user_files,
+                        File(name="__entrypoint.py", content=fused_code),
+                    ],
+                )
+            ]
+
+        assembled_codes: list[str] = (
+            [template_index[testcase.id].fill(template_holes) for testcase in testcases]
+            if template_holes is not None
+            else assemble_testcases(
+                testcases,
+                self.create_input_step(user_inputs),
+                self.sandbox_options,
+                self.environment.step_profiling,
+                self.environment.testcase_isolation,
+                self.environment.stop_on_first_failure,
+                self.output_preview_size,
+            )
+        )
+
+        runner_programs: list[RunnerProgram] = []
+        for testcase, assembled_code in zip(testcases, assembled_codes, strict=True):
+            logger.debug(f"Assembled Program:\n{assembled_code}")
 
             runner_programs.append(
                 RunnerProgram(
@@ -106,16 +784,107 @@ class ProgrammingTask(Task[list[RequiredInput], JobId]):
                     # TODO: instead of always passing in user_input, we can refactor in the future
                     # to let ComputeGraph derive all the files needed to run the testcase
                     files=[
-                        *graph_files,
-                        File(name="__entrypoint.py", content=assembled_program.code),
+                        *testcase.graph_files,
+                        *user_files,
+                        File(name="__entrypoint.py", content=assembled_code),
                     ],
                 )
             )
 
-        runner_job = RunnerJob.create(runner_programs, self.environment)
-        task_publisher.publish(runner_job.model_dump_json(serialize_as_any=True))
+        return runner_programs
+
+    def run(self, user_inputs: list[RequiredInput]) -> TaskEvalResult[JobId]:
+        # Check if all required inputs are provided
+        for required_input in self.required_inputs:
+            if not any(required_input.id == user_input.id for user_input in user_inputs):
+                raise ValueError(f"Required input {required_input.id} not provided")
+
+        # NOTE: User inputs are substituted into the programs as source code, so references to program variables
+        # must be identifiers (see `literal_source`)
+        for user_input in user_inputs:
+            if isinstance(user_input.data, str) and user_input.data.startswith("var_"):
+                try:
+                    check_identifier(user_input.data)
+                except ValueError as e:
+                    return TaskEvalResult(
+                        task_id=self.id, status=TaskEvalStatus.FAILED, result=None, error=str(e)
+                    )
+
+        # NOTE: User files that would fail every testcase are rejected before a job is published
+        user_files = {
+            user_input.id: user_input.data
+            for user_input in user_inputs
+            if isinstance(user_input.data, File)
+        }
+        if errors := check_user_files(user_files, self.user_function_calls):
+            return TaskEvalResult(
+                task_id=self.id, status=TaskEvalStatus.FAILED, result=None, error="\n".join(errors)
+            )
+
+        # NOTE: The time limit applies to every testcase, so programs that run several testcases (fused testcases or
+        # the rows of a parameterised testcase) are given the sum of their limits
+        environment = self.environment
+        num_reported = [len(testcase.reported_ids) for testcase in self.testcases]
+        num_program_testcases = (
+            sum(num_reported) if environment.fuse_testcases else max(num_reported, default=1)
+        )
+        if num_program_testcases > 1:
+            environment = environment.model_copy(
+                update={"time_limit_secs": environment.time_limit_secs * num_program_testcases}
+            )
+
+        runner_job = RunnerJob.create(
+            self.assemble_programs(user_inputs), environment, RUNNER_PROTOCOL_VERSION
+        )
+        return TaskEvalResult(
+            task_id=self.id,
+            status=TaskEvalStatus.PENDING,
+            result=runner_job.id,
+            job_message=runner_job.model_dump_json(serialize_as_any=True),
+        )
 
-        return TaskEvalResult(task_id=self.id, status=TaskEvalStatus.PENDING, result=runner_job.id)
+    def split_fused_results(self, results: list[ProgramResult]) -> list[ProgramResult]:
+        """
+        Split the results of programs that run several testcases (a fused program, or the program of a parameterised
+        testcase) into the results of those testcases. Testcases that did not report a result (e.g. the program
+        exceeded its time limit) take the status of the program.
+        """
+        parameterised = {testcase.id: testcase for testcase in self.testcases if testcase.rows}
+        split_results: list[ProgramResult] = []
+        for result in results:
+            if result.id == FUSED_PROGRAM_ID:
+                reported_ids = [
+                    testcase_id
+                    for testcase in self.testcases
+                    for testcase_id in testcase.reported_ids
+                ]
+            elif result.id in parameterised:
+                reported_ids = parameterised[result.id].reported_ids
+            else:
+                split_results.append(result)
+                continue
+
+            reported: dict[int, ProgramResult] = {}
+            for line in result.stdout.splitlines():
+                try:
+                    line_result = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(line_result, dict) and FUSED_TESTCASE_ID_KEY in line_result:
+                    testcase_id = line_result.pop(FUSED_TESTCASE_ID_KEY)
+                    reported[testcase_id] = ProgramResult(id=testcase_id, **line_result)
+
+            for testcase_id in reported_ids:
+                split_results.append(
+                    reported.get(testcase_id)
+                    or ProgramResult(
+                        id=testcase_id,
+                        status=result.status if result.status != Status.OK else Status.RTE,
+                        stdout="",
+                        stderr=result.stderr,
+                    )
+                )
+        return split_results
 
     def validate_user_input(self, user_input: Any) -> list[RequiredInput]:
         return RootModel[list[RequiredInput]].model_validate(user_input).root
@@ -0,0 +1,456 @@
+import abc
+import ast
+import keyword
+import math
+from collections.abc import Iterable, Sequence
+from typing import Final, NamedTuple, cast
+
+import libcst as cst
+
+from unicon_backend.evaluator.tasks.programming.artifact import PrimitiveData
+from unicon_backend.evaluator.tasks.programming.transforms import hoist_imports
+
+type ProgramExpression = cst.BaseExpression | ast.expr
+type ProgramStatement = cst.SimpleStatementLine | cst.BaseCompoundStatement | ast.stmt
+type Program = cst.Module | ast.Module
+
+
+def check_identifier(name: str) -> str:
+    """Return the name if it is a valid Python identifier, so that it cannot inject code into a program"""
+    if not name.isidentifier() or keyword.iskeyword(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return name
+
+
+def literal_source(data: PrimitiveData) -> str:
+    """
+    Return the source code of the expression that a primitive `InputStep` value is assembled into.
+
+    NOTE: Strings prefixed with `var_` are treated as references to program variables, and must be identifiers
+    """
+    # TODO: Better handle of variables vs strings
+    if not isinstance(data, str):
+        return repr(data)
+    if data.startswith("var_"):
+        return check_identifier(data)
+    # NOTE: Strings are double-quoted unless they cannot be represented as a plain double-quoted literal
+    return f'"{data}"' if data.isprintable() and not any(c in data for c in '"\\') else repr(data)
+
+
+class ProgramImport(NamedTuple):
+    """An import required by a program fragment: `import <module>`, or `from <module> import <name>`"""
+
+    module: str
+    name: str | None = None
+
+
+class ProgramImports:
+    """
+    The imports required by a program, combined so that each of them is only imported once.
+
+    Steps declare their imports up front, which lets the header of a program be built in a single pass
+    instead of visiting the assembled program to find and hoist import statements.
+    """
+
+    def __init__(self):
+        self.module_imports: set[str] = set()
+        # NOTE: Modules are kept in the order they are first imported from
+        self.object_mapping: dict[str, set[str]] = {}
+
+    def add(self, imports: Iterable[ProgramImport]) -> None:
+        for program_import in imports:
+            if program_import.name is None:
+                self.module_imports.add(program_import.module)
+            else:
+                self.object_mapping.setdefault(program_import.module, set()).add(
+                    program_import.name
+                )
+
+    def header(self, backend: "CodegenBackend") -> list[ProgramStatement]:
+        """Return the import statements of the program, in the same order as `hoist_imports`"""
+        return [
+            *(backend.import_module(module) for module in sorted(self.module_imports)),
+            *(
+                backend.import_from(module, sorted(names))
+                for module, names in self.object_mapping.items()
+            ),
+        ]
+
+
+class CodegenBackend[Expr, Stmt, Module](abc.ABC):
+    """
+    A backend that builds the syntax tree of an assembled program and renders it into source code.
+
+    Steps only build programs through a backend so that the underlying syntax tree library can be swapped.
+    """
+
+    name: str
+
+    # Expressions
+
+    @abc.abstractmethod
+    def identifier(self, name: str) -> Expr: ...
+
+    @abc.abstractmethod
+    def literal(self, value: PrimitiveData) -> Expr:
+        """Literal for the value of a primitive `InputStep` (see `literal_source`)"""
+        ...
+
+    @abc.abstractmethod
+    def string(self, value: str) -> Expr:
+        """String literal using the `repr` of the string"""
+        ...
+
+    @abc.abstractmethod
+    def parse_expression(self, source: str) -> Expr: ...
+
+    @abc.abstractmethod
+    def attribute(self, value: Expr, attr: str) -> Expr: ...
+
+    @abc.abstractmethod
+    def subscript(self, value: Expr, key: Expr) -> Expr: ...
+
+    @abc.abstractmethod
+    def call(
+        self, func: Expr, args: Sequence[Expr], kwargs: Sequence[tuple[str, Expr]] = ()
+    ) -> Expr: ...
+
+    @abc.abstractmethod
+    def dict(self, items: Sequence[tuple[Expr, Expr]]) -> Expr: ...
+
+    @abc.abstractmethod
+    def equals(self, left: Expr, right: Expr) -> Expr: ...
+
+    # Statements
+
+    @abc.abstractmethod
+    def assign(self, targets: Sequence[Expr], value: Expr) -> Stmt:
+        """Assign `value` to the target, or unpack it into a tuple of targets if there are multiple"""
+        ...
+
+    @abc.abstractmethod
+    def expression_statement(self, value: Expr) -> Stmt: ...
+
+    @abc.abstractmethod
+    def import_module(self, module: str) -> Stmt: ...
+
+    @abc.abstractmethod
+    def import_from(self, module: str, names: Sequence[str]) -> Stmt: ...
+
+    @abc.abstractmethod
+    def if_else(self, test: Expr, body: Sequence[Stmt], orelse: Sequence[Stmt] | None) -> Stmt: ...
+
+    @abc.abstractmethod
+    def while_loop(self, test: Expr, body: Sequence[Stmt]) -> Stmt: ...
+
+    @abc.abstractmethod
+    def break_loop(self, test: Expr) -> Stmt:
+        """`if <test>: break`"""
+        ...
+
+    @abc.abstractmethod
+    def function_def(self, name: str, body: Sequence[Stmt], params: Sequence[str] = ()) -> Stmt:
+        """Definition of a function with positional parameters"""
+        ...
+
+    # Programs
+
+    @abc.abstractmethod
+    def module(self, body: Sequence[Stmt]) -> Module: ...
+
+    @abc.abstractmethod
+    def body(self, program: Module) -> Sequence[Stmt]: ...
+
+    @abc.abstractmethod
+    def parse_module(self, source: str) -> Module: ...
+
+    @abc.abstractmethod
+    def hoist_imports(self, program: Module) -> Module:
+        """
+        Hoist all import statements to the top of the program. Additionally, it combines and remove imports
+        to prevent duplicate imports.
+        """
+        ...
+
+    @abc.abstractmethod
+    def code(self, program: Module) -> str: ...
+
+
+type CstStatement = cst.SimpleStatementLine | cst.BaseCompoundStatement
+
+
+class LibCSTBackend(CodegenBackend[cst.BaseExpression, CstStatement, cst.Module]):
+    name = "libcst"
+
+    @staticmethod
+    def _line(stmt: cst.BaseSmallStatement) -> cst.SimpleStatementLine:
+        return cst.SimpleStatementLine([stmt])
+
+    @staticmethod
+    def _name(name: str) -> cst.Name:
+        # NOTE: Names are checked as in `AstBackend`, so that both backends raise the same error
+        return cst.Name(check_identifier(name))
+
+    def identifier(self, name: str) -> cst.BaseExpression:
+        return self._name(name)
+
+    def literal(self, value: PrimitiveData) -> cst.BaseExpression:
+        if isinstance(value, str):
+            source = literal_source(value)
+            return cst.Name(source) if value.startswith("var_") else cst.SimpleString(source)
+        if isinstance(value, bool) or not math.isfinite(value):
+            return cst.Name(repr(value))
+        if value < 0:
+            return cst.UnaryOperation(cst.Minus(), self.literal(-value))
+        return cst.Integer(repr(value)) if isinstance(value, int) else cst.Float(repr(value))
+
+    def string(self, value: str) -> cst.BaseExpression:
+        return cst.SimpleString(repr(value))
+
+    def parse_expression(self, source: str) -> cst.BaseExpression:
+        return cst.parse_expression(source)
+
+    def attribute(self, value: cst.BaseExpression, attr: str) -> cst.BaseExpression:
+        return cst.Attribute(value=value, attr=self._name(attr))
+
+    def subscript(self, value: cst.BaseExpression, key: cst.BaseExpression) -> cst.BaseExpression:
+        return cst.Subscript(value=value, slice=[cst.SubscriptElement(cst.Index(key))])
+
+    def call(
+        self,
+        func: cst.BaseExpression,
+        args: Sequence[cst.BaseExpression],
+        kwargs: Sequence[tuple[str, cst.BaseExpression]] = (),
+    ) -> cst.BaseExpression:
+        return cst.Call(
+            func=func,
+            args=[
+                *(cst.Arg(arg) for arg in args),
+                *(cst.Arg(value, keyword=self._name(keyword)) for keyword, value in kwargs),
+            ],
+        )
+
+    def dict(
+        self, items: Sequence[tuple[cst.BaseExpression, cst.BaseExpression]]
+    ) -> cst.BaseExpression:
+        return cst.Dict([cst.DictElement(key=key, value=value) for key, value in items])
+
+    def equals(self, left: cst.BaseExpression, right: cst.BaseExpression) -> cst.BaseExpression:
+        return cst.Comparison(left=left, comparisons=[cst.ComparisonTarget(cst.Equal(), right)])
+
+    def assign(
+        self, targets: Sequence[cst.BaseExpression], value: cst.BaseExpression
+    ) -> CstStatement:
+        target = (
+            targets[0]
+            if len(targets) == 1
+            else cst.Tuple([cst.Element(target) for target in targets])
+        )
+        return self._line(
+            cst.Assign(
+                targets=[cst.AssignTarget(cast(cst.BaseAssignTargetExpression, target))],
+                value=value,
+            )
+        )
+
+    def expression_statement(self, value: cst.BaseExpression) -> CstStatement:
+        return self._line(cst.Expr(value))
+
+    def import_module(self, module: str) -> CstStatement:
+        return self._line(cst.Import([cst.ImportAlias(name=cst.Name(module))]))
+
+    def import_from(self, module: str, names: Sequence[str]) -> CstStatement:
+        return self._line(
+            cst.ImportFrom(cst.Name(module), [cst.ImportAlias(cst.Name(name)) for name in names])
+        )
+
+    def if_else(
+        self,
+        test: cst.BaseExpression,
+        body: Sequence[CstStatement],
+        orelse: Sequence[CstStatement] | None,
+    ) -> CstStatement:
+        return cst.If(
+            test=test,
+            body=cst.IndentedBlock(body),
+            orelse=cst.Else(cst.IndentedBlock(orelse)) if orelse is not None else None,
+        )
+
+    def while_loop(self, test: cst.BaseExpression, body: Sequence[CstStatement]) -> CstStatement:
+        return cst.While(test=test, body=cst.IndentedBlock(body))
+
+    def break_loop(self, test: cst.BaseExpression) -> CstStatement:
+        return cst.If(test=test, body=cst.SimpleStatementSuite([cst.Break()]))
+
+    def function_def(
+        self, name: str, body: Sequence[CstStatement], params: Sequence[str] = ()
+    ) -> CstStatement:
+        return cst.FunctionDef(
+            self._name(name),
+            cst.Parameters([cst.Param(self._name(param)) for param in params]),
+            cst.IndentedBlock(body),
+        )
+
+    def module(self, body: Sequence[CstStatement]) -> cst.Module:
+        return cst.Module(body=body)
+
+    def body(self, program: cst.Module) -> Sequence[CstStatement]:
+        return program.body
+
+    def parse_module(self, source: str) -> cst.Module:
+        return cst.parse_module(source)
+
+    def hoist_imports(self, program: cst.Module) -> cst.Module:
+        return hoist_imports(program)
+
+    def code(self, program: cst.Module) -> str:
+        return program.code
+
+
+class _RemoveImportsTransformer(ast.NodeTransformer):
+    def __init__(self):
+        self.imports = ProgramImports()
+
+    def visit_Import(self, node: ast.Import) -> None:
+        self.imports.add(ProgramImport(alias.name) for alias in node.names)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom) -> None:
+        assert node.module is not None
+        self.imports.add(ProgramImport(node.module, alias.name) for alias in node.names)
+
+
+class AstBackend(CodegenBackend[ast.expr, ast.stmt, ast.Module]):
+    """
+    A backend built on the standard library `ast` module.
+
+    It does not preserve formatting like `libcst` does, which is not needed for generated programs,
+    but is considerably faster to build and render.
+    """
+
+    name = "ast"
+
+    @staticmethod
+    def _store(target: ast.expr) -> ast.expr:
+        return ast.Name(target.id, ctx=ast.Store()) if isinstance(target, ast.Name) else target
+
+    def identifier(self, name: str) -> ast.expr:
+        # NOTE: `ast` does not validate names, so they are checked by both backends to reject the same names
+        return ast.Name(check_identifier(name), ctx=ast.Load())
+
+    def literal(self, value: PrimitiveData) -> ast.expr:
+        if isinstance(value, str) and value.startswith("var_"):
+            return self.identifier(value)
+        if isinstance(value, float) and not math.isfinite(value):
+            return self.parse_expression(repr(value))
+        return ast.Constant(value)
+
+    def string(self, value: str) -> ast.expr:
+        return ast.Constant(value)
+
+    def parse_expression(self, source: str) -> ast.expr:
+        return ast.parse(source, mode="eval").body
+
+    def attribute(self, value: ast.expr, attr: str) -> ast.expr:
+        return ast.Attribute(value=value, attr=check_identifier(attr), ctx=ast.Load())
+
+    def subscript(self, value: ast.expr, key: ast.expr) -> ast.expr:
+        return ast.Subscript(value=value, slice=key, ctx=ast.Load())
+
+    def call(
+        self,
+        func: ast.expr,
+        args: Sequence[ast.expr],
+        kwargs: Sequence[tuple[str, ast.expr]] = (),
+    ) -> ast.expr:
+        return ast.Call(
+            func=func,
+            args=list(args),
+            keywords=[
+                ast.keyword(arg=check_identifier(keyword), value=value) for keyword, value in kwargs
+            ],
+        )
+
+    def dict(self, items: Sequence[tuple[ast.expr, ast.expr]]) -> ast.expr:
+        return ast.Dict(keys=[key for key, _ in items], values=[value for _, value in items])
+
+    def equals(self, left: ast.expr, right: ast.expr) -> ast.expr:
+        return ast.Compare(left=left, ops=[ast.Eq()], comparators=[right])
+
+    def assign(self, targets: Sequence[ast.expr], value: ast.expr) -> ast.stmt:
+        target = (
+            self._store(targets[0])
+            if len(targets) == 1
+            else ast.Tuple([self._store(target) for target in targets], ctx=ast.Store())
+        )
+        # NOTE: `ast.unparse` looks up type comments of assignments by line number
+        return ast.Assign(targets=[target], value=value, lineno=0)
+
+    def expression_statement(self, value: ast.expr) -> ast.stmt:
+        return ast.Expr(value)
+
+    def import_module(self, module: str) -> ast.stmt:
+        return ast.Import([ast.alias(module)])
+
+    def import_from(self, module: str, names: Sequence[str]) -> ast.stmt:
+        return ast.ImportFrom(module, [ast.alias(name) for name in names], level=0)
+
+    def if_else(
+        self, test: ast.expr, body: Sequence[ast.stmt], orelse: Sequence[ast.stmt] | None
+    ) -> ast.stmt:
+        # NOTE: Empty blocks are not valid Python, this mirrors `libcst` which renders them as `pass`
+        return ast.If(test=test, body=list(body) or [ast.Pass()], orelse=list(orelse or []))
+
+    def while_loop(self, test: ast.expr, body: Sequence[ast.stmt]) -> ast.stmt:
+        return ast.While(test=test, body=list(body) or [ast.Pass()], orelse=[])
+
+    def break_loop(self, test: ast.expr) -> ast.stmt:
+        return ast.If(test=test, body=[ast.Break()], orelse=[])
+
+    def function_def(
+        self, name: str, body: Sequence[ast.stmt], params: Sequence[str] = ()
+    ) -> ast.stmt:
+        return ast.FunctionDef(
+            name=check_identifier(name),
+            args=ast.arguments(
+                posonlyargs=[],
+                args=[ast.arg(check_identifier(param)) for param in params],
+                kwonlyargs=[],
+                kw_defaults=[],
+                defaults=[],
+            ),
+            body=list(body) or [ast.Pass()],
+            decorator_list=[],
+            type_params=[],
+            lineno=0,
+        )
+
+    def module(self, body: Sequence[ast.stmt]) -> ast.Module:
+        return ast.Module(body=list(body), type_ignores=[])
+
+    def body(self, program: ast.Module) -> Sequence[ast.stmt]:
+        return program.body
+
+    def parse_module(self, source: str) -> ast.Module:
+        return ast.parse(source)
+
+    def hoist_imports(self, program: ast.Module) -> ast.Module:
+        transformer = _RemoveImportsTransformer()
+        program = transformer.visit(program)
+        return self.module([*transformer.imports.header(self), *program.body])
+
+    def code(self, program: ast.Module) -> str:
+        return ast.unparse(program) + "\n"
+
+
+CODEGEN_BACKENDS: Final[dict[str, CodegenBackend]] = {
+    backend.name: backend for backend in (LibCSTBackend(), AstBackend())
+}
+DEFAULT_CODEGEN_BACKEND: Final[CodegenBackend] = CODEGEN_BACKENDS[LibCSTBackend.name]
+
+
+def get_codegen_backend(name: str | None = None) -> CodegenBackend:
+    if name is None:
+        return DEFAULT_CODEGEN_BACKEND
+    if (backend := CODEGEN_BACKENDS.get(name)) is None:
+        raise ValueError(f"Unknown codegen backend {name}")
+    return backend
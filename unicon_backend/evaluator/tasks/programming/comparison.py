@@ -0,0 +1,169 @@
+import json
+import math
+import operator
+from functools import cache, partial
+from itertools import chain
+from types import ModuleType
+from typing import Any
+
+# NOTE: The source of this module is also assembled into the programs that compare their own outputs (see
+# `OutputStep`), so it must only import the standard library
+
+# Default tolerances of approximate comparisons, as in `math.isclose`
+DEFAULT_REL_TOL = 1e-9
+DEFAULT_ABS_TOL = 0.0
+
+# Arrays with fewer elements are compared in pure Python, as converting them to NumPy arrays costs more
+NUMPY_MIN_SIZE = 256
+
+COMPARISON_OPERATORS = {"=": operator.eq, "<": operator.lt, ">": operator.gt}
+
+# Types of the values that are arrays (as nested lists) of numbers, and of their elements
+ARRAY_TYPES = {list, tuple}
+NUMBER_TYPES = {int, float, bool}
+
+
+@cache
+def _numpy() -> ModuleType | None:
+    # NOTE: NumPy is optional, and only imported once an array is compared as it is slow to import
+    try:
+        import numpy  # type: ignore[import-not-found]
+    except ImportError:
+        return None
+    return numpy
+
+
+def as_array(value: Any) -> tuple[tuple[int, ...], list] | None:
+    """
+    Return the shape and (row-major) elements of a number or rectangular array of numbers given as nested lists,
+    or None if the value is not one.
+    """
+    shape: list[int] = []
+    elements = [value]
+    while elements and isinstance(elements[0], list | tuple):
+        # NOTE: The types of the elements are checked as a set, which is faster than `isinstance` on every element
+        if not set(map(type, elements)) <= ARRAY_TYPES:
+            return None
+        lengths = set(map(len, elements))
+        if len(lengths) != 1:
+            return None
+        shape.append(lengths.pop())
+        elements = list(chain.from_iterable(elements))
+    if not set(map(type, elements)) <= NUMBER_TYPES:
+        return None
+    return tuple(shape), elements
+
+
+def _size(value: Any) -> int:
+    """Return the number of elements of an array given as nested lists, assuming that it is rectangular"""
+    size = 1
+    while isinstance(value, list | tuple) and value:
+        size *= len(value)
+        value = value[0]
+    return size if not isinstance(value, list | tuple) else 0
+
+
+def _numpy_arrays(actual: Any, expected: Any) -> tuple[ModuleType, Any, Any] | None:
+    """
+    Return NumPy with two arrays as NumPy arrays, if NumPy is available and they are large enough to be compared faster with
+    it. Returns None if they cannot be (e.g. arrays of large integers).
+    """
+    numpy = _numpy() if _size(expected) >= NUMPY_MIN_SIZE else None
+    if numpy is None:
+        return None
+    try:
+        a = numpy.asarray(actual)
+        b = numpy.asarray(expected)
+    except (ValueError, OverflowError):
+        # e.g. the array is not rectangular
+        return None
+    if a.dtype.kind not in "biuf" or b.dtype.kind not in "biuf":
+        return None
+    return numpy, a, b
+
+
+def approximately_equal(
+    actual: Any, expected: Any, rel_tol: float = DEFAULT_REL_TOL, abs_tol: float = DEFAULT_ABS_TOL
+) -> bool:
+    """Whether two numbers, or arrays of numbers of the same shape, are equal within the tolerances elementwise"""
+    if (arrays := _numpy_arrays(actual, expected)) is not None:
+        numpy, a, b = arrays
+        if a.shape != b.shape:
+            return False
+        a, b = a.astype(numpy.float64), b.astype(numpy.float64)
+        # NOTE: Evaluated the same way as `math.isclose`, e.g. infinities are only close to themselves
+        with numpy.errstate(invalid="ignore", over="ignore"):
+            diff = numpy.abs(a - b)
+            tol = numpy.maximum(rel_tol * numpy.maximum(numpy.abs(a), numpy.abs(b)), abs_tol)
+            return bool(numpy.all((a == b) | (numpy.isfinite(diff) & (diff <= tol))))
+
+    actual_array, expected_array = as_array(actual), as_array(expected)
+    if actual_array is None or expected_array is None or actual_array[0] != expected_array[0]:
+        return False
+    return all(
+        map(
+            partial(math.isclose, rel_tol=rel_tol, abs_tol=abs_tol),
+            actual_array[1],
+            expected_array[1],
+        )
+    )
+
+
+def array_equal(actual: Any, expected: Any) -> bool:
+    """Whether two numbers, or arrays of numbers of the same shape, are equal elementwise"""
+    # NOTE: Comparing nested lists is done in C, and faster than converting them to NumPy arrays. The expected
+    # value is checked to be an array by `Comparison`, so an equal value is one as well.
+    if actual == expected:
+        return True
+    # e.g. tuples are compared with lists by their elements
+    if (arrays := _numpy_arrays(actual, expected)) is not None:
+        _, a, b = arrays
+        return a.shape == b.shape and bool((a == b).all())
+
+    actual_array, expected_array = as_array(actual), as_array(expected)
+    if actual_array is None or expected_array is None:
+        return False
+    return actual_array == expected_array
+
+
+ARRAY_OPERATORS = {"~=": approximately_equal, "[=]": array_equal}
+
+
+def compare(operator_name: str, actual: Any, expected: Any, *tolerances: float) -> bool:
+    """
+    Compare the (JSON-decoded) value of an output against the expected value of its comparison.
+    Approximate comparisons take the relative and absolute tolerances.
+    """
+    try:
+        if operator_name in ARRAY_OPERATORS:
+            return ARRAY_OPERATORS[operator_name](actual, expected, *tolerances)
+        return bool(COMPARISON_OPERATORS[operator_name](actual, expected))
+    except Exception:
+        # If there was an exception, the type returned was incorrect
+        return False
+
+
+def judge_outputs(
+    values: dict[str, Any], comparisons: str, preview_size: int, extra: dict | None = None
+) -> dict[str, Any]:
+    """
+    Compare the values of the outputs of a program by socket id, against the comparisons given as a JSON object of
+    socket id to `[operator, expected value, *tolerances]`. Every output is reported with whether it is correct,
+    and either its value or (if its JSON is longer than `preview_size` characters) the start of its JSON as a preview.
+    """
+    expected_values = json.loads(comparisons)
+    judged: dict[str, Any] = {}
+    for socket_id, value in values.items():
+        text = json.dumps(value)
+        # NOTE: Values are compared as they would be decoded from the output of the program
+        decoded = json.loads(text)
+        correct = True
+        if socket_id in expected_values:
+            operator_name, expected, *tolerances = expected_values[socket_id]
+            correct = compare(operator_name, decoded, expected, *tolerances)
+        judged[socket_id] = (
+            {"correct": correct, "value": decoded}
+            if len(text) <= preview_size
+            else {"correct": correct, "preview": text[:preview_size]}
+        )
+    return {**judged, **(extra or {})}
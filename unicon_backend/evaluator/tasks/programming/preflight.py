@@ -0,0 +1,241 @@
+import ast
+import hashlib
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator, Sequence
+from threading import Lock
+from typing import Final, NamedTuple
+
+from unicon_backend.evaluator.tasks.programming.artifact import File
+
+# Number of user files whose parse results are kept, by content hash
+MODULE_CACHE_SIZE: Final[int] = 1024
+
+# Calls, attributes and modules that can bind names of a module that are not visible to a static check,
+# e.g. `setattr(sys.modules[__name__], ...)` or `globals().update(...)`
+_DYNAMIC_BINDING_CALLS: Final[frozenset[str]] = frozenset(
+    {"globals", "vars", "exec", "eval", "setattr", "delattr", "__import__"}
+)
+_DYNAMIC_BINDING_ATTRIBUTES: Final[frozenset[str]] = frozenset({"modules", "__dict__"})
+_DYNAMIC_BINDING_MODULES: Final[frozenset[str]] = frozenset({"importlib"})
+
+
+class FunctionSignature(NamedTuple):
+    """The parameters of a function that is defined in a user file"""
+
+    # Names of the positional-only and positional-or-keyword parameters
+    positional: tuple[str, ...]
+    num_positional_only: int
+    num_required_positional: int
+    keyword_only: tuple[str, ...]
+    required_keyword_only: frozenset[str]
+    var_positional: bool
+    var_keyword: bool
+
+    @classmethod
+    def from_ast(cls, node: ast.FunctionDef | ast.AsyncFunctionDef) -> "FunctionSignature":
+        args = node.args
+        positional = tuple(arg.arg for arg in (*args.posonlyargs, *args.args))
+        return cls(
+            positional,
+            len(args.posonlyargs),
+            len(positional) - len(args.defaults),
+            tuple(arg.arg for arg in args.kwonlyargs),
+            frozenset(
+                arg.arg
+                for arg, default in zip(args.kwonlyargs, args.kw_defaults, strict=True)
+                if default is None
+            ),
+            args.vararg is not None,
+            args.kwarg is not None,
+        )
+
+    def check_call(self, num_args: int, kwarg_names: Sequence[str]) -> str | None:
+        """Return why a call with the given arguments cannot be bound to the function, if it cannot"""
+        if num_args > len(self.positional) and not self.var_positional:
+            return f"takes {len(self.positional)} positional argument(s) but {num_args} were given"
+
+        bound = set(self.positional[:num_args])
+        keyword_names = {*self.positional[self.num_positional_only :], *self.keyword_only}
+        for name in kwarg_names:
+            # NOTE: Keyword arguments named like positional-only parameters go to `**kwargs`
+            if name in keyword_names:
+                if name in bound:
+                    return f"got multiple values for argument '{name}'"
+                bound.add(name)
+            elif not self.var_keyword:
+                return f"got an unexpected keyword argument '{name}'"
+
+        missing = [
+            name for name in self.positional[: self.num_required_positional] if name not in bound
+        ]
+        missing.extend(sorted(self.required_keyword_only - bound))
+        if missing:
+            return f"is missing required argument(s): {', '.join(missing)}"
+        return None
+
+
+class ModuleSummary(NamedTuple):
+    """What a static check needs to know about a user file"""
+
+    # The syntax error of the file, if it cannot be compiled
+    error: str | None
+    # Names bound at the top level of the module, with the signature of the function if the name is
+    # bound only by plain function definitions and the module does not bind names dynamically
+    names: dict[str, FunctionSignature | None]
+    # Whether the module can bind names that are not visible statically (e.g. `from x import *`)
+    dynamic: bool
+
+
+class UserFunctionCall(NamedTuple):
+    """A call that a testcase makes to a function of a user file"""
+
+    # The user input that provides the file
+    user_input_id: str
+    function_identifier: str
+    num_args: int
+    kwarg_names: tuple[str, ...]
+
+
+def _module_scope_nodes(statement: ast.stmt) -> Iterator[ast.AST]:
+    """Yield the nodes of a top level statement that run in the module scope"""
+    stack: list[ast.AST] = [statement]
+    while stack:
+        node = stack.pop()
+        yield node
+        # NOTE: Names bound in the bodies of functions and classes are local to them
+        if isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef | ast.Lambda):
+            continue
+        stack.extend(ast.iter_child_nodes(node))
+
+
+def _summarise_module(content: str) -> ModuleSummary:
+    try:
+        module = ast.parse(content)
+        # NOTE: Some errors (e.g. `return` outside of a function) are only raised by the compiler
+        compile(module, "<user file>", "exec")
+    except SyntaxError as e:
+        return ModuleSummary(f"line {e.lineno}: {e.msg}" if e.lineno else e.msg, {}, False)
+    except ValueError as e:
+        return ModuleSummary(str(e), {}, False)
+
+    # NOTE: The last plain function definition of a name is the one that is bound, unless the name is bound in
+    # any other way as well, which may happen after it (e.g. in a loop or a function with `global`)
+    signatures: dict[str, FunctionSignature] = {}
+    bound_names: set[str] = set()
+    imported_names: set[str] = set()
+    dynamic = False
+    for statement in module.body:
+        if (
+            isinstance(statement, ast.FunctionDef | ast.AsyncFunctionDef)
+            and not statement.decorator_list
+        ):
+            signatures[statement.name] = FunctionSignature.from_ast(statement)
+            continue
+
+        for node in _module_scope_nodes(statement):
+            if isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef):
+                bound_names.add(node.name)
+            elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+                bound_names.add(node.id)
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    imported_names.add(alias.asname or alias.name.split(".")[0])
+            elif isinstance(node, ast.ImportFrom):
+                for alias in node.names:
+                    if alias.name == "*":
+                        dynamic = True
+                    else:
+                        imported_names.add(alias.asname or alias.name)
+            elif isinstance(node, ast.MatchAs | ast.MatchStar | ast.ExceptHandler) and node.name:
+                bound_names.add(node.name)
+    bound_names |= imported_names
+
+    for node in ast.walk(module):
+        if isinstance(node, ast.Global):
+            bound_names.update(node.names)
+        elif _binds_names_dynamically(node, imported_names):
+            dynamic = True
+
+    # NOTE: Attributes of a module with `__getattr__` (PEP 562) cannot be known statically
+    dynamic = dynamic or "__getattr__" in signatures or "__getattr__" in bound_names
+    names: dict[str, FunctionSignature | None] = {
+        name: None if dynamic or name in bound_names else signature
+        for name, signature in signatures.items()
+    }
+    names.update(dict.fromkeys(bound_names))
+    return ModuleSummary(None, names, dynamic)
+
+
+def _binds_names_dynamically(node: ast.AST, imported_names: set[str]) -> bool:
+    """Return whether the node can bind names of the module that are not visible to a static check"""
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+        return node.func.id in _DYNAMIC_BINDING_CALLS
+    if isinstance(node, ast.Attribute):
+        # NOTE: Assigning to an attribute of an imported module may rebind a name of this module, if the module
+        # imports itself
+        return node.attr in _DYNAMIC_BINDING_ATTRIBUTES or (
+            isinstance(node.ctx, ast.Store | ast.Del)
+            and isinstance(node.value, ast.Name)
+            and node.value.id in imported_names
+        )
+    if isinstance(node, ast.Import):
+        return any(alias.name.split(".")[0] in _DYNAMIC_BINDING_MODULES for alias in node.names)
+    if isinstance(node, ast.ImportFrom):
+        return (node.module or "").split(".")[0] in _DYNAMIC_BINDING_MODULES or any(
+            alias.name in _DYNAMIC_BINDING_ATTRIBUTES for alias in node.names
+        )
+    return False
+
+
+_module_cache: OrderedDict[str, ModuleSummary] = OrderedDict()
+_module_cache_lock = Lock()
+
+
+def summarise_module(content: str) -> ModuleSummary:
+    """Parse the source of a user file, cached by its content hash"""
+    content_hash = hashlib.sha256(content.encode()).hexdigest()
+    with _module_cache_lock:
+        if (summary := _module_cache.get(content_hash)) is not None:
+            _module_cache.move_to_end(content_hash)
+            return summary
+
+    summary = _summarise_module(content)
+    with _module_cache_lock:
+        _module_cache[content_hash] = summary
+        if len(_module_cache) > MODULE_CACHE_SIZE:
+            _module_cache.popitem(last=False)
+    return summary
+
+
+def check_user_files(files: dict[str, File], calls: Iterable[UserFunctionCall]) -> list[str]:
+    """
+    Check that the user files (by user input id) compile, and define every function that is called from
+    them at the top level with parameters that the call can be bound to. Returns the errors that are found.
+    """
+    errors: list[str] = []
+    failed_files: set[str] = set()
+    for call in sorted(calls):
+        file = files.get(call.user_input_id)
+        # NOTE: Assume that the program file is always a Python file
+        if file is None or not file.name.endswith(".py"):
+            continue
+
+        summary = summarise_module(file.content)
+        if summary.error is not None:
+            if file.name not in failed_files:
+                errors.append(f"{file.name}, {summary.error}")
+            failed_files.add(file.name)
+            continue
+
+        function = call.function_identifier
+        if function not in summary.names:
+            if not summary.dynamic:
+                errors.append(f"{file.name} does not define a function named {function}")
+            continue
+
+        signature = summary.names[function]
+        if signature is not None and (
+            error := signature.check_call(call.num_args, call.kwarg_names)
+        ):
+            errors.append(f"{function}() in {file.name} {error}")
+    return errors
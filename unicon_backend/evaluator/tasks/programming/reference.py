@@ -0,0 +1,80 @@
+import ast
+import json
+from logging import getLogger
+from typing import Final
+
+from unicon_backend.evaluator.tasks.programming.codegen import CodegenBackend, Program
+
+logger = getLogger(__name__)
+
+# Precomputed values with a longer source are not inlined, as they are assembled into every program of the task
+MAX_REFERENCE_OUTPUT_SIZE: Final[int] = 64 * 1024
+
+# Prefix of the line of stdout that a reference program reports its outputs on, as the steps may print as well
+REFERENCE_OUTPUTS_PREFIX: Final[str] = "__unicon_reference_outputs__:"
+
+REFERENCE_TEMPLATE = """
+import ast
+import json
+
+def write_reference_outputs(outputs):
+    sources = {}
+    for variable, value in outputs.items():
+        source = repr(value)
+        try:
+            restored = ast.literal_eval(source)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            continue
+        # NOTE: Only values that are restored exactly from their source can be inlined
+        if type(restored) is type(value) and restored == value:
+            sources[variable] = source
+    print(REFERENCE_OUTPUTS_PREFIX + json.dumps(sources), flush=True)
+"""
+
+
+def assemble_reference_code(program: Program, backend: CodegenBackend) -> str:
+    """
+    Assemble the entrypoint of a program assembled by `ComputeGraph.assemble_reference_program`, which reports the
+    precomputed values that can be inlined as Python literals on its stdout (see `parse_reference_outputs`).
+
+    NOTE: The program is run by the runner like the programs of submissions, so it is sandboxed and limited in the
+    same way. It only runs functions of files that are not user-provided.
+    """
+    header = backend.parse_module(
+        f"REFERENCE_OUTPUTS_PREFIX = {REFERENCE_OUTPUTS_PREFIX!r}\n{REFERENCE_TEMPLATE}"
+    )
+    return backend.code(backend.module([*backend.body(header), *backend.body(program)]))
+
+
+def parse_reference_outputs(stdout: str) -> dict[str, str]:
+    """
+    Parse the precomputed values that a reference program reported, by output variable. Values that are not Python
+    literals are dropped, as they are assembled into the programs of submissions as source code.
+    """
+    for line in reversed(stdout.splitlines()):
+        if not line.startswith(REFERENCE_OUTPUTS_PREFIX):
+            continue
+        try:
+            sources = json.loads(line.removeprefix(REFERENCE_OUTPUTS_PREFIX))
+        except ValueError as e:
+            logger.warning(f"Failed to parse reference outputs: {e}")
+            return {}
+        if not isinstance(sources, dict):
+            return {}
+        return {
+            variable: source
+            for variable, source in sources.items()
+            if isinstance(variable, str)
+            and isinstance(source, str)
+            and len(source) <= MAX_REFERENCE_OUTPUT_SIZE
+            and _is_literal(source)
+        }
+    return {}
+
+
+def _is_literal(source: str) -> bool:
+    try:
+        ast.literal_eval(source)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return False
+    return True
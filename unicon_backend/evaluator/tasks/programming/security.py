@@ -1,6 +1,121 @@
-import libcst as cst
+import json
+from collections.abc import Sequence
+from functools import cache
+from typing import Final, NamedTuple
 
-WORKER_TEMPLATE = cst.parse_module("""
+from unicon_backend.evaluator.tasks.programming.codegen import (
+    DEFAULT_CODEGEN_BACKEND,
+    CodegenBackend,
+    Program,
+    ProgramStatement,
+)
+from unicon_backend.runner import TestcaseIsolation
+
+# NOTE: Every testcase of a fused program prints one JSON line, tagged with its testcase id under this key
+FUSED_TESTCASE_ID_KEY: Final[str] = "__testcase_id__"
+
+SANDBOX_START_METHODS: Final[tuple[str, ...]] = ("spawn", "forkserver")
+
+
+class ParameterisedProgram(NamedTuple):
+    """The program of a parameterised testcase, which is run once for every row of arguments"""
+
+    program: Program
+    # Names of the variables of the program that are bound by the arguments of a row
+    parameters: Sequence[str]
+    # Source code of the arguments of every row, by the testcase id that the row is reported as
+    rows: Sequence[tuple[int, Sequence[str]]]
+
+
+class SandboxOptions(NamedTuple):
+    """Options of the sandbox runtime, which are set through `ComputeContext.extra_options`"""
+
+    # Start method of the worker process that runs user code (`sandbox_start_method`)
+    start_method: str = "spawn"
+    # Modules that the fork server imports once, so that every worker forked from it starts with them imported
+    # Comma-separated (`sandbox_preload`), only for the `forkserver` start method
+    preload_modules: tuple[str, ...] = ()
+    # Size in bytes from which arguments and results of user functions are moved through shared memory instead of
+    # the pipe of the worker queues, 0 to disable (`sandbox_shared_memory_threshold`)
+    shared_memory_threshold: int = 1 << 20
+
+    @classmethod
+    def from_extra_options(cls, extra_options: dict[str, str] | None) -> "SandboxOptions":
+        extra_options = extra_options or {}
+        start_method = extra_options.get("sandbox_start_method", "spawn")
+        if start_method not in SANDBOX_START_METHODS:
+            raise ValueError(
+                f"Unknown sandbox start method {start_method}, expected one of {SANDBOX_START_METHODS}"
+            )
+
+        preload_modules = tuple(
+            module.strip()
+            for module in extra_options.get("sandbox_preload", "").split(",")
+            if module.strip()
+        )
+        for module in preload_modules:
+            if not all(part.isidentifier() for part in module.split(".")):
+                raise ValueError(f"Invalid sandbox preload module {module}")
+        if preload_modules and start_method != "forkserver":
+            raise ValueError("Preloading modules requires the forkserver sandbox start method")
+
+        shared_memory_threshold = extra_options.get("sandbox_shared_memory_threshold")
+        if shared_memory_threshold is None:
+            return cls(start_method, preload_modules)
+        if not shared_memory_threshold.isdigit():
+            raise ValueError(f"Invalid sandbox shared memory threshold {shared_memory_threshold}")
+        return cls(start_method, preload_modules, int(shared_memory_threshold))
+
+
+DEFAULT_SANDBOX_OPTIONS: Final[SandboxOptions] = SandboxOptions()
+
+TRANSPORT_TEMPLATE = """
+import pickle
+from multiprocessing import shared_memory
+
+def pack(value):
+    # Buffers of objects that support pickle protocol 5 (e.g. NumPy arrays) are copied out-of-band, without pickling
+    buffers = []
+    data = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+    views = [memoryview(data), *(buffer.raw() for buffer in buffers)]
+    size = sum(view.nbytes for view in views)
+    # Large values are moved through shared memory instead of the pipe of the queue
+    if SHARED_MEMORY_THRESHOLD and size >= SHARED_MEMORY_THRESHOLD:
+        try:
+            memory = shared_memory.SharedMemory(create=True, size=size)
+        except OSError:
+            memory = None
+        if memory is not None:
+            offset = 0
+            for view in views:
+                memory.buf[offset:offset + view.nbytes] = view
+                offset += view.nbytes
+            memory.close()
+            return ("SHM", memory.name, [view.nbytes for view in views])
+    return ("PICKLE", data, [view.tobytes() for view in views[1:]])
+
+
+def unpack(message):
+    if message[0] == "PICKLE":
+        _, data, buffers = message
+        return pickle.loads(data, buffers=buffers)
+
+    _, name, sizes = message
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        # Out-of-band buffers are copied, as the unpickled value may keep them alive after the memory is released
+        buffers, offset = [], sizes[0]
+        for size in sizes[1:]:
+            buffers.append(bytearray(memory.buf[offset:offset + size]))
+            offset += size
+        with memory.buf[:sizes[0]] as data:
+            return pickle.loads(data, buffers=buffers)
+    finally:
+        memory.close()
+        memory.unlink()
+"""
+
+WORKER_TEMPLATE = """
 import os
 from contextlib import redirect_stdout
 
@@ -13,21 +128,50 @@ def call_function_from_file(file_name, function_name, *args, **kwargs):
             return func(*args, **kwargs)
 
 
+def reset_program_modules():
+    # Modules loaded from the program directory (user and testcase files) are imported afresh on their next use
+    program_dir = os.path.dirname(os.path.abspath(__file__))
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None)
+        if name not in ("__main__", "__mp_main__") and path and os.path.dirname(os.path.abspath(path)) == program_dir:
+            del sys.modules[name]
+
+
+def picklable(result, err):
+    try:
+        pickle.dumps((result, err), protocol=5)
+        return result, err
+    except Exception as e:
+        # e.g. the error holds a reference to an unpicklable object
+        return None, e if err is None else RuntimeError(repr(err))
+
+
 def worker(task_queue, result_queue):
     while True:
         task = task_queue.get()
         if task == "STOP":
             break
+        if task == "RESET":
+            reset_program_modules()
+            continue
 
-        file_name, function_name, args, kwargs = task
+        # A task is a batch of calls, which are run in order
+        results = []
+        for file_name, function_name, allow_error, args, kwargs in unpack(task):
+            try:
+                results.append((call_function_from_file(file_name, function_name, *args, **kwargs), None))
+            except Exception as e:
+                results.append((None, e))
+                # The program exits on this error, so the rest of the batch must not run
+                if not allow_error:
+                    break
         try:
-            result = call_function_from_file(file_name, function_name, *args, **kwargs)
-            result_queue.put((result, None))
-        except Exception as e:
-            result_queue.put((None, e))
-""")
+            result_queue.put(pack(results))
+        except Exception:
+            result_queue.put(pack([picklable(result, err) for result, err in results]))
+"""
 
-MPI_CLEANUP_TEMPLATE = cst.parse_module("""
+MPI_CLEANUP_TEMPLATE = """
 import atexit
 
 def cleanup():
@@ -35,37 +179,203 @@ def cleanup():
     process.join()
 
 atexit.register(cleanup)
-""")
+"""
 
-ENTRYPOINT_TEMPLATE = cst.parse_module("""
-multiprocessing.freeze_support()
-multiprocessing.set_start_method("spawn")
+ENTRYPOINT_TEMPLATE = """
 task_queue = multiprocessing.Queue()
 result_queue = multiprocessing.Queue()
 
 process = multiprocessing.Process(target=worker, args=(task_queue, result_queue))
 process.start()
 
+def function_call(file_name, function_name, allow_error, *args, **kwargs):
+    return file_name, function_name, allow_error, args, kwargs
+
+def call_functions_safe(*calls):
+    task_queue.put(pack(calls))
+    outputs = []
+    for (file_name, function_name, allow_error, _, _), (result, err) in zip(calls, unpack(result_queue.get())):
+        if not allow_error and err is not None:
+            print(json.dumps({"file_name": file_name, "function_name": function_name, "error": str(err)}))
+            sys.exit(1)
+        outputs.extend((result, err))
+    return outputs
+
 def call_function_safe(file_name, function_name, allow_error, *args, **kwargs):
-    task_queue.put((file_name, function_name, args, kwargs))
-    result, err = result_queue.get()
-    if not allow_error and err is not None:
-        print(json.dumps({"file_name": file_name, "function_name": function_name, "error": str(err)}))
-        sys.exit(1)
+    result, err = call_functions_safe(function_call(file_name, function_name, allow_error, *args, **kwargs))
     return result, err
-""")
+"""
+
+FUSED_TEMPLATE = """
+import io
+import traceback
+from contextlib import redirect_stdout
+
+def restart_worker():
+    global process
+    task_queue.put("STOP")
+    process.join()
+    process = multiprocessing.Process(target=worker, args=(task_queue, result_queue))
+    process.start()
+
+skip_testcases = False
+
+def has_incorrect_outputs(stdout):
+    # NOTE: Outputs judged by the program report whether they are correct (see `judge_outputs`)
+    try:
+        outputs = json.loads(stdout)
+    except ValueError:
+        return True
+    if not isinstance(outputs, dict):
+        return True
+    return any(isinstance(output, dict) and output.get("correct") is False for output in outputs.values())
+
+def run_testcase(testcase_id, testcase, isolation, stop_on_failure, judged_outputs):
+    global skip_testcases
+    if skip_testcases:
+        print(json.dumps({"__testcase_id__": testcase_id, "status": "SKIPPED", "stdout": "", "stderr": ""}), flush=True)
+        return
+
+    stdout = io.StringIO()
+    status, stderr = "OK", ""
+    try:
+        with redirect_stdout(stdout):
+            testcase()
+    except SystemExit as e:
+        if e.code:
+            status = "RTE"
+    except Exception:
+        status, stderr = "RTE", traceback.format_exc()
+    result = {"status": status, "stdout": stdout.getvalue(), "stderr": stderr}
+    print(json.dumps({"__testcase_id__": testcase_id, **result}), flush=True)
+    skip_testcases = stop_on_failure and (
+        status != "OK" or (judged_outputs and has_incorrect_outputs(result["stdout"]))
+    )
+
+    if isolation == "RELOAD":
+        task_queue.put("RESET")
+        reset_program_modules()
+    elif isolation == "PROCESS":
+        restart_worker()
+        reset_program_modules()
+
+def run_parameterised_testcase(rows, testcase, isolation, stop_on_failure, judged_outputs):
+    for testcase_id, arguments in rows:
+        run_testcase(testcase_id, lambda: testcase(*arguments), isolation, stop_on_failure, judged_outputs)
+
+def run_testcases(order, runs, isolation, stop_on_failure, judged_outputs):
+    # NOTE: Testcases are run in the given order of their indices, e.g. those that failed most often first
+    for index in order:
+        run, testcase_id_or_rows, testcase = runs[index]
+        run(testcase_id_or_rows, testcase, isolation, stop_on_failure, judged_outputs)
+"""
 
 
-def mpi_sandbox(program: cst.Module) -> cst.Module:
-    return cst.Module(
+@cache
+def _parse_template(backend: CodegenBackend, template: str) -> Program:
+    return backend.parse_module(template)
+
+
+def _start_method_template(options: SandboxOptions) -> str:
+    lines = [
+        "multiprocessing.freeze_support()",
+        f"multiprocessing.set_start_method({json.dumps(options.start_method)})",
+    ]
+    if options.preload_modules:
+        # NOTE: Modules that fail to import are skipped by the fork server
+        lines.append(
+            f"multiprocessing.set_forkserver_preload({json.dumps(list(options.preload_modules))})"
+        )
+    return "\n".join(lines)
+
+
+def _sandbox(
+    body: Sequence[ProgramStatement], backend: CodegenBackend, options: SandboxOptions
+) -> Program:
+    return backend.module(
         [
-            cst.parse_statement("import importlib, multiprocessing, sys, json"),
-            *WORKER_TEMPLATE.body,
-            cst.If(
-                test=cst.parse_expression("__name__ == '__main__'"),
-                body=cst.IndentedBlock(
-                    [*ENTRYPOINT_TEMPLATE.body, *MPI_CLEANUP_TEMPLATE.body, *program.body]
-                ),
+            *backend.body(_parse_template(backend, "import importlib, multiprocessing, sys, json")),
+            *backend.body(
+                _parse_template(
+                    backend, f"SHARED_MEMORY_THRESHOLD = {options.shared_memory_threshold}"
+                )
+            ),
+            *backend.body(_parse_template(backend, TRANSPORT_TEMPLATE)),
+            *backend.body(_parse_template(backend, WORKER_TEMPLATE)),
+            backend.if_else(
+                backend.parse_expression("__name__ == '__main__'"),
+                [
+                    *backend.body(_parse_template(backend, _start_method_template(options))),
+                    *backend.body(_parse_template(backend, ENTRYPOINT_TEMPLATE)),
+                    *backend.body(_parse_template(backend, MPI_CLEANUP_TEMPLATE)),
+                    *body,
+                ],
+                None,
             ),
         ]
     )
+
+
+def mpi_sandbox(
+    program: Program,
+    backend: CodegenBackend = DEFAULT_CODEGEN_BACKEND,
+    options: SandboxOptions = DEFAULT_SANDBOX_OPTIONS,
+) -> Program:
+    return _sandbox(backend.body(program), backend, options)
+
+
+def fused_mpi_sandbox(
+    programs: Sequence[tuple[int, Program | ParameterisedProgram]],
+    isolation: TestcaseIsolation,
+    backend: CodegenBackend = DEFAULT_CODEGEN_BACKEND,
+    options: SandboxOptions = DEFAULT_SANDBOX_OPTIONS,
+    stop_on_failure: bool = False,
+    judged_outputs: bool = False,
+    order: str | None = None,
+) -> Program:
+    """
+    Sandbox the programs of several testcases as a single program, which runs them in sequence against the same
+    sandbox worker. Every testcase prints one JSON line with its status and output (see `FUSED_TEMPLATE`).
+    If `stop_on_failure` is set, the testcases after the first one that fails are reported as skipped. If the
+    programs judge their own outputs (`judged_outputs`), a testcase with an incorrect output fails as well.
+
+    Parameterised programs are run once for every row, in a loop over a table of their arguments. Each row is
+    reported as a testcase of its own.
+
+    The testcases are run in the order of the indices (into `programs`) that the source code `order` evaluates to,
+    and in the given order by default. It is data of the program, so that it can be filled in after assembly.
+    """
+    body: list[ProgramStatement] = [*backend.body(_parse_template(backend, FUSED_TEMPLATE))]
+    runs: list[str] = []
+    for index, (testcase_id, program) in enumerate(programs):
+        function_name = f"testcase_{index}"
+        if isinstance(program, ParameterisedProgram):
+            rows_source = ", ".join(
+                f"({row_id}, ({''.join(f'{argument}, ' for argument in arguments)}))"
+                for row_id, arguments in program.rows
+            )
+            body.append(
+                backend.function_def(
+                    function_name, backend.body(program.program), program.parameters
+                )
+            )
+            runs.append(f"(run_parameterised_testcase, [{rows_source}], {function_name})")
+        else:
+            body.append(backend.function_def(function_name, backend.body(program)))
+            runs.append(f"(run_testcase, {testcase_id}, {function_name})")
+
+    body.append(
+        backend.expression_statement(
+            backend.call(
+                backend.identifier("run_testcases"),
+                [
+                    backend.parse_expression(order or repr(list(range(len(programs))))),
+                    backend.parse_expression(f"[{', '.join(runs)}]"),
+                    backend.string(isolation.value),
+                    backend.literal(stop_on_failure),
+                    backend.literal(judged_outputs),
+                ],
+            )
+        )
+    )
+    return _sandbox(body, backend, options)
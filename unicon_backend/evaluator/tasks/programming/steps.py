@@ -1,18 +1,30 @@
 import abc
+import inspect
+import json
 import logging
+import math
 from collections import deque
 from collections.abc import MutableSequence, Sequence
 from enum import Enum, StrEnum
-from functools import cached_property
-from typing import TYPE_CHECKING, Any, ClassVar, Optional, Self
+from functools import cache, cached_property
+from typing import TYPE_CHECKING, Any, ClassVar, Final, NamedTuple, Optional, Self, TypeGuard
 
-import libcst as cst
-from pydantic import model_validator
+from pydantic import PrivateAttr, model_validator
 
+from unicon_backend.evaluator.tasks.programming import comparison
 from unicon_backend.evaluator.tasks.programming.artifact import File, PrimitiveData
-from unicon_backend.evaluator.tasks.programming.transforms import hoist_imports
+from unicon_backend.evaluator.tasks.programming.codegen import (
+    DEFAULT_CODEGEN_BACKEND,
+    CodegenBackend,
+    Program,
+    ProgramExpression,
+    ProgramImport,
+    ProgramImports,
+    ProgramStatement,
+)
+from unicon_backend.evaluator.tasks.programming.preflight import UserFunctionCall
 from unicon_backend.lib.common import CustomBaseModel, CustomSQLModel
-from unicon_backend.lib.graph import Graph, GraphNode, NodeSocket
+from unicon_backend.lib.graph import Graph, GraphEdge, GraphIR, GraphNode, NodeSocket
 from unicon_backend.lib.helpers import partition
 
 if TYPE_CHECKING:
@@ -21,29 +33,42 @@ if TYPE_CHECKING:
 logger = logging.getLogger(__name__)
 
 type SocketId = str
-type ProgramVariable = cst.Name
-type ProgramFragment = Sequence[
-    cst.SimpleStatementLine | cst.BaseCompoundStatement | cst.BaseSmallStatement
-]
-type ProgramBody = MutableSequence[cst.SimpleStatementLine | cst.BaseCompoundStatement]
 
-# A program can be made up of sub programs, especially with subgraphs
-Program = cst.Module
+# NOTE: The user input is always provided as an `InputStep` with this id
+USER_INPUT_STEP_ID: int = 0
+type ProgramVariable = ProgramExpression
+type ProgramFragment = Sequence[ProgramStatement]
+type ProgramBody = MutableSequence[ProgramStatement]
 
+# NOTE: Programs assembled in debug mode report their per-step timings in the output under this key
+STEP_TIMINGS_KEY: Final[str] = "__step_timings__"
 
-def assemble_fragment(
-    fragment: ProgramFragment,
-) -> Sequence[cst.SimpleStatementLine | cst.BaseCompoundStatement]:
-    """
-    Assemble a program fragement into a list of `cst.Module` statements.
+PROFILING_TEMPLATE = """
+import time
+import tracemalloc
 
-    We allow for `cst.BaseSmallStatement` to be included in the fragment for convenience during assembly,
-    however they are not valid statements in a `cst.Module`. As such, we convert them to `cst.SimpleStatementLine`.
-    """
-    return [
-        cst.SimpleStatementLine([stmt]) if isinstance(stmt, cst.BaseSmallStatement) else stmt
-        for stmt in fragment
-    ]
+step_timings = {}
+
+def start_step(trace_memory):
+    if trace_memory:
+        tracemalloc.reset_peak()
+    return time.perf_counter()
+
+def end_step(step_id, start, trace_memory):
+    elapsed = time.perf_counter() - start
+    timing = step_timings.setdefault(step_id, {"calls": 0, "total_secs": 0.0, "max_secs": 0.0})
+    timing["calls"] += 1
+    timing["total_secs"] += elapsed
+    timing["max_secs"] = max(timing["max_secs"], elapsed)
+    if trace_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        timing["peak_memory_bytes"] = max(timing.get("peak_memory_bytes", 0), peak_memory)
+"""
+
+
+@cache
+def _comparison_source() -> str:
+    return inspect.getsource(comparison)
 
 
 class StepType(str, Enum):
@@ -94,36 +119,54 @@ class Operator(StrEnum):
     LESS_THAN = "<"
     EQUAL = "="
     GREATER_THAN = ">"
+    # Numbers or (nested lists as) arrays of numbers of the same shape, compared elementwise
+    APPROXIMATELY_EQUAL = "~="
+    ARRAY_EQUAL = "[=]"
 
 
 class Comparison(CustomSQLModel):
     operator: Operator
     value: Any
+    rel_tol: float | None = None
+    """Relative tolerance of the approximate comparison. Optional."""
+    abs_tol: float | None = None
+    """Absolute tolerance of the approximate comparison. Optional."""
 
     @model_validator(mode="after")
     def check_value_type(self) -> Self:
-        """For < and >, check the operator can be compared (i.e. primitive)"""
+        """Check the value can be compared with the operator, e.g. only primitives for < and >"""
+        if (self.rel_tol is not None or self.abs_tol is not None) and (
+            self.operator != Operator.APPROXIMATELY_EQUAL
+        ):
+            raise ValueError(f"Tolerances are not supported for operator {self.operator}")
+        if any(tol is not None and not tol >= 0 for tol in (self.rel_tol, self.abs_tol)):
+            raise ValueError("Tolerances must be non-negative")
+
         if self.operator == Operator.EQUAL:
             return self
+        if self.operator in (Operator.APPROXIMATELY_EQUAL, Operator.ARRAY_EQUAL):
+            if comparison.as_array(self.value) is None:
+                raise ValueError(
+                    f"Invalid comparison value for operator {self.operator}, "
+                    "expected a number or a rectangular array of numbers"
+                )
+            return self
         if not isinstance(self.value, PrimitiveData):
             raise ValueError(f"Invalid comparison value {self.value} for operator {self.operator}")
         return self
 
-    def compare(self, actual_value: Any):
-        try:
-            match self.operator:
-                case Operator.EQUAL:
-                    return actual_value == self.value
-                case Operator.LESS_THAN:
-                    return actual_value < self.value
-                case Operator.GREATER_THAN:
-                    return actual_value > self.value
-                case _:
-                    return False
-        except:
-            # if there was an exception, the type returned was incorrect.
-            # so return False.
-            return False  # noqa: B012
+    @property
+    def tolerances(self) -> list[float]:
+        """The tolerances of an approximate comparison, as taken by `comparison.compare`"""
+        if self.operator != Operator.APPROXIMATELY_EQUAL:
+            return []
+        return [
+            comparison.DEFAULT_REL_TOL if self.rel_tol is None else self.rel_tol,
+            comparison.DEFAULT_ABS_TOL if self.abs_tol is None else self.abs_tol,
+        ]
+
+    def compare(self, actual_value: Any) -> bool:
+        return comparison.compare(self.operator, actual_value, self.value, *self.tolerances)
 
 
 class OutputSocket(StepSocket):
@@ -154,6 +197,11 @@ class Step[SocketT: StepSocket](CustomBaseModel, GraphNode[SocketT], abc.ABC, po
     # The required number of control sockets
     # The maximum number by default is 1 for both input and output control sockets (CONTROL.IN and CONTROL.OUT)
     required_data_io: ClassVar[tuple[Range, Range]] = ((-1, -1), (-1, -1))
+    # Whether `get_imports` declares every import used by the fragment returned by `run`
+    # If not, the imports of the fragment are found by visiting the assembled program instead
+    declares_imports: ClassVar[bool] = True
+    # Whether the step has no side effects, so that it can be removed if none of its outputs are used
+    is_pure: ClassVar[bool] = False
 
     @model_validator(mode="after")
     def check_required_inputs_and_outputs(self) -> Self:
@@ -209,19 +257,22 @@ class Step[SocketT: StepSocket](CustomBaseModel, GraphNode[SocketT], abc.ABC, po
         if subgraph_socket is None:
             raise ValueError(f"Subgraph socket {subgraph_socket_id} not found!")
 
-        subgraph_start_node: Step | None = None
+        ir = graph.ir
+        node = ir.node_indices[self.id]
+        socket = ir.socket_indices[subgraph_socket.id]
+        subgraph_start_node: int | None = None
 
         # Check both incoming and outgoing edges to find the subgraph start node
         # NOTE: Assumes that there is only one edge connected to the subgraph socket
 
-        for out_edge in graph.out_edges_index[self.id]:
-            if out_edge.from_socket_id == subgraph_socket.id:
-                subgraph_start_node = graph.node_index[out_edge.to_node_id]
+        for out_edge in ir.out_edges_of(node):
+            if ir.edge_from_socket[out_edge] == socket:
+                subgraph_start_node = ir.edge_to[out_edge]
                 break
 
-        for in_edge in graph.in_edges_index[self.id]:
-            if in_edge.to_socket_id == subgraph_socket.id:
-                subgraph_start_node = graph.node_index[in_edge.from_node_id]
+        for in_edge in ir.in_edges_of(node):
+            if ir.edge_to_socket[in_edge] == socket:
+                subgraph_start_node = ir.edge_from[in_edge]
                 break
 
         if subgraph_start_node is None:
@@ -229,29 +280,27 @@ class Step[SocketT: StepSocket](CustomBaseModel, GraphNode[SocketT], abc.ABC, po
             # This can happen if the a step allows an empty subgraph - we defer the check to the step
             return set()
 
-        subgraph_node_ids: set[int] = set()
-        bfs_queue: deque[Step] = deque([subgraph_start_node])
+        # NOTE: Sockets that are not used by any step or edge are never linked
+        control_out = ir.socket_indices.get("CONTROL.OUT", -1)
+        control_in = ir.socket_indices.get("CONTROL.IN", -1)
+
+        subgraph_nodes: set[int] = set()
+        bfs_queue: deque[int] = deque([subgraph_start_node])
         while len(bfs_queue):
             frontier_node = bfs_queue.popleft()
-            if frontier_node.id in subgraph_node_ids:
+            if frontier_node in subgraph_nodes:
                 continue
 
-            subgraph_node_ids.add(frontier_node.id)
-            for out_edge in graph.out_edges_index[frontier_node.id]:
-                from_socket_id = out_edge.from_socket_id
-                to_socket_id = out_edge.to_socket_id
-
-                if from_socket_id == "CONTROL.OUT" and to_socket_id == "CONTROL.IN":
-                    bfs_queue.append(graph.node_index[out_edge.to_node_id])
-
-            for in_edge in graph.in_edges_index[frontier_node.id]:
-                to_socket_id = in_edge.to_socket_id
-                from_socket_id = in_edge.from_socket_id
+            subgraph_nodes.add(frontier_node)
+            # NOTE: Only the control flow following the start node belongs to the subgraph
+            for out_edge in ir.out_edges_of(frontier_node):
+                if (
+                    ir.edge_from_socket[out_edge] == control_out
+                    and ir.edge_to_socket[out_edge] == control_in
+                ):
+                    bfs_queue.append(ir.edge_to[out_edge])
 
-                if to_socket_id == "CONTROL.IN" and from_socket_id == "CONTROL.OUT":
-                    bfs_queue.append(graph.node_index[out_edge.from_node_id])
-
-        return subgraph_node_ids
+        return {ir.node_ids[subgraph_node] for subgraph_node in subgraph_nodes}
 
     def get_all_subgraph_node_ids(self, graph: "ComputeGraph") -> set[int]:
         subgraph_node_ids: set[int] = set()
@@ -261,13 +310,37 @@ class Step[SocketT: StepSocket](CustomBaseModel, GraphNode[SocketT], abc.ABC, po
 
         return subgraph_node_ids
 
-    def run_subgraph(self, subgraph_socket_id: str, graph: "ComputeGraph") -> Program:
-        return graph.run(
-            debug=self._debug, node_ids=self.get_subgraph_node_ids(subgraph_socket_id, graph)
+    def run_subgraph(
+        self, subgraph_socket_id: str, graph: "ComputeGraph", backend: CodegenBackend
+    ) -> ProgramFragment:
+        return backend.body(
+            graph.run(
+                debug=self._debug,
+                region=graph.subregions[self.id][subgraph_socket_id],
+                backend=backend,
+            )
         )
 
-    def get_output_variable(self, output: SocketId) -> ProgramVariable:
-        return cst.Name(f"var_{self.id}_{output}".replace(".", "_"))
+    def get_output_variable(self, output: SocketId) -> str:
+        """Return the name of the program variable that the output socket is assigned to"""
+        return f"var_{self.id}_{output}".replace(".", "_")
+
+    def get_imports(
+        self, file_inputs: dict[SocketId, File], graph: "ComputeGraph"
+    ) -> Sequence[ProgramImport]:
+        """Return the imports required by the program fragment of the step"""
+        return []
+
+    @property
+    def expression_output(self) -> SocketT | None:
+        """The only output of the step, if the step can be assembled as an expression (see `get_expression`)"""
+        return None
+
+    def get_expression(
+        self, var_inputs: dict[SocketId, ProgramVariable], backend: CodegenBackend
+    ) -> ProgramExpression:
+        """Return the expression that the output of the step is assigned to, so it can be inlined at its use"""
+        raise NotImplementedError(f"Step {self.id} cannot be assembled as an expression")
 
     @abc.abstractmethod
     def run(
@@ -275,11 +348,13 @@ class Step[SocketT: StepSocket](CustomBaseModel, GraphNode[SocketT], abc.ABC, po
         var_inputs: dict[SocketId, ProgramVariable],
         file_inputs: dict[SocketId, File],
         graph: "ComputeGraph",
+        backend: CodegenBackend,
     ) -> ProgramFragment: ...
 
 
 class InputStep(Step[StepSocket]):
     required_data_io: ClassVar[tuple[Range, Range]] = ((0, 0), (1, -1))
+    is_pure: ClassVar[bool] = True
 
     @model_validator(mode="after")
     def check_non_empty_data_outputs(self) -> Self:
@@ -288,16 +363,9 @@ class InputStep(Step[StepSocket]):
                 raise ValueError(f"Missing data for output socket {socket.id}")
         return self
 
-    def run(self, *_) -> ProgramFragment:
-        def _parse(data: str | int | float | bool) -> cst.BaseExpression:
-            # TODO: Better handle of variables vs strings
-            data_repr: str = (
-                repr(data)
-                if not isinstance(data, str)
-                else (f'"{data}"' if not data.startswith("var_") else data)
-            )
-            return cst.parse_expression(data_repr)
-
+    def run(
+        self, _var_inputs, _file_inputs, graph: "ComputeGraph", backend: CodegenBackend
+    ) -> ProgramFragment:
         program = []
         for socket in self.data_out:
             if isinstance(socket.data, File):
@@ -305,11 +373,11 @@ class InputStep(Step[StepSocket]):
                 # directly to the next step. This is handled by the `ComputeGraph` class
                 continue
             elif isinstance(socket.data, PrimitiveData):
+                variable = self.get_output_variable(socket.id)
+                if not graph.is_variable_used(variable) or variable in graph.parameters:
+                    continue
                 program.append(
-                    cst.Assign(
-                        targets=[cst.AssignTarget(self.get_output_variable(socket.id))],
-                        value=_parse(socket.data),
-                    )
+                    backend.assign([backend.identifier(variable)], backend.literal(socket.data))
                 )
 
         return program
@@ -318,50 +386,94 @@ class InputStep(Step[StepSocket]):
 class OutputStep(Step[OutputSocket]):
     required_data_io: ClassVar[tuple[Range, Range]] = ((1, -1), (0, 0))
 
-    def run(self, var_inputs: dict[SocketId, ProgramVariable], *_) -> ProgramFragment:
-        result_dict = cst.Dict(
-            [
-                cst.DictElement(key=cst.SimpleString(repr(socket.id)), value=var_inputs[socket.id])
-                for socket in self.data_in
-            ]
+    def get_imports(self, _file_inputs, _graph) -> Sequence[ProgramImport]:
+        return [ProgramImport("json")]
+
+    def run(
+        self,
+        var_inputs: dict[SocketId, ProgramVariable],
+        _file_inputs,
+        graph: "ComputeGraph",
+        backend: CodegenBackend,
+    ) -> ProgramFragment:
+        result_items = [
+            (backend.string(socket.id), var_inputs[socket.id]) for socket in self.data_in
+        ]
+        timing_items = (
+            [(backend.string(STEP_TIMINGS_KEY), backend.identifier("step_timings"))]
+            if self._debug
+            else []
         )
+        if graph.output_preview_size is None:
+            result_dict = backend.dict([*result_items, *timing_items])
+        else:
+            # NOTE: Only whether every output is correct and a preview of its value are reported
+            comparisons = {
+                socket.id: [
+                    socket.comparison.operator.value,
+                    socket.comparison.value,
+                    *socket.comparison.tolerances,
+                ]
+                for socket in self.data_in
+                if socket.comparison is not None
+            }
+            result_dict = backend.call(
+                backend.identifier("judge_outputs"),
+                [
+                    backend.dict(result_items),
+                    backend.string(json.dumps(comparisons)),
+                    backend.literal(graph.output_preview_size),
+                    *([backend.dict(timing_items)] if timing_items else []),
+                ],
+            )
 
         return [
-            cst.Import([cst.ImportAlias(name=cst.Name("json"))]),
-            cst.Expr(
-                cst.Call(
-                    func=cst.Name("print"),
-                    args=[
-                        cst.Arg(
-                            cst.Call(
-                                func=cst.Attribute(value=cst.Name("json"), attr=cst.Name("dumps")),
-                                args=[cst.Arg(result_dict)],
-                            )
+            backend.expression_statement(
+                backend.call(
+                    backend.identifier("print"),
+                    [
+                        backend.call(
+                            backend.attribute(backend.identifier("json"), "dumps"), [result_dict]
                         )
                     ],
                 )
-            ),
+            )
         ]
 
 
 class StringMatchStep(Step[StepSocket]):
     required_data_io: ClassVar[tuple[Range, Range]] = ((2, 2), (1, 1))
+    is_pure: ClassVar[bool] = True
+
+    @property
+    def expression_output(self) -> StepSocket:
+        return self.outputs[0]
+
+    @staticmethod
+    def match(a: PrimitiveData, b: PrimitiveData) -> bool:
+        """Evaluate the step on constant inputs, the same way as the assembled program does"""
+        return str(a) == str(b)
+
+    def get_expression(
+        self, var_inputs: dict[SocketId, ProgramVariable], backend: CodegenBackend
+    ) -> ProgramExpression:
+        str_func = backend.identifier("str")
+        return backend.equals(
+            backend.call(str_func, [var_inputs[self.data_in[0].id]]),
+            backend.call(str_func, [var_inputs[self.data_in[1].id]]),
+        )
 
-    def run(self, var_inputs: dict[SocketId, ProgramVariable], *_) -> ProgramFragment:
+    def run(
+        self,
+        var_inputs: dict[SocketId, ProgramVariable],
+        _file_inputs,
+        _graph,
+        backend: CodegenBackend,
+    ) -> ProgramFragment:
         return [
-            cst.Assign(
-                targets=[cst.AssignTarget(self.get_output_variable(self.outputs[0].id))],
-                value=cst.Comparison(
-                    left=cst.Call(cst.Name("str"), args=[cst.Arg(var_inputs[self.data_in[0].id])]),
-                    comparisons=[
-                        cst.ComparisonTarget(
-                            cst.Equal(),
-                            cst.Call(
-                                cst.Name("str"), args=[cst.Arg(var_inputs[self.data_in[1].id])]
-                            ),
-                        )
-                    ],
-                ),
+            backend.assign(
+                [backend.identifier(self.get_output_variable(self.expression_output.id))],
+                self.get_expression(var_inputs, backend),
             )
         ]
 
@@ -373,17 +485,30 @@ class ObjectAccessStep(Step[StepSocket]):
     """
 
     required_data_io: ClassVar[tuple[Range, Range]] = ((1, 1), (1, 1))
+    is_pure: ClassVar[bool] = True
 
     key: str
 
-    def run(self, var_inputs: dict[SocketId, ProgramVariable], *_) -> ProgramFragment:
+    @property
+    def expression_output(self) -> StepSocket:
+        return self.data_out[0]
+
+    def get_expression(
+        self, var_inputs: dict[SocketId, ProgramVariable], backend: CodegenBackend
+    ) -> ProgramExpression:
+        return backend.subscript(var_inputs[self.data_in[0].id], backend.string(self.key))
+
+    def run(
+        self,
+        var_inputs: dict[SocketId, ProgramVariable],
+        _file_inputs,
+        _graph,
+        backend: CodegenBackend,
+    ) -> ProgramFragment:
         return [
-            cst.Assign(
-                targets=[cst.AssignTarget(self.get_output_variable(self.data_out[0].id))],
-                value=cst.Subscript(
-                    value=var_inputs[self.data_in[0].id],
-                    slice=[cst.SubscriptElement(cst.Index(cst.SimpleString(repr(self.key))))],
-                ),
+            backend.assign(
+                [backend.identifier(self.get_output_variable(self.expression_output.id))],
+                self.get_expression(var_inputs, backend),
             )
         ]
 
@@ -445,69 +570,137 @@ class PyRunFunctionStep(Step[StepSocket]):
     def kwarg_sockets(self) -> Sequence[StepSocket]:
         return [socket for socket in self.data_in if socket.label.startswith("KWARG.")]
 
-    def run(
-        self,
-        var_inputs: dict[SocketId, ProgramVariable],
-        file_inputs: dict[SocketId, File],
-        graph: "ComputeGraph",
-    ) -> ProgramFragment:
+    def get_module_name(self, file_inputs: dict[SocketId, File]) -> str:
+        """Return the name of the module that the function is run from"""
         # Get the input file that we are running the function from
         program_file: File | None = file_inputs.get(self._data_in_file_id)
         if program_file is None:
             raise ValueError("No program file provided")
 
-        # NOTE: Assume that there can only be one edge connected to the file input socket. This should ideally be validated.
-        # NOTE: Assume that the user-provided input is always stored in the `Step` with id = 0
-        is_user_provided_file: bool = [
-            edge
-            for edge in graph.in_edges_index[self.id]
-            if edge.to_socket_id == self._data_in_file_id
-        ][0].from_node_id == 0
-
         # NOTE: Assume that the program file is always a Python file
-        module_name_str = program_file.name.split(".py")[0]
-
-        func_name = cst.Name(self.function_identifier)
-        args = [cst.Arg(var_inputs[socket.id]) for socket in self.arg_sockets]
-        kwargs = [
-            cst.Arg(var_inputs[socket.id], keyword=cst.Name(socket.label.split(".", 1)[1]))
-            for socket in self.kwarg_sockets
-        ]
+        return program_file.name.split(".py")[0]
 
+    def is_user_provided_file(self, graph: "ComputeGraph") -> bool:
+        # NOTE: Assume that there can only be one edge connected to the file input socket. This should ideally be validated.
+        ir = graph.ir
+        file_socket = ir.socket_indices[self._data_in_file_id]
+        return [
+            ir.node_ids[ir.edge_from[edge]]
+            for edge in ir.in_edges_of(ir.node_indices[self.id])
+            if ir.edge_to_socket[edge] == file_socket
+        ][0] == USER_INPUT_STEP_ID
+
+    def get_user_function_call(self, graph: "ComputeGraph") -> UserFunctionCall | None:
+        """Return the call that the step makes to a function of a user file, if the file is user-provided"""
+        ir = graph.ir
+        for step_input in ir.step_inputs[ir.node_indices[self.id]]:
+            if (
+                step_input.socket_id == self._data_in_file_id
+                and step_input.user_input_socket_id is not None
+            ):
+                return UserFunctionCall(
+                    step_input.user_input_socket_id,
+                    self.function_identifier,
+                    len(self.arg_sockets),
+                    tuple(socket.label.split(".", 1)[1] for socket in self.kwarg_sockets),
+                )
+        return None
+
+    def get_imports(
+        self, file_inputs: dict[SocketId, File], graph: "ComputeGraph"
+    ) -> Sequence[ProgramImport]:
+        # NOTE: User-provided files are imported in the sandboxed worker by `call_function_safe`
+        if self.is_user_provided_file(graph):
+            return []
+        return [ProgramImport(self.get_module_name(file_inputs), self.function_identifier)]
+
+    def get_output_targets(self, backend: CodegenBackend) -> list[ProgramVariable]:
+        """Return the targets that the result (and error) of a call to a user function are assigned to"""
         non_error_sockets = [
             socket for socket in self.data_out if socket.id != self._data_in_file_id
         ]
-        output_var_name = self.get_output_variable(non_error_sockets[0].id)
-        error_var_name = (
-            self.get_output_variable(self._data_out_error_id) if self.allow_error else cst.Name("_")
+        output_var = backend.identifier(self.get_output_variable(non_error_sockets[0].id))
+        error_var = backend.identifier(
+            self.get_output_variable(self._data_out_error_id) if self.allow_error else "_"
         )
+        return [output_var, error_var]
 
-        return (
-            [
-                cst.Assign(
+    def get_arguments(
+        self, var_inputs: dict[SocketId, ProgramVariable]
+    ) -> tuple[list[ProgramVariable], list[tuple[str, ProgramVariable]]]:
+        """Return the positional and keyword arguments of the function"""
+        args = [var_inputs[socket.id] for socket in self.arg_sockets]
+        kwargs = [
+            (socket.label.split(".", 1)[1], var_inputs[socket.id]) for socket in self.kwarg_sockets
+        ]
+        return args, kwargs
+
+    def get_call_arguments(
+        self,
+        var_inputs: dict[SocketId, ProgramVariable],
+        file_inputs: dict[SocketId, File],
+        backend: CodegenBackend,
+    ) -> tuple[list[ProgramExpression], list[tuple[str, ProgramExpression]]]:
+        """Return the arguments of `call_function_safe` for a call to a user function"""
+        args, kwargs = self.get_arguments(var_inputs)
+        return [
+            backend.string(self.get_module_name(file_inputs)),
+            backend.string(self.function_identifier),
+            backend.literal(self.allow_error),
+            *args,
+        ], kwargs
+
+    @classmethod
+    def run_batch(
+        cls,
+        calls: Sequence[
+            tuple["PyRunFunctionStep", dict[SocketId, ProgramVariable], dict[SocketId, File]]
+        ],
+        backend: CodegenBackend,
+    ) -> ProgramFragment:
+        """Run calls to user functions that do not depend on each other in one round trip to the sandbox"""
+        return [
+            backend.assign(
+                [target for step, _, _ in calls for target in step.get_output_targets(backend)],
+                backend.call(
+                    backend.identifier("call_functions_safe"),
                     [
-                        cst.AssignTarget(
-                            cst.Tuple([cst.Element(output_var_name), cst.Element(error_var_name)])
+                        backend.call(
+                            backend.identifier("function_call"),
+                            *step.get_call_arguments(var_inputs, file_inputs, backend),
                         )
+                        for step, var_inputs, file_inputs in calls
                     ],
-                    cst.Call(
-                        cst.Name("call_function_safe"),
-                        [
-                            cst.Arg(cst.SimpleString(repr(module_name_str))),
-                            cst.Arg(cst.SimpleString(repr(self.function_identifier))),
-                            cst.Arg(cst.Name(repr(self.allow_error))),
-                            *args,
-                            *kwargs,
-                        ],
+                ),
+            )
+        ]
+
+    def run(
+        self,
+        var_inputs: dict[SocketId, ProgramVariable],
+        file_inputs: dict[SocketId, File],
+        graph: "ComputeGraph",
+        backend: CodegenBackend,
+    ) -> ProgramFragment:
+        if self.is_user_provided_file(graph):
+            return [
+                backend.assign(
+                    self.get_output_targets(backend),
+                    backend.call(
+                        backend.identifier("call_function_safe"),
+                        *self.get_call_arguments(var_inputs, file_inputs, backend),
                     ),
                 )
             ]
-            if is_user_provided_file
-            else [
-                cst.ImportFrom(cst.Name(module_name_str), [cst.ImportAlias(func_name)]),
-                cst.Assign([cst.AssignTarget(output_var_name)], cst.Call(func_name, args + kwargs)),
-            ]
-        )
+
+        args, kwargs = self.get_arguments(var_inputs)
+        output_var = self.get_output_targets(backend)[0]
+        return [
+            backend.assign(
+                [output_var],
+                backend.call(backend.identifier(self.function_identifier), args, kwargs),
+            )
+        ]
 
 
 class LoopStep(Step[StepSocket]):
@@ -519,21 +712,20 @@ class LoopStep(Step[StepSocket]):
     required_data_io: ClassVar[tuple[Range, Range]] = ((0, 0), (0, 0))
 
     def run(
-        self, var_inputs: dict[SocketId, ProgramVariable], _, graph: "ComputeGraph"
+        self,
+        var_inputs: dict[SocketId, ProgramVariable],
+        _file_inputs,
+        graph: "ComputeGraph",
+        backend: CodegenBackend,
     ) -> ProgramFragment:
         return [
-            cst.While(
-                test=cst.Name("True"),
-                body=cst.IndentedBlock(
-                    [
-                        *self.run_subgraph(self._pred_socket_id, graph).body,
-                        cst.If(
-                            test=var_inputs[self._pred_socket_id],
-                            body=cst.SimpleStatementSuite([cst.Break()]),
-                        ),
-                        *self.run_subgraph(self._body_socket_id, graph).body,
-                    ]
-                ),
+            backend.while_loop(
+                backend.literal(True),
+                [
+                    *self.run_subgraph(self._pred_socket_id, graph, backend),
+                    backend.break_loop(var_inputs[self._pred_socket_id]),
+                    *self.run_subgraph(self._body_socket_id, graph, backend),
+                ],
             )
         ]
 
@@ -548,16 +740,18 @@ class IfElseStep(Step[StepSocket]):
     required_data_io: ClassVar[tuple[Range, Range]] = ((0, 0), (0, 0))
 
     def run(
-        self, var_inputs: dict[SocketId, ProgramVariable], _, graph: "ComputeGraph"
+        self,
+        var_inputs: dict[SocketId, ProgramVariable],
+        _file_inputs,
+        graph: "ComputeGraph",
+        backend: CodegenBackend,
     ) -> ProgramFragment:
         return [
-            *self.run_subgraph(self._pred_socket_id, graph).body,
-            cst.If(
-                test=var_inputs[self._pred_socket_id],
-                body=cst.IndentedBlock([*self.run_subgraph(self._if_socket_id, graph).body]),
-                orelse=cst.Else(
-                    cst.IndentedBlock([*self.run_subgraph(self._else_socket_id, graph).body])
-                ),
+            *self.run_subgraph(self._pred_socket_id, graph, backend),
+            backend.if_else(
+                var_inputs[self._pred_socket_id],
+                self.run_subgraph(self._if_socket_id, graph, backend),
+                self.run_subgraph(self._else_socket_id, graph, backend),
             ),
         ]
 
@@ -573,90 +767,692 @@ StepClasses = (
 )
 
 
+class ControlFlowRegion(NamedTuple):
+    """
+    A region of a compute graph that is assembled into a single block of statements.
+
+    Regions form a tree: the main flow of the graph is the root, and the subgraph behind every subgraph socket of a
+    compound step (e.g. the body of a `LoopStep`) is a child of the region that contains the step.
+    """
+
+    # Nodes of the region in flow (topological) order, excluding the nodes of child regions
+    nodes: list[StepClasses]
+    # Child regions by compound step id and subgraph socket id
+    subregions: dict[int, dict[SocketId, "ControlFlowRegion"]]
+
+
+class StepInput:
+    """An input socket of a step, resolved to the output socket that it is linked to"""
+
+    __slots__ = ("socket_id", "variable", "file", "user_input_socket_id")
+
+    def __init__(
+        self,
+        socket_id: SocketId,
+        variable: str,
+        file: File | None,
+        user_input_socket_id: SocketId | None,
+    ):
+        self.socket_id = socket_id
+        # The program variable that the linked output is assigned to
+        self.variable = variable
+        # NOTE: File objects are passed directly to the next step and not serialized as a variable
+        self.file = file
+        # Inputs linked to the user input step are only resolved when the graph is run with a user input
+        self.user_input_socket_id = user_input_socket_id
+
+
+class ProgramOptimisations(NamedTuple):
+    """Rewrites that are applied to a compute graph when it is assembled (see `ComputeGraph.optimisations`)"""
+
+    # Steps that are not assembled, as none of their outputs are used
+    dead_step_ids: frozenset[int]
+    # Variables that are not assigned, as they are either unused or replaced at their uses
+    unused_variables: frozenset[str]
+    # Variables that are replaced by their constant value at their uses
+    constants: dict[str, PrimitiveData]
+    # Steps that are assembled as an expression at the use of their output, instead of being assigned to a variable
+    inlined_step_ids: frozenset[int]
+    # Reference steps that are assembled as assignments of their precomputed outputs, instead of being run
+    precomputed_step_ids: frozenset[int]
+    # Source of the precomputed value of every output of the precomputed steps, by output variable
+    reference_outputs: dict[str, str]
+
+
+def _is_constant(data: PrimitiveData | File | None) -> TypeGuard[PrimitiveData]:
+    # NOTE: Strings prefixed with `var_` are references to program variables, and non-finite floats are not
+    # assembled into valid literals (see `literal_source`)
+    if isinstance(data, str):
+        return not data.startswith("var_")
+    if isinstance(data, float):
+        return math.isfinite(data)
+    return isinstance(data, PrimitiveData)
+
+
+class ComputeGraphIR(GraphIR[StepClasses]):
+    """A `GraphIR` of a compute graph, where the inputs of every step are resolved ahead of assembling"""
+
+    __slots__ = ("step_inputs",)
+
+    # Inputs of every step, by node index
+    step_inputs: tuple[tuple[StepInput, ...], ...]
+
+    def __init__(self, nodes: Sequence[StepClasses], edges: Sequence[GraphEdge]):
+        super().__init__(nodes, edges)
+
+        output_sockets = [{socket.id: socket for socket in node.outputs} for node in self.nodes]
+        step_inputs: list[tuple[StepInput, ...]] = []
+        for node_index, node in enumerate(self.nodes):
+            input_socket_ids = {socket.id for socket in node.inputs}
+            inputs: list[StepInput] = []
+            for in_edge in self.in_edges_of(node_index):
+                in_node_index = self.edge_from[in_edge]
+                to_socket_id = self.socket_ids[self.edge_to_socket[in_edge]]
+                in_node_socket = output_sockets[in_node_index].get(
+                    self.socket_ids[self.edge_from_socket[in_edge]]
+                )
+
+                # If the link is not connected to sockets of both steps, skip.
+                if to_socket_id not in input_socket_ids or in_node_socket is None:
+                    continue
+
+                in_node = self.nodes[in_node_index]
+                inputs.append(
+                    StepInput(
+                        to_socket_id,
+                        in_node.get_output_variable(in_node_socket.id),
+                        in_node_socket.data if isinstance(in_node_socket.data, File) else None,
+                        in_node_socket.id if in_node.id == USER_INPUT_STEP_ID else None,
+                    )
+                )
+            step_inputs.append(tuple(inputs))
+
+        object.__setattr__(self, "step_inputs", tuple(step_inputs))
+
+
 class ComputeGraph(Graph[StepClasses]):
-    def _create_link_variable(self, from_node: Step, from_socket: str) -> ProgramVariable:
+    # Imports declared by the steps of the program that is being assembled, shared with nested subgraph runs
+    _imports: ProgramImports | None = PrivateAttr(default=None)
+    # Whether every step of the program that is being assembled declares its imports
+    _imports_declared: bool = PrivateAttr(default=True)
+    # The user input step of the program that is being assembled
+    _user_input_step: Optional["InputStep"] = PrivateAttr(default=None)
+    # The rewrites applied to the program that is being assembled, if it is optimised
+    _optimisations: ProgramOptimisations | None = PrivateAttr(default=None)
+    # Whether the debug statements of the program that is being assembled trace the peak memory of steps
+    _trace_memory: bool = PrivateAttr(default=False)
+    # The preview size of outputs, if the program that is being assembled compares its own outputs
+    _output_preview_size: int | None = PrivateAttr(default=None)
+    # Precomputed values of the outputs of reference steps, as Python literals by output variable
+    _reference_outputs: dict[str, str] = PrivateAttr(default_factory=dict)
+
+    @cached_property
+    def ir(self) -> ComputeGraphIR:
         """
-        Create a variable name for the output of a node. The variable name must be unique across all nodes and sockets.
+        Return the array-backed representation of the graph. It does not depend on the user input, so it is only
+        built once and reused for every run of the graph.
+        """
+        nodes: list[StepClasses] = list(self.nodes)
+        if not any(node.id == USER_INPUT_STEP_ID for node in self.nodes):
+            # NOTE: The user input step is substituted when the graph is run. Its placeholder only has the sockets
+            # that are linked to other steps, and no data, so it is constructed without validation.
+            nodes.append(
+                InputStep.model_construct(
+                    id=USER_INPUT_STEP_ID,
+                    type=StepType.INPUT,
+                    inputs=[],
+                    outputs=[
+                        StepSocket(id=socket_id)
+                        for socket_id in dict.fromkeys(
+                            edge.from_socket_id
+                            for edge in self.edges
+                            if edge.from_node_id == USER_INPUT_STEP_ID
+                        )
+                    ],
+                )
+            )
+        return ComputeGraphIR(nodes, self.edges)
 
-        Args:
-            from_node (Step): The node that is outputting the variable
-            from_socket (str): The socket that the variable is outputting from
+    @cached_property
+    def control_flow(self) -> ControlFlowRegion:
+        """
+        Return the region tree of the graph. The subgraphs of every compound step are discovered and sorted only once,
+        instead of at every level of nesting.
+        """
+        ir = self.ir
+        subgraph_nodes: list[dict[SocketId, set[int]]] = [
+            {
+                socket_id: {
+                    ir.node_indices[node_id]
+                    for node_id in node.get_subgraph_node_ids(socket_id, self)
+                }
+                for socket_id in node.subgraph_socket_ids
+            }
+            for node in ir.nodes
+        ]
+        all_nodes = set(range(len(ir.nodes)))
+
+        def create_region(region_nodes: set[int]) -> ControlFlowRegion:
+            nested_nodes: set[int] = set()
+            for node in region_nodes:
+                for nodes in subgraph_nodes[node].values():
+                    nested_nodes |= nodes
+
+            # We do not consider subgraph nodes when determining the flow order (topological order) of a region
+            # They are ordered within their own region instead
+            flow_order = ir.topological_sort((all_nodes - region_nodes) | nested_nodes)
+            return ControlFlowRegion(
+                [ir.nodes[node] for node in flow_order],
+                {
+                    ir.node_ids[node]: {
+                        socket_id: create_region(nodes)
+                        for socket_id, nodes in subgraph_nodes[node].items()
+                    }
+                    for node in flow_order
+                    if subgraph_nodes[node]
+                },
+            )
+
+        return create_region(all_nodes)
+
+    @cached_property
+    def subregions(self) -> dict[int, dict[SocketId, ControlFlowRegion]]:
+        """Return a dictionary of compound step id to the regions of its subgraphs, by subgraph socket id"""
+        subregions: dict[int, dict[SocketId, ControlFlowRegion]] = {}
+        regions: deque[ControlFlowRegion] = deque([self.control_flow])
+        while len(regions):
+            region = regions.popleft()
+            subregions |= region.subregions
+            for step_subregions in region.subregions.values():
+                regions.extend(step_subregions.values())
+        return subregions
+
+    @cached_property
+    def parameters(self) -> list[str]:
+        """
+        Return the output variables of input steps that are bound as parameters of the program instead of being
+        assigned their value, so that the program can be run with different inputs. There are none by default.
+        """
+        return []
+
+    @cached_property
+    def producers(self) -> dict[str, int]:
+        """Return a dictionary of program variable to the index (in `ir`) of the step that assigns it"""
+        # NOTE: Control inputs are also resolved to variables, but they are never assigned
+        return {
+            node.get_output_variable(socket.id): node_index
+            for node_index, node in enumerate(self.ir.nodes)
+            for socket in node.data_out
+        }
+
+    @cached_property
+    def reference_step_ids(self) -> frozenset[int]:
+        """
+        Return the steps whose outputs can be computed once ahead of time, as they do not depend on the user input.
+
+        These are calls to functions of files that are not user-provided in the main flow of the graph, where every
+        step that they depend on is either such a call or a pure step that does not depend on the user input. Only
+        the calls whose outputs are used by the rest of the graph are returned.
+        """
+        ir = self.ir
+        producers = self.producers
+        independent: set[int] = set()
+        for node in self.control_flow.nodes:
+            if node.id == USER_INPUT_STEP_ID or node.subgraph_socket_ids:
+                continue
+            if isinstance(node, PyRunFunctionStep):
+                # NOTE: The error output of functions that are not user-provided is never assigned
+                if node.allow_error or node.is_user_provided_file(self):
+                    continue
+            elif not node.is_pure:
+                continue
+            # NOTE: Strings prefixed with `var_` are references to program variables
+            if any(
+                (isinstance(socket.data, str) and socket.data.startswith("var_"))
+                or node.get_output_variable(socket.id) in self.parameters
+                for socket in node.data_out
+            ):
+                continue
+
+            node_index = ir.node_indices[node.id]
+            if all(
+                producers.get(step_input.variable) in independent
+                for step_input in ir.step_inputs[node_index]
+            ):
+                independent.add(node_index)
+
+        reference_calls = {
+            node_index
+            for node_index in independent
+            if isinstance(ir.nodes[node_index], PyRunFunctionStep)
+        }
+        return frozenset(
+            ir.node_ids[producer]
+            for node_index in range(len(ir.nodes))
+            if node_index not in reference_calls
+            for step_input in ir.step_inputs[node_index]
+            if (producer := producers.get(step_input.variable, -1)) in reference_calls
+        )
+
+    def assemble_reference_program(self, backend: CodegenBackend) -> Program | None:
+        """
+        Assemble a program that runs the reference steps (and the steps that they depend on), and passes the values
+        of their outputs by output variable to `write_reference_outputs`. Returns `None` if there are no reference steps.
+        """
+        reference_step_ids = self.reference_step_ids
+        if not reference_step_ids:
+            return None
+
+        ir = self.ir
+        required: set[int] = {ir.node_indices[node_id] for node_id in reference_step_ids}
+        frontier: list[int] = list(required)
+        while len(frontier):
+            for step_input in ir.step_inputs[frontier.pop()]:
+                producer = self.producers[step_input.variable]
+                if producer not in required:
+                    required.add(producer)
+                    frontier.append(producer)
+
+        nodes = [node for node in self.control_flow.nodes if ir.node_indices[node.id] in required]
+        program = self.run(region=ControlFlowRegion(nodes, {}), backend=backend, optimise=False)
+        outputs = backend.dict(
+            [
+                (backend.string(variable), backend.identifier(variable))
+                for node in nodes
+                if node.id in reference_step_ids
+                for variable in (node.get_output_variable(socket.id) for socket in node.data_out)
+            ]
+        )
+        return backend.module(
+            [
+                *backend.body(program),
+                backend.expression_statement(
+                    backend.call(backend.identifier("write_reference_outputs"), [outputs])
+                ),
+            ]
+        )
+
+    def load_reference_outputs(self, reference_outputs: dict[str, str]) -> None:
+        """
+        Assemble the reference steps as assignments of the precomputed values of their outputs, given as Python
+        literals by output variable. Reference steps with outputs that are not given are still run.
+        """
+        self._reference_outputs = reference_outputs
+        # NOTE: The optimisations depend on which steps are precomputed, so they are found again
+        self.__dict__.pop("optimisations", None)
+
+    @cached_property
+    def optimisations(self) -> ProgramOptimisations:
         """
-        return from_node.get_output_variable(from_socket)
+        Return the rewrites that are applied when the graph is assembled. They do not depend on the user input, so
+        they are only found once and reused for every run of the graph.
+
+        1. Constant folding: primitive values of input steps are constants, and so are string matches of constants
+        2. Dead step elimination: steps without side effects are removed if none of their outputs are used
+        3. Inlining: constants that are used once (or are not strings), and steps whose output is only used by the
+           step that directly follows them in the same region, are assembled at their use instead of a variable
+        4. Precomputation: reference steps with precomputed outputs (see `load_reference_outputs`) are assembled as
+           assignments of their values, and the steps that they depend on are removed
+
+        The user input step is never rewritten, so that testcase templates keep their holes.
+        """
+        ir = self.ir
+        producers = self.producers
+        # Variables that are referred to by name from the value of an input step are always assigned
+        referenced_variables = {
+            socket.data
+            for node in ir.nodes
+            if node.type == StepType.INPUT
+            for socket in node.data_out
+            if isinstance(socket.data, str) and socket.data.startswith("var_")
+        }
+
+        constants: dict[str, PrimitiveData] = {}
+        for node in ir.nodes:
+            if node.type != StepType.INPUT or node.id == USER_INPUT_STEP_ID:
+                continue
+            for socket in node.data_out:
+                variable = node.get_output_variable(socket.id)
+                if (
+                    _is_constant(socket.data)
+                    and variable not in referenced_variables
+                    and variable not in self.parameters
+                ):
+                    constants[variable] = socket.data
+
+        string_matches = [
+            (node_index, node)
+            for node_index, node in enumerate(ir.nodes)
+            if isinstance(node, StringMatchStep)
+        ]
+        folded = True
+        while folded:
+            folded = False
+            for node_index, string_match in string_matches:
+                variable = string_match.get_output_variable(string_match.expression_output.id)
+                if variable in constants or variable in referenced_variables:
+                    continue
+                operands = {
+                    step_input.socket_id: step_input.variable
+                    for step_input in ir.step_inputs[node_index]
+                }
+                a, b = (
+                    constants.get(operands.get(socket.id, "")) for socket in string_match.data_in
+                )
+                if a is not None and b is not None:
+                    constants[variable] = StringMatchStep.match(a, b)
+                    folded = True
+
+        # A step is live if it has side effects, or if its output is used by a live step other than as a constant
+        live: set[int] = {
+            node_index
+            for node_index, node in enumerate(ir.nodes)
+            if not node.is_pure or node.id == USER_INPUT_STEP_ID
+        }
+        live |= {producers[variable] for variable in referenced_variables if variable in producers}
+        precomputed_step_ids = frozenset(
+            node_id
+            for node_id in self.reference_step_ids
+            if all(
+                self.node_index[node_id].get_output_variable(socket.id) in self._reference_outputs
+                for socket in self.node_index[node_id].data_out
+            )
+        )
+        frontier: list[int] = list(live)
+        while len(frontier):
+            node_index = frontier.pop()
+            # NOTE: Precomputed steps do not need their inputs
+            if ir.node_ids[node_index] in precomputed_step_ids:
+                continue
+            for step_input in ir.step_inputs[node_index]:
+                producer = producers.get(step_input.variable)
+                if step_input.variable in constants or producer is None or producer in live:
+                    continue
+                live.add(producer)
+                frontier.append(producer)
+
+        uses: dict[str, list[int]] = {}
+        for node_index in live:
+            for step_input in ir.step_inputs[node_index]:
+                if step_input.file is None and step_input.variable in producers:
+                    uses.setdefault(step_input.variable, []).append(node_index)
+
+        inlined_constants = {
+            variable: value
+            for variable, value in constants.items()
+            if not isinstance(value, str) or len(uses.get(variable, [])) <= 1
+        }
+        # Constants that are not inlined are assigned by their input step as usual
+        live |= {
+            producers[variable]
+            for variable in constants.keys() - inlined_constants.keys()
+            if variable in uses
+        }
+
+        unused_variables = {
+            node.get_output_variable(socket.id)
+            for node in ir.nodes
+            if node.is_pure and node.id != USER_INPUT_STEP_ID
+            for socket in node.data_out
+        }
+        unused_variables -= uses.keys() - inlined_constants.keys()
+        unused_variables -= referenced_variables
+        dead_step_ids = frozenset(
+            ir.node_ids[node_index]
+            for node_index, node in enumerate(ir.nodes)
+            if node_index not in live
+        )
+
+        inlined_step_ids: set[int] = set()
+        regions: deque[ControlFlowRegion] = deque([self.control_flow])
+        while len(regions):
+            region = regions.popleft()
+            for step_subregions in region.subregions.values():
+                regions.extend(step_subregions.values())
+
+            nodes = [node for node in region.nodes if node.id not in dead_step_ids]
+            for node, next_node in zip(nodes, nodes[1:], strict=False):
+                output = node.expression_output
+                if output is None or next_node.subgraph_socket_ids:
+                    # NOTE: Compound steps use their inputs within their subgraphs, which may run many times
+                    continue
+                variable = node.get_output_variable(output.id)
+                if variable not in referenced_variables and uses.get(variable) == [
+                    ir.node_indices[next_node.id]
+                ]:
+                    inlined_step_ids.add(node.id)
+
+        return ProgramOptimisations(
+            dead_step_ids,
+            frozenset(unused_variables | inlined_constants.keys()),
+            inlined_constants,
+            frozenset(inlined_step_ids),
+            precomputed_step_ids,
+            {
+                variable: source
+                for variable, source in self._reference_outputs.items()
+                if variable in producers
+                and ir.node_ids[producers[variable]] in precomputed_step_ids
+            },
+        )
+
+    @property
+    def output_preview_size(self) -> int | None:
+        """
+        Return the number of characters of the JSON of an output that are reported if the program that is being
+        assembled compares its own outputs (see `comparison.judge_outputs`), or `None` if it reports their values
+        """
+        return self._output_preview_size
+
+    def is_variable_used(self, variable: str) -> bool:
+        """Return whether the variable has to be assigned in the program that is being assembled"""
+        return self._optimisations is None or variable not in self._optimisations.unused_variables
 
     def run(
         self,
         user_input_step: Optional["InputStep"] = None,
-        debug: bool = True,
-        node_ids: set[int] | None = None,
+        debug: bool = False,
+        region: ControlFlowRegion | None = None,
+        backend: CodegenBackend = DEFAULT_CODEGEN_BACKEND,
+        optimise: bool = True,
+        trace_memory: bool = False,
+        output_preview_size: int | None = None,
     ) -> Program:
         """
         Run the compute graph with the given user input.
 
         Args:
             user_input_step (InputStep, optional): The input step (id = 0) that contains the user input
-            debug (bool, optional): Whether to include debug statements in the program. Defaults to True.
-            node_ids (set[int], optional): The node ids to run. Defaults to None.
+            debug (bool, optional): Whether to time every step and report the timings in the output. Defaults to False.
+            region (ControlFlowRegion, optional): The region of the compute graph to run. Defaults to the whole graph.
+            backend (CodegenBackend, optional): The backend used to build the program. Defaults to `libcst`.
+            optimise (bool, optional): Whether to apply `optimisations` to the program. Defaults to True.
+            trace_memory (bool, optional): Whether debug statements also trace the peak memory of steps. Defaults to False.
+            output_preview_size (int, optional): If set, the program compares its outputs and only reports whether they
+                are correct, with previews of their values of this size. Defaults to None.
 
         Returns:
             Program: The program that is generated from the compute graph
         """
-        # Add user input step (node) to compute graph
-        if user_input_step is not None:
-            self.nodes.append(user_input_step)
+        # Subgraphs are assembled by nested runs, which add their imports to those of the outermost run
+        if self._imports is not None:
+            return backend.module(self._assemble(region or self.control_flow, debug, backend))
+
+        imports = self._imports = ProgramImports()
+        self._imports_declared = True
+        self._user_input_step = user_input_step
+        self._optimisations = self.optimisations if optimise else None
+        self._trace_memory = trace_memory
+        self._output_preview_size = output_preview_size
+        try:
+            program_body = self._assemble(region or self.control_flow, debug, backend)
+        finally:
+            self._imports, self._user_input_step, self._optimisations = None, None, None
+            self._trace_memory, self._output_preview_size = False, None
+
+        profiling_header = (
+            [
+                *backend.body(backend.parse_module(PROFILING_TEMPLATE)),
+                *(
+                    backend.body(backend.parse_module("tracemalloc.start()"))
+                    if trace_memory
+                    else []
+                ),
+            ]
+            if debug
+            else []
+        )
+        comparison_header = (
+            backend.body(backend.parse_module(_comparison_source()))
+            if output_preview_size is not None
+            else []
+        )
+        program = backend.module(
+            [*imports.header(backend), *profiling_header, *comparison_header, *program_body]
+        )
+        # NOTE: Fall back to visiting the program if any step emits imports that it did not declare
+        return program if self._imports_declared else backend.hoist_imports(program)
 
-        # If node_ids is provided, we exclude all other nodes
-        # This is useful when we want to run only a subset of the compute graph
-        node_ids_to_exclude: set[int] = set()
-        if node_ids is not None:
-            node_ids_to_exclude = set(self.node_index.keys()) - node_ids
+    def _profile_step(
+        self, node: Step, fragment: ProgramFragment, backend: CodegenBackend
+    ) -> ProgramFragment:
+        """Wrap the program fragment of a step with statements that time it"""
+        start_var = backend.identifier(f"step_start_{node.id}")
+        # NOTE: Steps with subgraphs are not traced, as their nested steps reset the peak memory
+        trace_memory = backend.literal(self._trace_memory and not node.subgraph_socket_ids)
+        return [
+            backend.assign(
+                [start_var], backend.call(backend.identifier("start_step"), [trace_memory])
+            ),
+            *fragment,
+            backend.expression_statement(
+                backend.call(
+                    backend.identifier("end_step"),
+                    [backend.literal(node.id), start_var, trace_memory],
+                )
+            ),
+        ]
 
-        subgraph_node_ids: set[int] = set()
-        for node in self.nodes:
-            if node.id not in node_ids_to_exclude:
-                subgraph_node_ids |= node.get_all_subgraph_node_ids(self)
-
-        # We do not consider subgraph nodes when determining the flow order (topological order) of the main compute graph
-        # The responsibility of determining the order of subgraph nodes is deferred to the step itself
-        topological_order: list[StepClasses] = self.topological_sort(
-            subgraph_node_ids | node_ids_to_exclude
+    def _assemble(
+        self, region: ControlFlowRegion, debug: bool, backend: CodegenBackend
+    ) -> ProgramBody:
+        ir = self.ir
+        user_input_outputs: dict[SocketId, StepSocket] = (
+            {socket.id: socket for socket in self._user_input_step.outputs}
+            if self._user_input_step is not None
+            else {}
         )
 
+        optimisations = self._optimisations
+        # Expressions of the inlined steps of the region, by output variable
+        inlined_expressions: dict[str, ProgramExpression] = {}
+        # Variables that the inlined expressions are computed from
+        inlined_sources: dict[str, set[str]] = {}
+
+        # Consecutive calls to user functions that do not depend on each other are sent to the sandbox together
+        batch: list[
+            tuple[PyRunFunctionStep, dict[SocketId, ProgramVariable], dict[SocketId, File]]
+        ] = []
+        batch_outputs: set[str] = set()
+
         program_body: ProgramBody = []
-        for node in topological_order:
+
+        def flush_batch() -> None:
+            if len(batch) == 1:
+                step, var_inputs, file_inputs = batch[0]
+                program_body.extend(step.run(var_inputs, file_inputs, self, backend))
+            elif batch:
+                program_body.extend(PyRunFunctionStep.run_batch(batch, backend))
+            batch.clear()
+            batch_outputs.clear()
+
+        for node in region.nodes:
+            if optimisations is not None and node.id in optimisations.dead_step_ids:
+                continue
+            if optimisations is not None and node.id in optimisations.precomputed_step_ids:
+                # NOTE: Precomputed steps do not depend on other steps, so they are not ordered with batched calls
+                program_body.extend(
+                    backend.assign(
+                        [backend.identifier(variable)],
+                        backend.parse_expression(optimisations.reference_outputs[variable]),
+                    )
+                    for variable in (
+                        node.get_output_variable(socket.id) for socket in node.data_out
+                    )
+                )
+                continue
+            if node.id == USER_INPUT_STEP_ID:
+                if self._user_input_step is None:
+                    continue
+                node = self._user_input_step
+
             # Output of a step will be stored in a variable in the format `var_{step_id}_{socket_id}`
             # It is assumed that every step will always output the same number of values as the number of output sockets
             # As such, all we need to do is to pass in the correct variables to the next step
 
             input_variables: dict[SocketId, ProgramVariable] = {}
             file_inputs: dict[SocketId, File] = {}
-
-            for in_edge in self.in_edges_index[node.id]:
-                in_node: Step = self.node_index[in_edge.from_node_id]
-
-                # Find the socket that the link is connected to
-                for socket in filter(lambda socket: socket.id == in_edge.to_socket_id, node.inputs):
-                    in_node_sockets = [
-                        socket for socket in in_node.outputs if socket.id == in_edge.from_socket_id
-                    ]
-                    assert len(in_node_sockets) <= 1
-
-                    # If no sockets are connected to this input socket, skip.
-                    if not in_node_sockets:
+            input_sources: set[str] = set()
+
+            for step_input in ir.step_inputs[ir.node_indices[node.id]]:
+                file = step_input.file
+                if step_input.user_input_socket_id is not None:
+                    # If the user input does not provide the socket, skip.
+                    user_input_socket = user_input_outputs.get(step_input.user_input_socket_id)
+                    if user_input_socket is None:
                         continue
+                    if isinstance(user_input_socket.data, File):
+                        file = user_input_socket.data
+
+                if file is not None:
+                    file_inputs[step_input.socket_id] = file
+                elif step_input.variable in inlined_expressions:
+                    input_variables[step_input.socket_id] = inlined_expressions.pop(
+                        step_input.variable
+                    )
+                    input_sources |= inlined_sources.pop(step_input.variable)
+                    continue
+                elif optimisations is not None and step_input.variable in optimisations.constants:
+                    input_variables[step_input.socket_id] = backend.literal(
+                        optimisations.constants[step_input.variable]
+                    )
+                else:
+                    input_variables[step_input.socket_id] = backend.identifier(step_input.variable)
+                input_sources.add(step_input.variable)
 
-                    # Get origining node socket from in_node
-                    in_node_socket: StepSocket = in_node_sockets[0]
+            node._debug = debug
+            assert self._imports is not None
+            self._imports.add(node.get_imports(file_inputs, self))
+            self._imports_declared &= node.declares_imports
+
+            if optimisations is not None and node.id in optimisations.inlined_step_ids:
+                output = node.expression_output
+                assert output is not None
+                output_variable = node.get_output_variable(output.id)
+                inlined_expressions[output_variable] = node.get_expression(input_variables, backend)
+                inlined_sources[output_variable] = input_sources
+                continue
 
-                    if in_node_socket.data is not None and isinstance(in_node_socket.data, File):
-                        # NOTE: File objects are passed directly to the next step and not serialized as a variable
-                        file_inputs[socket.id] = in_node_socket.data
-                    else:
-                        input_variables[socket.id] = self._create_link_variable(
-                            in_node, in_node_socket.id
-                        )
+            # NOTE: Calls are not batched when debugging, so that they are timed separately
+            if (
+                optimisations is not None
+                and not debug
+                and isinstance(node, PyRunFunctionStep)
+                and node.is_user_provided_file(self)
+            ):
+                if input_sources & batch_outputs:
+                    flush_batch()
+                batch.append((node, input_variables, file_inputs))
+                batch_outputs.update(
+                    node.get_output_variable(socket.id) for socket in node.data_out
+                )
+                continue
 
-            node._debug = debug
-            program_body.extend(assemble_fragment(node.run(input_variables, file_inputs, self)))
+            flush_batch()
+            fragment = node.run(input_variables, file_inputs, self, backend)
+            if debug and fragment and not isinstance(node, OutputStep):
+                fragment = self._profile_step(node, fragment, backend)
+            program_body.extend(fragment)
 
-        return hoist_imports(cst.Module(body=program_body))
+        flush_batch()
+        return program_body
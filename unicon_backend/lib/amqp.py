@@ -1,7 +1,12 @@
 import abc
+import asyncio
+import contextlib
+import threading
 from asyncio import AbstractEventLoop
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from logging import getLogger
-from typing import Literal
+from typing import NamedTuple
 
 import pika
 from pika.adapters.asyncio_connection import AsyncioConnection
@@ -10,9 +15,17 @@ from pika.exchange_type import ExchangeType
 from pika.frame import Method
 from pika.spec import Basic, BasicProperties
 
+from unicon_backend.lib.compression import decompress
+
 logger = getLogger(__name__)
 
 
+class Message(NamedTuple):
+    basic_deliver: Basic.Deliver
+    properties: BasicProperties
+    body: bytes
+
+
 # Reference: https://github.com/pika/pika/blob/main/examples/asynchronous_consumer_example.py
 class AsyncConsumer(abc.ABC):
     def __init__(
@@ -22,6 +35,10 @@ class AsyncConsumer(abc.ABC):
         exchange_type: ExchangeType,
         queue_name: str,
         routing_key: str | None = None,
+        prefetch_count: int = 1,
+        max_workers: int = 0,
+        batch_size: int = 1,
+        batch_timeout_ms: float = 0,
     ):
         self.exchange_name = exchange_name
         self.exchange_type = exchange_type
@@ -32,13 +49,32 @@ class AsyncConsumer(abc.ABC):
 
         self._url = amqp_url
 
+        # Number of messages that are delivered before they are acknowledged, i.e. processed at once
+        self.prefetch_count = prefetch_count
+        # NOTE: Messages are processed on the event loop if there are no workers
+        self._executor = (
+            ThreadPoolExecutor(max_workers, thread_name_prefix=queue_name) if max_workers else None
+        )
+        # Messages are processed in batches of up to `batch_size`, which wait for up to `batch_timeout_ms` to fill
+        self.batch_size = batch_size
+        self.batch_timeout_ms = batch_timeout_ms
+        self._batch: list[Message] = []
+        self._batch_timer: asyncio.TimerHandle | None = None
+        # Batches that are being processed, in order of delivery
+        self._processing: deque[tuple[Channel, list[Message], Future[list[Exception | None]]]] = (
+            deque()
+        )
+
         # NOTE: These will be set when the connection is established
+        self._event_loop: AbstractEventLoop | None = None
         self._connection: AsyncioConnection | None = None
         self._channel: Channel | None = None
         self._consumer_tag: str | None = None
 
         self._closing = False
         self._consuming = False
+        # NOTE: Set once the connection is closed (or failed to open), e.g. for a worker to exit
+        self.closed = asyncio.Event()
 
     def close_connection(self):
         self._consuming = False
@@ -50,12 +86,14 @@ class AsyncConsumer(abc.ABC):
 
     def on_connection_open_error(self, _connection: AsyncioConnection, error: BaseException):
         logger.error(f"Connection open error: {error}")
+        self.closed.set()
 
     def on_connection_closed(self, _connection: AsyncioConnection, reason: BaseException):
         self._channel = None
         if not self._closing:
             # If connection was closed unexpectedly
             logger.error(f"Connection closed unexpectedly: {reason}")
+        self.closed.set()
 
     def open_channel(self):
         assert self._connection is not None
@@ -97,7 +135,7 @@ class AsyncConsumer(abc.ABC):
 
     def set_qos(self):
         assert self._channel is not None
-        self._channel.basic_qos(prefetch_count=1, callback=self.on_basic_qos_ok)
+        self._channel.basic_qos(prefetch_count=self.prefetch_count, callback=self.on_basic_qos_ok)
 
     def on_basic_qos_ok(self, _frame: Method):
         self.start_consuming()
@@ -114,14 +152,99 @@ class AsyncConsumer(abc.ABC):
 
     def on_message(
         self,
-        _channel: Channel,
+        channel: Channel,
         basic_deliver: Basic.Deliver,
         properties: BasicProperties,
         body: bytes,
     ):
-        assert self._channel is not None
-        self.message_callback(basic_deliver, properties, body)
-        self._channel.basic_ack(basic_deliver.delivery_tag)
+        self._batch.append(Message(basic_deliver, properties, body))
+        if len(self._batch) >= self.batch_size:
+            self.flush_batch(channel)
+        elif self._batch_timer is None:
+            assert self._event_loop is not None
+            self._batch_timer = self._event_loop.call_later(
+                self.batch_timeout_ms / 1000, self.flush_batch, channel
+            )
+
+    def flush_batch(self, channel: Channel):
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        messages, self._batch = self._batch, []
+        # NOTE: The unacknowledged messages of a closed channel are redelivered by the broker
+        if not messages or not channel.is_open:
+            return
+
+        if self._executor is None:
+            future: Future[list[Exception | None]] = Future()
+            future.set_result(self.process_batch(messages))
+            self._processing.append((channel, messages, future))
+            self.settle_batches()
+            return
+
+        # NOTE: Processing blocks (e.g. on the database), so it is done off the event loop and the messages are
+        # only acknowledged on the event loop once they are processed
+        event_loop = self._event_loop
+        assert event_loop is not None
+
+        def _on_processed(_future: Future[list[Exception | None]]):
+            # NOTE: If the event loop is closed, the messages are redelivered once the consumer is running again
+            with contextlib.suppress(RuntimeError):
+                event_loop.call_soon_threadsafe(self.settle_batches)
+
+        future = self._executor.submit(self.process_batch, messages)
+        self._processing.append((channel, messages, future))
+        future.add_done_callback(_on_processed)
+
+    def process_batch(self, messages: list[Message]) -> list[Exception | None]:
+        """Process a batch of messages, and return the error of every message (None if it was processed)"""
+        if len(messages) > 1:
+            try:
+                self.batch_callback([self.decompress_message(message) for message in messages])
+                return [None] * len(messages)
+            except Exception as e:
+                # NOTE: The messages are processed one by one, so that a bad message does not fail the others
+                logger.warning(f"Failed to process a batch of {len(messages)} messages: {e!r}")
+
+        errors: list[Exception | None] = []
+        for message in messages:
+            try:
+                self.message_callback(*self.decompress_message(message))
+                errors.append(None)
+            except Exception as e:
+                errors.append(e)
+        return errors
+
+    @staticmethod
+    def decompress_message(message: Message) -> Message:
+        # NOTE: Compressed bodies are decompressed here so that consumers always receive the original body
+        return message._replace(body=decompress(message.body, message.properties.content_encoding))
+
+    def settle_batches(self):
+        """
+        Acknowledge the batches that are processed in order of delivery, so that every batch is acknowledged at
+        once, and reject the messages that failed.
+        """
+        while self._processing and self._processing[0][2].done():
+            channel, messages, future = self._processing.popleft()
+            if not channel.is_open:
+                continue
+
+            last_processed: Basic.Deliver | None = None
+            for message, error in zip(messages, future.result(), strict=True):
+                basic_deliver = message.basic_deliver
+                if error is None:
+                    last_processed = basic_deliver
+                    continue
+                logger.error(f"Failed to process message: {error!r}", exc_info=error)
+                # NOTE: A message is requeued once, so that a message that always fails is not redelivered forever
+                channel.basic_nack(
+                    basic_deliver.delivery_tag, requeue=not basic_deliver.redelivered
+                )
+
+            # NOTE: The messages delivered before are settled, as batches are settled in order
+            if last_processed is not None:
+                channel.basic_ack(last_processed.delivery_tag, multiple=True)
 
     def stop_consuming(self):
         if self._channel:
@@ -137,7 +260,13 @@ class AsyncConsumer(abc.ABC):
         self, basic_deliver: Basic.Deliver, properties: BasicProperties, body: bytes
     ): ...
 
+    def batch_callback(self, messages: list[Message]):
+        """Process a batch of messages at once. By default, every message is processed on its own."""
+        for message in messages:
+            self.message_callback(*message)
+
     def run(self, event_loop: AbstractEventLoop | None = None):
+        self._event_loop = event_loop or asyncio.get_event_loop()
         self._connection = AsyncioConnection(
             parameters=pika.URLParameters(self._url),
             on_open_callback=self.on_connection_open,
@@ -149,7 +278,20 @@ class AsyncConsumer(abc.ABC):
     def stop(self):
         if not self._closing:
             self._closing = True
-            self._consuming and self.stop_consuming()
+            if self._consuming:
+                self.stop_consuming()
+            elif self._connection is not None:
+                # NOTE: The connection is still being set up
+                self.close_connection()
+
+    @property
+    def closing(self) -> bool:
+        """Whether the consumer was stopped, i.e. its connection is closed on purpose (see `stop`)"""
+        return self._closing
+
+
+class PublishError(Exception):
+    """A message was not confirmed by the broker"""
 
 
 class AsyncPublisher(abc.ABC):
@@ -160,6 +302,8 @@ class AsyncPublisher(abc.ABC):
         exchange_type: ExchangeType,
         queue_name: str,
         routing_key: str | None = None,
+        max_in_flight: int = 256,
+        timeout_secs: float = 10,
     ):
         self.exchange_name = exchange_name
         self.exchange_type = exchange_type
@@ -172,12 +316,22 @@ class AsyncPublisher(abc.ABC):
 
         self._connection: AsyncioConnection | None = None
         self._channel: Channel | None = None
-
-        self._deliveries: dict[int, Literal[True]] = {}
+        self._event_loop: AbstractEventLoop | None = None
+
+        # NOTE: Everything below is only accessed from the event loop, except for `_in_flight`
+        # Futures of the published messages that are not confirmed yet, by delivery tag
+        self._deliveries: dict[int, Future[None]] = {}
+        # Messages that are waiting for the channel to be ready for publishing
+        self._waiting: deque[tuple[bytes, BasicProperties, Future[None]]] = deque()
+        self._confirming = False
         self._acked: int = 0  # Number of messages acknowledged
         self._nacked: int = 0  # Number of messages rejected
         self._message_number: int = 0  # Number of messages published
 
+        # Bounds the number of messages that are not confirmed yet, so that publishers wait for a slow broker
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.timeout_secs = timeout_secs
+
         self._closing = False
 
     def on_connection_open(self, _connection: AsyncioConnection):
@@ -185,10 +339,12 @@ class AsyncPublisher(abc.ABC):
         self._connection.channel(on_open_callback=self.on_channel_open)
 
     def on_connection_open_error(self, _connection: AsyncioConnection, err: BaseException) -> None:
+        self._fail_deliveries(f"Connection open error: {err}")
         logger.error(f"Connection open error: {err}")
 
     def on_connection_closed(self, _unused_connection, reason):
         self._channel = None
+        self._fail_deliveries(f"Connection closed: {reason}")
         if not self._closing:
             logger.warning(f"Connection closed unexpectedly: {reason}")
 
@@ -199,6 +355,7 @@ class AsyncPublisher(abc.ABC):
 
     def on_channel_closed(self, channel: Channel, reason):
         self._channel = None
+        self._fail_deliveries(f"Channel closed: {reason}")
         if not self._closing:
             assert self._connection is not None
             self._connection.close()
@@ -228,30 +385,102 @@ class AsyncPublisher(abc.ABC):
 
     def start_publishing(self, _frame: Method):
         assert self._channel is not None
-        self._channel.confirm_delivery(self.on_delivery_confirmation)
+        self._channel.confirm_delivery(
+            self.on_delivery_confirmation, callback=self.on_confirm_delivery_ok
+        )
+
+    def on_confirm_delivery_ok(self, _frame: Method):
+        self._confirming = True
+        while self._waiting:
+            self._basic_publish(*self._waiting.popleft())
 
     def on_delivery_confirmation(self, frame: Method):
         confirmation_type = frame.method.NAME.split(".")[1].lower()
-        ack_multiple = frame.method.multiple
         delivery_tag = frame.method.delivery_tag
 
-        self._acked += confirmation_type == "ack"
-        self._nacked += confirmation_type == "nack"
-
-        del self._deliveries[delivery_tag]
-
-        if ack_multiple:
-            for tmp_tag in filter(lambda tmp_tag: tmp_tag <= delivery_tag, self._deliveries):
+        # NOTE: With `multiple`, every message up to the delivery tag is confirmed
+        delivery_tags = (
+            [tag for tag in self._deliveries if tag <= delivery_tag]
+            if frame.method.multiple
+            else [delivery_tag]
+        )
+        for tag in delivery_tags:
+            if (future := self._deliveries.pop(tag, None)) is None:
+                continue
+            if confirmation_type == "ack":
                 self._acked += 1
-                del self._deliveries[tmp_tag]
+                future.set_result(None)
+            else:
+                self._nacked += 1
+                future.set_exception(PublishError(f"Message {tag} was rejected by the broker"))
+
+    def _fail_deliveries(self, reason: str):
+        """Fail the messages that were not confirmed, as they will never be"""
+        futures = [*self._deliveries.values(), *(future for *_, future in self._waiting)]
+        self._deliveries.clear()
+        self._waiting.clear()
+        self._confirming = False
+        for future in futures:
+            if not future.done():
+                future.set_exception(PublishError(reason))
+
+    def _enqueue_message(self, body: bytes, properties: BasicProperties, future: Future[None]):
+        # NOTE: Messages that were cancelled before they were published are dropped
+        if not future.set_running_or_notify_cancel():
+            return
+        if self._closing:
+            future.set_exception(PublishError("The publisher is stopped"))
+        elif self._connection is None or self._connection.is_closing or self._connection.is_closed:
+            future.set_exception(PublishError("The connection is closed"))
+        elif not self._confirming:
+            self._waiting.append((body, properties, future))
+        else:
+            self._basic_publish(body, properties, future)
+
+    def _basic_publish(self, body: bytes, properties: BasicProperties, future: Future[None]):
+        assert self._channel is not None
+        try:
+            self._channel.basic_publish(
+                self.exchange_name, self.routing_key, body, properties=properties
+            )
+        except Exception as e:
+            future.set_exception(PublishError(f"Failed to publish message: {e}"))
+            return
+
+        # Mark that the message was published for delivery confirmation
+        self._message_number += 1
+        self._deliveries[self._message_number] = future
+
+    def publish_message(self, body: bytes, properties: BasicProperties) -> Future[None]:
+        """
+        Publish a message from any thread. Returns a future that is resolved once the broker confirms the message,
+        and fails with `PublishError` if it is rejected or the connection is lost (await it with `asyncio.wrap_future`).
+
+        NOTE: Blocks while too many messages are not confirmed yet, so it must not be called from the event loop
+        """
+        if self._event_loop is None:
+            raise PublishError("The publisher is not running")
+        if not self._in_flight.acquire(timeout=self.timeout_secs):
+            raise PublishError("Timed out waiting for published messages to be confirmed")
+
+        future: Future[None] = Future()
+        future.add_done_callback(lambda _: self._in_flight.release())
+        try:
+            # NOTE: The channel is not thread-safe, so messages are published from the event loop
+            self._event_loop.call_soon_threadsafe(self._enqueue_message, body, properties, future)
+        except RuntimeError as e:
+            # e.g. the event loop is closed
+            future.set_exception(PublishError(str(e)))
+        return future
 
     @abc.abstractmethod
-    def publish(self, payload: str, content_type: str): ...
+    def publish(self, payload: str, content_type: str) -> Future[None]: ...
 
     def run(self, event_loop: AbstractEventLoop | None = None):
         self._connection = None
+        self._event_loop = event_loop or asyncio.get_event_loop()
 
-        self._deliveries.clear()
+        self._fail_deliveries("The publisher was restarted")
         self._acked = 0
         self._nacked = 0
         self._message_number = 0
@@ -266,6 +495,7 @@ class AsyncPublisher(abc.ABC):
 
     def stop(self):
         self._closing = True
+        self._fail_deliveries("The publisher is stopped")
 
         if self._channel is not None:
             self._channel.close()
@@ -0,0 +1,50 @@
+import gzip
+from types import ModuleType
+
+zstandard: ModuleType | None
+try:
+    import zstandard
+except ImportError:
+    # NOTE: `zstd` is optional, `gzip` is always available
+    zstandard = None
+
+GZIP = "gzip"
+ZSTD = "zstd"
+ENCODINGS = (GZIP, ZSTD)
+
+
+def check_encoding(encoding: str | None) -> None:
+    if encoding is not None and encoding not in ENCODINGS:
+        raise ValueError(f"Unknown content encoding {encoding}, expected one of {ENCODINGS}")
+    if encoding == ZSTD and zstandard is None:
+        raise ValueError("The `zstandard` package is required for zstd content encoding")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    check_encoding(encoding)
+    if encoding == ZSTD:
+        assert zstandard is not None
+        return zstandard.ZstdCompressor().compress(body)
+    return gzip.compress(body)
+
+
+def decompress(body: bytes, encoding: str | None) -> bytes:
+    """Decompress a message body according to its `content_encoding`"""
+    if encoding is None or encoding == "identity":
+        return body
+    check_encoding(encoding)
+    if encoding == ZSTD:
+        assert zstandard is not None
+        # NOTE: The content size is not known if the body was compressed in streaming mode
+        return zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    return gzip.decompress(body)
+
+
+def encode_body(body: bytes, encoding: str | None, threshold: int) -> tuple[bytes, str | None]:
+    """
+    Compress a message body if it is at least `threshold` bytes long.
+    Returns the body and the `content_encoding` of the body (`None` if it is not compressed).
+    """
+    if encoding is None or len(body) < threshold:
+        return body, None
+    return compress(body, encoding), encoding
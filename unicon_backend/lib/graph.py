@@ -1,7 +1,10 @@
+from array import array
 from collections import Counter, defaultdict, deque
+from collections.abc import Iterable, Sequence
+from collections.abc import Set as AbstractSet
 from functools import cached_property
 from itertools import chain
-from typing import Generic, Self, TypeVar
+from typing import Any, Generic, Self, TypeVar
 
 from pydantic import BaseModel, model_validator
 
@@ -93,6 +96,11 @@ class Graph(BaseModel, Generic[GraphNodeType]):
             in_edges_index[edge.to_node_id].append(edge)
         return in_edges_index
 
+    @cached_property
+    def ir(self) -> "GraphIR[GraphNodeType]":
+        """Return the array-backed representation of the graph that is used for traversals"""
+        return GraphIR(self.nodes, self.edges)
+
     def topological_sort(self, ignored_node_ids: set[int] | None = None) -> list[GraphNodeType]:
         """
         Perform topological sort on the graph
@@ -106,32 +114,184 @@ class Graph(BaseModel, Generic[GraphNodeType]):
         Raises:
             ValueError: If the graph has a cycle
         """
+        ir = self.ir
         # NOTE: These nodes will be ignored during topological sort
-        ignored_node_ids = ignored_node_ids or set()
-        working_node_ids = set(self.node_index.keys()) - ignored_node_ids
-
-        in_degrees: dict[int, int] = defaultdict(int)
-        node_id_queue: deque[int] = deque(maxlen=len(working_node_ids))
-
-        for node_id in working_node_ids:
-            in_degrees[node_id] = len(set(self.in_nodes_index.get(node_id, [])) - ignored_node_ids)
-            if in_degrees[node_id] == 0:
-                node_id_queue.append(node_id)
-
-        topo_order_node_ids: list[int] = []
-        while len(node_id_queue):
-            curr_node_id: int = node_id_queue.popleft()
-            topo_order_node_ids.append(curr_node_id)
+        ignored = {ir.node_indices[node_id] for node_id in ignored_node_ids or ()}
+        return [ir.nodes[node] for node in ir.topological_sort(ignored)]
+
+
+def _csr(num_rows: int, rows: Sequence[int], values: Iterable[int]) -> tuple[array, array]:
+    """
+    Return the offsets and values of a CSR (compressed sparse row) adjacency, where the values of row `i` are
+    `values[offsets[i]:offsets[i + 1]]`. Values keep their relative order within a row.
+    """
+    offsets = array("i", [0] * (num_rows + 1))
+    for row in rows:
+        offsets[row + 1] += 1
+    for row in range(num_rows):
+        offsets[row + 1] += offsets[row]
+
+    positions = array("i", offsets[:-1])
+    row_values = array("i", [0] * len(rows))
+    for row, value in zip(rows, values, strict=True):
+        row_values[positions[row]] = value
+        positions[row] += 1
+    return offsets, row_values
+
+
+class GraphIR(Generic[GraphNodeType]):
+    """
+    A frozen, array-backed representation of a graph.
+
+    Nodes and socket ids are interned to integer indices (nodes are indexed in ascending order of their ids), and
+    adjacency is stored in CSR form so that traversals do not need to build or look up per-node lists and dicts.
+    """
+
+    __slots__ = (
+        "nodes",
+        "node_ids",
+        "node_indices",
+        "socket_ids",
+        "socket_indices",
+        "edge_from",
+        "edge_from_socket",
+        "edge_to",
+        "edge_to_socket",
+        "out_offsets",
+        "out_edges",
+        "in_offsets",
+        "in_edges",
+        "successor_offsets",
+        "successors",
+        "predecessor_offsets",
+        "predecessors",
+    )
+
+    nodes: tuple[GraphNodeType, ...]
+    node_ids: tuple[int, ...]
+    node_indices: dict[int, int]
+    socket_ids: tuple[str, ...]
+    socket_indices: dict[str, int]
+    # Edges are indexed in the order they are defined in the graph
+    edge_from: array
+    edge_from_socket: array
+    edge_to: array
+    edge_to_socket: array
+    # Edges going in and out of every node
+    out_offsets: array
+    out_edges: array
+    in_offsets: array
+    in_edges: array
+    # Distinct nodes going in and out of every node
+    successor_offsets: array
+    successors: array
+    predecessor_offsets: array
+    predecessors: array
+
+    def __init__(self, nodes: Sequence[GraphNodeType], edges: Sequence[GraphEdge]):
+        def init(name: str, value: Any):
+            object.__setattr__(self, name, value)
+
+        sorted_nodes = tuple(sorted(nodes, key=lambda node: node.id))
+        init("nodes", sorted_nodes)
+        init("node_ids", tuple(node.id for node in sorted_nodes))
+        init("node_indices", {node_id: index for index, node_id in enumerate(self.node_ids)})
+
+        socket_indices: dict[str, int] = {}
+        for node in sorted_nodes:
+            for socket in chain(node.inputs, node.outputs):
+                socket_indices.setdefault(socket.id, len(socket_indices))
+        for edge in edges:
+            socket_indices.setdefault(edge.from_socket_id, len(socket_indices))
+            socket_indices.setdefault(edge.to_socket_id, len(socket_indices))
+        init("socket_indices", socket_indices)
+        init("socket_ids", tuple(socket_indices))
+
+        try:
+            init("edge_from", array("i", (self.node_indices[edge.from_node_id] for edge in edges)))
+            init("edge_to", array("i", (self.node_indices[edge.to_node_id] for edge in edges)))
+        except KeyError as e:
+            raise ValueError(f"Edge references unknown node {e.args[0]}") from e
+        init(
+            "edge_from_socket", array("i", (socket_indices[edge.from_socket_id] for edge in edges))
+        )
+        init("edge_to_socket", array("i", (socket_indices[edge.to_socket_id] for edge in edges)))
+
+        num_nodes, edge_ids = len(sorted_nodes), range(len(edges))
+        out_offsets, out_edges = _csr(num_nodes, self.edge_from, edge_ids)
+        in_offsets, in_edges = _csr(num_nodes, self.edge_to, edge_ids)
+        init("out_offsets", out_offsets)
+        init("out_edges", out_edges)
+        init("in_offsets", in_offsets)
+        init("in_edges", in_edges)
+
+        # NOTE: Parallel edges (e.g. two arguments from the same step) only count once towards the in-degree of a node
+        node_edges = list(dict.fromkeys(zip(self.edge_from, self.edge_to, strict=True)))
+        successor_offsets, successors = _csr(
+            num_nodes, [a for a, _ in node_edges], (b for _, b in node_edges)
+        )
+        predecessor_offsets, predecessors = _csr(
+            num_nodes, [b for _, b in node_edges], (a for a, _ in node_edges)
+        )
+        init("successor_offsets", successor_offsets)
+        init("successors", successors)
+        init("predecessor_offsets", predecessor_offsets)
+        init("predecessors", predecessors)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __setstate__(self, state: tuple[None, dict[str, Any]]):
+        # NOTE: Objects with `__slots__` are pickled with their slots as the second item of the state
+        for name, value in state[1].items():
+            object.__setattr__(self, name, value)
+
+    def out_edges_of(self, node: int) -> array:
+        return self.out_edges[self.out_offsets[node] : self.out_offsets[node + 1]]
+
+    def in_edges_of(self, node: int) -> array:
+        return self.in_edges[self.in_offsets[node] : self.in_offsets[node + 1]]
+
+    def topological_sort(self, ignored: AbstractSet[int] = frozenset()) -> list[int]:
+        """
+        Perform topological sort on the node indices of the graph. Ties are broken by ascending node id.
 
-            for to_node_id in self.out_nodes_index.get(curr_node_id, []):
-                if to_node_id in ignored_node_ids:
+        Raises:
+            ValueError: If the graph has a cycle
+        """
+        successor_offsets, successors = self.successor_offsets, self.successors
+        predecessor_offsets, predecessors = self.predecessor_offsets, self.predecessors
+
+        in_degrees = array("i", [0] * len(self.nodes))
+        node_queue: deque[int] = deque()
+        num_working_nodes = 0
+        for node in range(len(self.nodes)):
+            if node in ignored:
+                continue
+            num_working_nodes += 1
+            in_degrees[node] = sum(
+                1
+                for index in range(predecessor_offsets[node], predecessor_offsets[node + 1])
+                if predecessors[index] not in ignored
+            )
+            if in_degrees[node] == 0:
+                node_queue.append(node)
+
+        topo_order: list[int] = []
+        while len(node_queue):
+            node = node_queue.popleft()
+            topo_order.append(node)
+
+            for index in range(successor_offsets[node], successor_offsets[node + 1]):
+                to_node = successors[index]
+                if to_node in ignored:
                     continue
 
-                in_degrees[to_node_id] -= 1
-                if in_degrees[to_node_id] == 0:
-                    node_id_queue.append(to_node_id)
+                in_degrees[to_node] -= 1
+                if in_degrees[to_node] == 0:
+                    node_queue.append(to_node)
 
-        if len(topo_order_node_ids) != len(working_node_ids):
+        if len(topo_order) != num_working_nodes:
             raise ValueError("Graph has a cycle")
 
-        return [self.node_index[node_id] for node_id in topo_order_node_ids]
+        return topo_order
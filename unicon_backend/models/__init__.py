@@ -5,6 +5,7 @@ from unicon_backend.models.organisation import (
     Project,
     Role,
 )
+from unicon_backend.models.outbox import OutboxMessageORM
 from unicon_backend.models.problem import ProblemORM, SubmissionORM, TaskORM, TaskResultORM
 from unicon_backend.models.user import UserORM
 
@@ -22,4 +23,6 @@ __all__ = [
     "Role",
     "InvitationKey",
     "UserRole",
+    # outbox
+    "OutboxMessageORM",
 ]
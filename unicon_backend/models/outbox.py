@@ -0,0 +1,25 @@
+from datetime import datetime
+
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql as pg
+from sqlmodel import Field
+
+from unicon_backend.lib.common import CustomSQLModel
+
+
+class OutboxMessageORM(CustomSQLModel, table=True):
+    """
+    A message that is waiting to be published (see `OutboxRelay`). Messages are written in the same transaction as
+    the rows that refer to them, so that they are only published once those rows exist.
+    """
+
+    __tablename__ = "outbox_message"
+
+    id: int | None = Field(default=None, primary_key=True)
+    payload: str = Field(sa_column=sa.Column(sa.Text, nullable=False))
+    created_at: datetime | None = Field(
+        default=None,
+        sa_column=sa.Column(
+            pg.TIMESTAMP(timezone=True), nullable=False, server_default=sa.func.now()
+        ),
+    )
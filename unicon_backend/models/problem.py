@@ -10,8 +10,9 @@ from sqlmodel import Field, Relationship
 from unicon_backend.evaluator.problem import Problem
 from unicon_backend.evaluator.tasks import task_classes
 from unicon_backend.evaluator.tasks.base import TaskEvalResult, TaskEvalStatus, TaskType
-from unicon_backend.evaluator.tasks.programming.base import TestcaseResult
+from unicon_backend.evaluator.tasks.programming.base import ProgrammingTask, TestcaseResult
 from unicon_backend.lib.common import CustomSQLModel
+from unicon_backend.runner import JobResult, RunnerJob
 
 if TYPE_CHECKING:
     from unicon_backend.evaluator.tasks.base import Task
@@ -55,13 +56,19 @@ class ProblemORM(CustomSQLModel, table=True):
         def _serialize_task(t: TaskORM):
             return {"id": t.id, "type": t.type, "autograde": t.autograde, **t.other_fields}
 
-        return Problem.model_validate(
+        problem = Problem.model_validate(
             {
                 "name": self.name,
                 "description": self.description,
                 "tasks": [_serialize_task(task_orm) for task_orm in self.tasks],
             }
         )
+        for task_orm in self.tasks:
+            if isinstance(task := problem.task_index[task_orm.id], ProgrammingTask):
+                task.load_reference_outputs(task_orm.reference_outputs)
+                task.load_templates(task_orm.testcase_templates)
+
+        return problem
 
 
 class TaskORM(CustomSQLModel, table=True):
@@ -72,6 +79,13 @@ class TaskORM(CustomSQLModel, table=True):
     type: TaskType = Field(sa_column=sa.Column(pg.ENUM(TaskType), nullable=False))
     autograde: bool
     other_fields: dict = Field(default_factory=dict, sa_column=sa.Column(pg.JSONB))
+    # NOTE: Precompiled testcase programs of a programming task (see `ProgrammingTask.compile_templates`)
+    testcase_templates: list | None = Field(default=None, sa_column=sa.Column(pg.JSONB))
+    # NOTE: Precomputed outputs of the reference steps of a programming task, by testcase id
+    # (see `ProgrammingTask.load_reference_results`)
+    reference_outputs: dict | None = Field(default=None, sa_column=sa.Column(pg.JSONB))
+    # The job that precomputes the reference outputs, while its result has not been ingested
+    reference_job_id: str | None = Field(default=None, nullable=True, unique=True)
 
     problem_id: int = Field(foreign_key="problem.id", primary_key=True)
 
@@ -83,10 +97,41 @@ class TaskORM(CustomSQLModel, table=True):
         def _convert_task_to_orm(id: int, type: TaskType, autograde: bool, **other_fields):
             return TaskORM(id=id, type=type, autograde=autograde, other_fields=other_fields)
 
-        return _convert_task_to_orm(**task.model_dump(serialize_as_any=True))
+        task_orm = _convert_task_to_orm(**task.model_dump(serialize_as_any=True))
+        if isinstance(task, ProgrammingTask):
+            # NOTE: The templates are compiled again once the reference outputs are precomputed by the runner
+            # (see `create_reference_job`)
+            task_orm.testcase_templates = [
+                template.model_dump() for template in task.compile_templates()
+            ]
+        return task_orm
+
+    def create_reference_job(self) -> RunnerJob | None:
+        """
+        Create the job that precomputes the reference outputs of a programming task, if it has any. The job must be
+        published once the task is committed, and its result is stored by `load_reference_results`.
+        """
+        task = self.to_task()
+        if not isinstance(task, ProgrammingTask):
+            return None
+        reference_job = task.create_reference_job()
+        if reference_job is not None:
+            self.reference_job_id = str(reference_job.id)
+        return reference_job
+
+    def load_reference_results(self, job_result: JobResult) -> None:
+        """Store the reference outputs precomputed by the reference job, and the templates that assemble them"""
+        task = self.to_task()
+        assert isinstance(task, ProgrammingTask)
+        self.reference_outputs = {
+            testcase_id: outputs.model_dump()
+            for testcase_id, outputs in task.load_reference_results(job_result).items()
+        }
+        self.testcase_templates = [template.model_dump() for template in task.compile_templates()]
+        self.reference_job_id = None
 
     def to_task(self) -> "Task":
-        return task_classes[self.type].model_validate(
+        task = task_classes[self.type].model_validate(
             {
                 "id": self.id,
                 "type": self.type,
@@ -94,6 +139,10 @@ class TaskORM(CustomSQLModel, table=True):
                 **self.other_fields,
             }
         )
+        if isinstance(task, ProgrammingTask):
+            task.load_reference_outputs(self.reference_outputs)
+            task.load_templates(self.testcase_templates)
+        return task
 
 
 class SubmissionAttemptLink(CustomSQLModel, table=True):
@@ -1,15 +1,22 @@
+import time
 from http import HTTPStatus
 from typing import TYPE_CHECKING, Annotated
 
+import sqlalchemy as sa
+import sqlalchemy.dialects.postgresql as pg
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import selectinload
-from sqlmodel import Session, col, select
+from sqlmodel import Session, col, func, select
 
+from unicon_backend.constants import TESTCASE_FAILURE_HISTORY, TESTCASE_FAILURE_RATES_TTL_SECS
 from unicon_backend.dependencies.auth import get_current_user
 from unicon_backend.dependencies.common import get_db_session
 from unicon_backend.dependencies.problem import get_problem_by_id
 from unicon_backend.evaluator.problem import Problem, Task, UserInput
+from unicon_backend.evaluator.tasks.base import TaskEvalStatus
+from unicon_backend.evaluator.tasks.programming.base import ProgrammingTask
 from unicon_backend.models import (
+    OutboxMessageORM,
     ProblemORM,
     SubmissionORM,
     TaskResultORM,
@@ -21,6 +28,8 @@ from unicon_backend.models.problem import (
     TaskORM,
 )
 from unicon_backend.models.user import UserORM
+from unicon_backend.runner import Status
+from unicon_backend.workers.outbox import outbox_relay
 
 if TYPE_CHECKING:
     from unicon_backend.evaluator.tasks.base import TaskEvalResult
@@ -46,7 +55,16 @@ def add_task_to_problem(
 
     problem_orm.tasks.append(taskOrm)
     db_session.add(problem_orm)
+    # NOTE: The reference outputs of the task are precomputed by the runner, and stored when the result arrives
+    reference_job = taskOrm.create_reference_job()
+    if reference_job is not None:
+        db_session.add(
+            OutboxMessageORM(payload=reference_job.model_dump_json(serialize_as_any=True))
+        )
     db_session.commit()
+
+    if reference_job is not None:
+        outbox_relay.notify()
     return
 
 
@@ -66,6 +84,75 @@ def update_problem(
     return existing_problem_orm.to_problem()
 
 
+def _get_testcase_failure_rates(
+    db_session: Session, problem_id: int, task_id: int, failure_statuses: set[Status]
+) -> dict[int, float]:
+    """
+    Return the failure rate of every testcase of a programming task over its most recent results, where a testcase
+    failed if it finished with one of `failure_statuses`
+    """
+    recent_results = (
+        select(TaskResultORM.result)
+        .join(TaskAttemptORM)
+        .where(
+            TaskAttemptORM.problem_id == problem_id,
+            TaskAttemptORM.task_id == task_id,
+            TaskResultORM.status == TaskEvalStatus.SUCCESS,
+            func.jsonb_typeof(TaskResultORM.result) == "array",
+        )
+        .order_by(col(TaskResultORM.id).desc())
+        .limit(TESTCASE_FAILURE_HISTORY)
+        .subquery()
+    )
+    testcase_result = (
+        func.jsonb_array_elements(recent_results.c.result)
+        .table_valued(sa.column("value", pg.JSONB))
+        .lateral()
+    )
+    testcase_id = testcase_result.c.value["id"].astext.cast(sa.Integer)
+    status = testcase_result.c.value["status"].astext
+
+    rows = db_session.exec(
+        select(
+            testcase_id,
+            func.count().filter(
+                status.in_([failure_status.value for failure_status in failure_statuses])
+            ),
+            func.count().filter(status != Status.SKIPPED.value),
+        )
+        .select_from(recent_results)
+        .join(testcase_result, sa.true())
+        .group_by(testcase_id)
+    ).all()
+    return {testcase_id: failed / ran for testcase_id, failed, ran in rows if ran}
+
+
+# Failure rates by problem id, task id and failure statuses, with the (monotonic) time that they were computed at
+_testcase_failure_rates_cache: dict[
+    tuple[int, int, frozenset[Status]], tuple[float, dict[int, float]]
+] = {}
+
+
+def _get_cached_testcase_failure_rates(
+    db_session: Session, problem_id: int, task_id: int, failure_statuses: set[Status]
+) -> dict[int, float]:
+    """
+    Return the failure rates of `_get_testcase_failure_rates`, which are recomputed at most once every
+    `TESTCASE_FAILURE_RATES_TTL_SECS` for every task instead of on every submission.
+
+    NOTE: The rates only decide the order that testcases are run in, so rates that are slightly stale are fine
+    """
+    key = (problem_id, task_id, frozenset(failure_statuses))
+    now = time.monotonic()
+    cached = _testcase_failure_rates_cache.get(key)
+    if cached is not None and now - cached[0] < TESTCASE_FAILURE_RATES_TTL_SECS:
+        return cached[1]
+
+    failure_rates = _get_testcase_failure_rates(db_session, problem_id, task_id, failure_statuses)
+    _testcase_failure_rates_cache[key] = (now, failure_rates)
+    return failure_rates
+
+
 @router.post(
     "/{id}/tasks/{task_id}", summary="Submit a task attempt", response_model=TaskAttemptPublic
 )
@@ -82,7 +169,14 @@ def submit_problem_task_attempt(
             status_code=HTTPStatus.NOT_FOUND, detail="Task not found in problem definition"
         )
 
-    task_type = problem.task_index[task_id].type
+    task = problem.task_index[task_id]
+    task_type = task.type
+    if isinstance(task, ProgrammingTask) and task.environment.stop_on_first_failure:
+        task.prioritise_testcases(
+            _get_cached_testcase_failure_rates(
+                db_session, problem_orm.id, task_id, task.stopping_statuses
+            )
+        )
     # TODO: Retrieve expected answers (https://github.com/uniconhq/unicon-backend/issues/12)
     task_attempt_orm: TaskAttemptORM = TaskAttemptORM(
         user_id=user.id,
@@ -99,9 +193,16 @@ def submit_problem_task_attempt(
     task_attempt_orm.task_results.append(task_result_orm)
 
     db_session.add_all([task_result_orm, task_attempt_orm])
+    # NOTE: The job is published through the outbox, so that the result of the job always finds its row and no job
+    # is published if the attempt is not stored
+    if task_result.job_message is not None:
+        db_session.add(OutboxMessageORM(payload=task_result.job_message))
     db_session.commit()
     db_session.refresh(task_attempt_orm)
 
+    if task_result.job_message is not None:
+        outbox_relay.notify()
+
     return task_attempt_orm
 
 
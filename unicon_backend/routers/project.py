@@ -10,6 +10,7 @@ from unicon_backend.dependencies.auth import get_current_user
 from unicon_backend.dependencies.common import get_db_session
 from unicon_backend.dependencies.project import get_project_by_id
 from unicon_backend.evaluator.problem import Problem
+from unicon_backend.models import OutboxMessageORM
 from unicon_backend.models.links import UserRole
 from unicon_backend.models.organisation import InvitationKey, Project, Role
 from unicon_backend.models.problem import (
@@ -28,6 +29,7 @@ from unicon_backend.schemas.organisation import (
     RolePublic,
     RolePublicWithInvitationKeys,
 )
+from unicon_backend.workers.outbox import outbox_relay
 
 router = APIRouter(prefix="/projects", tags=["projects"], dependencies=[Depends(get_current_user)])
 
@@ -207,7 +209,19 @@ def create_problem(
     project.problems.append(new_problem)
 
     db_session.add(project)
+    # NOTE: The reference outputs of the tasks are precomputed by the runner, and stored when the results arrive
+    reference_jobs = [
+        reference_job
+        for task_orm in new_problem.tasks
+        if (reference_job := task_orm.create_reference_job()) is not None
+    ]
+    db_session.add_all(
+        OutboxMessageORM(payload=reference_job.model_dump_json(serialize_as_any=True))
+        for reference_job in reference_jobs
+    )
     db_session.commit()
     db_session.refresh(new_problem)
 
+    if reference_jobs:
+        outbox_relay.notify()
     return new_problem
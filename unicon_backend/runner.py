@@ -1,5 +1,6 @@
+import hashlib
 from enum import Enum
-from typing import NewType, Self
+from typing import Final, NewType, Self
 from uuid import UUID, uuid4
 
 from pydantic import BaseModel, ConfigDict, model_validator
@@ -8,11 +9,35 @@ from unicon_backend.evaluator.tasks.programming.artifact import File
 
 JobId = NewType("JobId", UUID)
 
+# Version 2 moves the contents of program files into a job-level file table, see `RunnerJob.file_table`
+FILE_TABLE_PROTOCOL_VERSION: Final[int] = 2
+
 
 class Language(str, Enum):
     PYTHON = "PYTHON"
 
 
+class TestcaseIsolation(str, Enum):
+    """How testcases that are fused into a single program are isolated from each other"""
+
+    # Testcases share the sandbox worker and the modules it has imported
+    NONE = "NONE"
+    # Modules of the program files are imported afresh for every testcase
+    RELOAD = "RELOAD"
+    # Every testcase runs in a new sandbox worker process
+    PROCESS = "PROCESS"
+
+
+class StepProfiling(str, Enum):
+    """What is measured for every step of the programs of a task"""
+
+    NONE = "NONE"
+    # Wall time of every step
+    TIME = "TIME"
+    # Wall time and peak memory (traced with `tracemalloc`) of every step
+    MEMORY = "MEMORY"
+
+
 class ComputeContext(BaseModel):
     language: Language
     time_limit_secs: int
@@ -23,6 +48,31 @@ class ComputeContext(BaseModel):
 
     extra_options: dict[str, str] | None = None
 
+    # Whether all testcases are run by a single program, instead of one program per testcase
+    # NOTE: The time limit applies to every testcase, so the fused program is given the sum of their limits
+    fuse_testcases: bool = False
+    testcase_isolation: TestcaseIsolation = TestcaseIsolation.RELOAD
+
+    # Whether programs report a per-step breakdown of where their time is spent
+    step_profiling: StepProfiling = StepProfiling.NONE
+
+    # Whether the remaining programs of a job are skipped once a program does not finish with `OK`
+    # NOTE: Wrong answers are only known once the job is graded, so they do not stop the job. Fused testcases are the
+    # exception if they compare their own outputs (see `compare_outputs_in_program`)
+    # NOTE: Programs are ordered so that those that failed most often in earlier results run first
+    stop_on_first_failure: bool = False
+
+    # Whether the outputs of steps that do not depend on the user input are computed once by a job when the task is
+    # created, and assembled into the programs as constants once its result arrives
+    # (see `ComputeGraph.reference_step_ids`)
+    # NOTE: The functions of these steps must be deterministic, as every submission then sees the same values
+    precompute_reference_outputs: bool = False
+
+    # Whether the comparisons of outputs are evaluated by the programs, which then only report whether every output
+    # is correct, with its value if its JSON is at most `output_preview_size` characters and a preview otherwise
+    compare_outputs_in_program: bool = False
+    output_preview_size: int = 1024
+
 
 class Status(str, Enum):
     OK = "OK"
@@ -30,6 +80,8 @@ class Status(str, Enum):
     TLE = "TLE"
     RTE = "RTE"
     WA = "WA"
+    # The program was not run, as an earlier program of the job failed (see `stop_on_first_failure`)
+    SKIPPED = "SKIPPED"
 
 
 class ProgramResult(BaseModel):
@@ -51,9 +103,16 @@ class JobResult(BaseModel):
     id: JobId
 
 
+class FileRef(BaseModel):
+    """A file of a `RunnerProgram` whose content is stored in the file table of its `RunnerJob`"""
+
+    name: str
+    hash: str
+
+
 class RunnerProgram(BaseModel):
     entrypoint: str
-    files: list[File]
+    files: list[File | FileRef]
 
     # Tracking fields
     id: int  # Corresponds to the testcase id of the problem
@@ -69,9 +128,47 @@ class RunnerJob(BaseModel):
     programs: list[RunnerProgram]
     context: ComputeContext
 
+    # Version of the protocol between the backend and the runner
+    # Runners opt in to newer versions, so older versions are still produced if configured
+    version: int = 1
+    # Contents of the files of all programs, keyed by their content hash (from version 2)
+    file_table: dict[str, str] = {}
+
     # Tracking fields
     id: JobId
 
+    @model_validator(mode="after")
+    def check_file_refs_exist_in_file_table(self) -> Self:
+        for program in self.programs:
+            for file in program.files:
+                if isinstance(file, FileRef) and file.hash not in self.file_table:
+                    raise ValueError(f"File {file.name} of program {program.id} not in file table")
+        return self
+
     @classmethod
-    def create(cls, programs: list[RunnerProgram], environment: ComputeContext) -> "RunnerJob":
-        return RunnerJob(id=JobId(uuid4()), programs=programs, context=environment)
+    def create(
+        cls, programs: list[RunnerProgram], environment: ComputeContext, version: int = 1
+    ) -> "RunnerJob":
+        job = RunnerJob(id=JobId(uuid4()), programs=programs, context=environment, version=version)
+        if version >= FILE_TABLE_PROTOCOL_VERSION:
+            job.deduplicate_files()
+        return job
+
+    def deduplicate_files(self) -> None:
+        """
+        Move the contents of all program files into the file table, so that files shared by programs
+        (e.g. the user's submission) are only sent once per job.
+        """
+        # NOTE: Programs usually share the same contents, so hashes are cached by content. Strings cache their own
+        # hash, and the lookup of the same string object short-circuits on identity before comparing characters.
+        hashes: dict[str, str] = {}
+        for program in self.programs:
+            for index, file in enumerate(program.files):
+                if not isinstance(file, File):
+                    continue
+                content_hash = hashes.get(file.content)
+                if content_hash is None:
+                    content_hash = hashlib.sha256(file.content.encode()).hexdigest()
+                    hashes[file.content] = content_hash
+                self.file_table.setdefault(content_hash, file.content)
+                program.files[index] = FileRef(name=file.name, hash=content_hash)
@@ -1,14 +1,24 @@
 import json
 import logging
-from operator import attrgetter
+from operator import itemgetter
 from typing import TYPE_CHECKING, Any, cast
 
 import pika
 from pika.exchange_type import ExchangeType
 from pika.spec import Basic
-from sqlmodel import func, select
-
-from unicon_backend.constants import EXCHANGE_NAME, RABBITMQ_URL, RESULT_QUEUE_NAME
+from sqlalchemy import bindparam, update
+from sqlalchemy.orm import joinedload
+from sqlmodel import Session, col, func, select
+
+from unicon_backend.constants import (
+    EXCHANGE_NAME,
+    RABBITMQ_URL,
+    RESULT_BATCH_SIZE,
+    RESULT_BATCH_TIMEOUT_MS,
+    RESULT_PREFETCH_COUNT,
+    RESULT_QUEUE_NAME,
+    RESULT_WORKERS,
+)
 from unicon_backend.database import SessionLocal
 from unicon_backend.evaluator.tasks.programming.base import (
     ProgrammingTask,
@@ -16,8 +26,9 @@ from unicon_backend.evaluator.tasks.programming.base import (
     TaskEvalStatus,
     TestcaseResult,
 )
-from unicon_backend.lib.amqp import AsyncConsumer
-from unicon_backend.models.problem import TaskResultORM
+from unicon_backend.evaluator.tasks.programming.steps import STEP_TIMINGS_KEY
+from unicon_backend.lib.amqp import AsyncConsumer, Message
+from unicon_backend.models.problem import TaskAttemptORM, TaskORM, TaskResultORM
 from unicon_backend.runner import JobResult, ProgramResult, Status
 
 if TYPE_CHECKING:
@@ -29,59 +40,199 @@ logger = logging.getLogger(__name__)
 
 class TaskResultsConsumer(AsyncConsumer):
     def __init__(self):
-        super().__init__(RABBITMQ_URL, EXCHANGE_NAME, ExchangeType.topic, RESULT_QUEUE_NAME)
+        super().__init__(
+            RABBITMQ_URL,
+            EXCHANGE_NAME,
+            ExchangeType.topic,
+            RESULT_QUEUE_NAME,
+            prefetch_count=RESULT_PREFETCH_COUNT,
+            max_workers=RESULT_WORKERS,
+            batch_size=RESULT_BATCH_SIZE,
+            batch_timeout_ms=RESULT_BATCH_TIMEOUT_MS,
+        )
 
     def message_callback(
         self, _basic_deliver: Basic.Deliver, _properties: pika.BasicProperties, body: bytes
     ):
-        response: JobResult = JobResult.model_validate_json(body)
-        with SessionLocal() as db_session:
-            task_result_db = db_session.scalar(
-                select(TaskResultORM).where(TaskResultORM.job_id == str(response.id))
-            )
+        self.ingest_results([body])
 
-            if task_result_db is None:
-                # We have received a result a task that we are not aware of
-                # TODO: We should either logged this somewhere or sent to a dead-letter exchange
-                return
-
-            task = cast(ProgrammingTask, task_result_db.task_attempt.task.to_task())
-            testcases: list[Testcase] = sorted(task.testcases, key=attrgetter("id"))
-            eval_results: list[ProgramResult] = sorted(response.results, key=attrgetter("id"))
-
-            testcase_results: list[TestcaseResult] = []
-            for testcase, eval_result in zip(testcases, eval_results, strict=False):
-                output_step: OutputStep = testcase.output_step
-                eval_value: dict[str, Any] = json.loads(eval_result.stdout)
-
-                socket_results: list[SocketResult] = []
-                for socket in output_step.data_in:
-                    eval_socket_value = eval_value.get(socket.id, None)
-                    # If there is no comparison required, the value is always regarded as correct
-                    is_correct = (
-                        socket.comparison.compare(eval_socket_value) if socket.comparison else True
-                    )
-                    socket_results.append(
-                        SocketResult(id=socket.id, value=eval_socket_value, correct=is_correct)
+    def batch_callback(self, messages: list[Message]):
+        self.ingest_results([message.body for message in messages])
+
+    def ingest_results(self, bodies: list[bytes]):
+        """Grade the results of a batch of jobs, and save them with one update and commit"""
+        responses: dict[str, JobResult] = {
+            str(response.id): response for response in map(JobResult.model_validate_json, bodies)
+        }
+        with SessionLocal() as db_session:
+            # NOTE: The rows are locked (in order, so that concurrent batches do not deadlock), so that a result
+            # that is delivered again is not ingested concurrently
+            task_results_db = db_session.scalars(
+                select(TaskResultORM)
+                .where(col(TaskResultORM.job_id).in_(responses))
+                .options(
+                    joinedload(TaskResultORM.task_attempt, innerjoin=True).joinedload(
+                        TaskAttemptORM.task, innerjoin=True
                     )
+                )
+                .order_by(col(TaskResultORM.id))
+                .with_for_update(of=TaskResultORM)
+            ).all()
+
+            # NOTE: Jobs that are not of a task result precompute the reference outputs of a task
+            reference_job_ids = set(responses) - {
+                task_result_db.job_id for task_result_db in task_results_db
+            }
+            if reference_job_ids:
+                ingest_reference_results(db_session, reference_job_ids, responses)
+
+            # NOTE: We may have received results of tasks that we are not aware of
+            # TODO: We should either logged this somewhere or sent to a dead-letter exchange
+            tasks: dict[tuple[int, int], ProgrammingTask] = {}
+            updates: list[dict[str, Any]] = []
+            for task_result_db in task_results_db:
+                job_id = task_result_db.job_id
+                assert job_id is not None
+                if task_result_db.status != TaskEvalStatus.PENDING:
+                    # NOTE: Results are delivered at least once, so the result of a job may have been ingested
+                    # already
+                    logger.info(f"Skipping result of job {job_id}, which was already ingested")
+                    continue
+
+                # NOTE: Results that arrive at once are mostly of the same tasks, which are only parsed once
+                task_db = task_result_db.task_attempt.task
+                task_key = (task_db.id, task_db.problem_id)
+                if task_key not in tasks:
+                    tasks[task_key] = cast("ProgrammingTask", task_db.to_task())
+
+                testcase_results = grade_job_result(tasks[task_key], responses[job_id])
+                updates.append(
+                    {
+                        "task_result_id": task_result_db.id,
+                        "testcase_results": [
+                            testcase_result.model_dump() for testcase_result in testcase_results
+                        ],
+                    }
+                )
+
+            if updates:
+                # NOTE: Executed on the connection, so that the parameters are sent as one executemany instead of
+                # an ORM bulk update
+                db_session.connection().execute(
+                    update(TaskResultORM)
+                    .where(col(TaskResultORM.id) == bindparam("task_result_id"))
+                    .values(
+                        status=TaskEvalStatus.SUCCESS,
+                        completed_at=func.now(),
+                        result=bindparam("testcase_results"),
+                    ),
+                    updates,
+                )
+            db_session.commit()
+
 
-                testcase_result = TestcaseResult(**eval_result.model_dump(), results=socket_results)
-                if testcase_result.status == Status.OK:
-                    testcase_result.status = (
-                        Status.WA
-                        if not all(socket_result.correct for socket_result in socket_results)
-                        else testcase_result.status
+def ingest_reference_results(
+    db_session: Session, job_ids: set[str], responses: dict[str, JobResult]
+):
+    """Store the reference outputs precomputed by the reference jobs of tasks (see `TaskORM.create_reference_job`)"""
+    # NOTE: The rows are locked, so that a result that is delivered again is not ingested concurrently. Once it
+    # is ingested, the job id of a task is cleared, so the result is not ingested again
+    tasks_db = db_session.scalars(
+        select(TaskORM)
+        .where(col(TaskORM.reference_job_id).in_(job_ids))
+        .order_by(col(TaskORM.problem_id), col(TaskORM.id))
+        .with_for_update()
+    ).all()
+    for task_db in tasks_db:
+        job_id = task_db.reference_job_id
+        assert job_id is not None
+        task_db.load_reference_results(responses[job_id])
+        db_session.add(task_db)
+
+
+def _decode_outputs(stdout: str) -> dict[str, Any] | None:
+    """Return the outputs that a program reported as a JSON object, or `None` if it did not report them"""
+    try:
+        outputs = json.loads(stdout)
+    except ValueError:
+        return None
+    return outputs if isinstance(outputs, dict) else None
+
+
+def grade_job_result(task: ProgrammingTask, response: JobResult) -> list[TestcaseResult]:
+    """Grade the results of the programs of a job against the testcases of its task"""
+    # NOTE: The rows of a parameterised testcase are reported as testcases of their own
+    testcases: list[tuple[int, Testcase]] = sorted(
+        (
+            (testcase_id, testcase)
+            for testcase in task.testcases
+            for testcase_id in testcase.reported_ids
+        ),
+        key=itemgetter(0),
+    )
+    eval_results: dict[int, ProgramResult] = {
+        eval_result.id: eval_result for eval_result in task.split_fused_results(response.results)
+    }
+
+    testcase_results: list[TestcaseResult] = []
+    for testcase_id, testcase in testcases:
+        eval_result = eval_results.get(testcase_id)
+        # NOTE: The runner does not return results of the programs it skipped after a failure
+        if eval_result is None or eval_result.status == Status.SKIPPED:
+            testcase_results.append(
+                TestcaseResult(id=testcase_id, status=Status.SKIPPED, stdout="", stderr="")
+            )
+            continue
+
+        # NOTE: Only programs that ran to completion report their outputs, e.g. a testcase of a fused program that
+        # exceeded its time limit has no output
+        eval_value = (
+            _decode_outputs(eval_result.stdout) if eval_result.status == Status.OK else None
+        )
+        if eval_value is None:
+            # A program that exited normally without reporting its outputs failed all the same
+            status = eval_result.status if eval_result.status != Status.OK else Status.RTE
+            testcase_results.append(
+                TestcaseResult(**eval_result.model_dump(exclude={"status"}), status=status)
+            )
+            continue
+
+        output_step: OutputStep = testcase.output_step
+        step_timings = eval_value.pop(STEP_TIMINGS_KEY, None)
+
+        socket_results: list[SocketResult] = []
+        for socket in output_step.data_in:
+            eval_socket_value = eval_value.get(socket.id)
+            if task.environment.compare_outputs_in_program:
+                # NOTE: The program reports whether the output is correct, with a preview if it is large
+                judged: dict[str, Any] = eval_socket_value or {}
+                socket_results.append(
+                    SocketResult(
+                        id=socket.id,
+                        value=judged.get("value", judged.get("preview")),
+                        correct=judged.get("correct", False),
+                        truncated="preview" in judged,
                     )
-                testcase_results.append(testcase_result)
+                )
+                continue
 
-            task_result_db.status = TaskEvalStatus.SUCCESS
-            task_result_db.completed_at = func.now()  # type: ignore
-            task_result_db.result = [
-                testcase_result.model_dump() for testcase_result in testcase_results
-            ]
+            # If there is no comparison required, the value is always regarded as correct
+            is_correct = socket.comparison.compare(eval_socket_value) if socket.comparison else True
+            socket_results.append(
+                SocketResult(id=socket.id, value=eval_socket_value, correct=is_correct)
+            )
 
-            db_session.add(task_result_db)
-            db_session.commit()
+        testcase_result = TestcaseResult(
+            **eval_result.model_dump(), results=socket_results, step_timings=step_timings
+        )
+        if testcase_result.status == Status.OK:
+            testcase_result.status = (
+                Status.WA
+                if not all(socket_result.correct for socket_result in socket_results)
+                else testcase_result.status
+            )
+        testcase_results.append(testcase_result)
+    return testcase_results
 
 
 task_results_consumer = TaskResultsConsumer()
@@ -0,0 +1,99 @@
+import asyncio
+import contextlib
+import logging
+from concurrent.futures import Future, wait
+
+from sqlmodel import col, delete, select
+
+from unicon_backend.constants import OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL_SECS
+from unicon_backend.database import SessionLocal
+from unicon_backend.lib.amqp import PublishError
+from unicon_backend.models.outbox import OutboxMessageORM
+from unicon_backend.workers.publisher import TaskPublisher, task_publisher
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxRelay:
+    """Publishes the messages of the outbox in batches, and deletes them once the broker has confirmed them"""
+
+    def __init__(self, publisher: TaskPublisher, batch_size: int, poll_interval_secs: float):
+        self.publisher = publisher
+        self.batch_size = batch_size
+        self.poll_interval_secs = poll_interval_secs
+
+        # NOTE: These will be set when the relay is started
+        self._event_loop: asyncio.AbstractEventLoop | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def relay_batch(self) -> int:
+        """Relay a batch of messages, returning the number of messages that were claimed"""
+        with SessionLocal() as db_session:
+            # NOTE: Messages claimed by other replicas are skipped, so that replicas relay different messages
+            messages = db_session.scalars(
+                select(OutboxMessageORM)
+                .order_by(col(OutboxMessageORM.id))
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).all()
+            if not messages:
+                return 0
+
+            published: list[tuple[OutboxMessageORM, Future[None]]] = []
+            for message in messages:
+                try:
+                    published.append((message, self.publisher.publish(message.payload)))
+                except PublishError as e:
+                    logger.warning(f"Failed to relay outbox message {message.id}: {e}")
+                    break
+            # NOTE: Confirms are awaited for the whole batch, instead of every message in turn
+            wait([future for _, future in published], timeout=self.publisher.timeout_secs)
+
+            confirmed: list[int | None] = []
+            for message, future in published:
+                if not future.done():
+                    logger.warning(f"Outbox message {message.id} was not confirmed in time")
+                elif error := future.exception():
+                    logger.warning(f"Failed to relay outbox message {message.id}: {error}")
+                else:
+                    confirmed.append(message.id)
+
+            # NOTE: Messages that were not confirmed are relayed again, so a message may be published more than once
+            db_session.exec(delete(OutboxMessageORM).where(col(OutboxMessageORM.id).in_(confirmed)))
+            db_session.commit()
+            return len(messages)
+
+    async def _relay(self):
+        assert self._wakeup is not None
+        while True:
+            self._wakeup.clear()
+            try:
+                # NOTE: Publishing blocks until the broker confirms the messages, so it cannot run on the event loop
+                claimed = await asyncio.to_thread(self.relay_batch)
+            except Exception:
+                logger.exception("Failed to relay outbox messages")
+                claimed = 0
+
+            # Relay the next batch right away if the outbox was not drained
+            if claimed < self.batch_size:
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval_secs)
+
+    def notify(self):
+        """Relay the outbox right away, e.g. after committing a message to it. Can be called from any thread."""
+        if self._event_loop is not None and self._wakeup is not None:
+            self._event_loop.call_soon_threadsafe(self._wakeup.set)
+
+    def run(self, event_loop: asyncio.AbstractEventLoop | None = None):
+        self._event_loop = event_loop or asyncio.get_event_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._event_loop.create_task(self._relay())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+outbox_relay = OutboxRelay(task_publisher, OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL_SECS)
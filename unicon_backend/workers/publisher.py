@@ -1,33 +1,48 @@
 import logging
+from concurrent.futures import Future
 
 from pika import BasicProperties, DeliveryMode
 from pika.exchange_type import ExchangeType
 
-from unicon_backend.constants import EXCHANGE_NAME, RABBITMQ_URL, TASK_QUEUE_NAME
+from unicon_backend.constants import (
+    EXCHANGE_NAME,
+    MESSAGE_COMPRESSION,
+    MESSAGE_COMPRESSION_THRESHOLD,
+    PUBLISH_MAX_IN_FLIGHT,
+    PUBLISH_TIMEOUT_SECS,
+    RABBITMQ_URL,
+    TASK_QUEUE_NAME,
+)
 from unicon_backend.lib.amqp import AsyncPublisher
+from unicon_backend.lib.compression import check_encoding, encode_body
 
 logger = logging.getLogger(__name__)
 
 
 class TaskPublisher(AsyncPublisher):
-    def __init__(self):
-        super().__init__(RABBITMQ_URL, EXCHANGE_NAME, ExchangeType.topic, TASK_QUEUE_NAME)
-
-    def publish(self, payload: str, content_type: str = "application/json"):
-        assert self._channel is not None
-
-        self._channel.basic_publish(
-            self.exchange_name,
-            self.routing_key,
-            payload,
-            properties=BasicProperties(
-                content_type=content_type, delivery_mode=DeliveryMode.Persistent
-            ),
+    def __init__(self, queue_name: str = TASK_QUEUE_NAME):
+        super().__init__(
+            RABBITMQ_URL,
+            EXCHANGE_NAME,
+            ExchangeType.topic,
+            queue_name,
+            max_in_flight=PUBLISH_MAX_IN_FLIGHT,
+            timeout_secs=PUBLISH_TIMEOUT_SECS,
         )
+        check_encoding(MESSAGE_COMPRESSION)
 
-        # Mark that the message was published for delivery confirmation
-        self._message_number += 1
-        self._deliveries[self._message_number] = True
+    def publish(self, payload: str, content_type: str = "application/json") -> Future[None]:
+        body, content_encoding = encode_body(
+            payload.encode(), MESSAGE_COMPRESSION, MESSAGE_COMPRESSION_THRESHOLD
+        )
+        return self.publish_message(
+            body,
+            BasicProperties(
+                content_type=content_type,
+                content_encoding=content_encoding,
+                delivery_mode=DeliveryMode.Persistent,
+            ),
+        )
 
 
 task_publisher = TaskPublisher()